@@ -15,6 +15,8 @@ import shutil
 from datetime import datetime
 import random
 
+from compressed_input import open_input
+
 # Configuration des répertoires
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(SCRIPT_DIR, 'data')
@@ -56,7 +58,7 @@ def ensure_directory(directory):
 def load_csv_file(file_path):
     """Charge un fichier CSV et retourne ses données"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as csvfile:
+        with open_input(file_path, 'r', encoding='utf-8') as csvfile:
             reader = csv.reader(csvfile)
             headers = next(reader)
             data = []
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Moteur d'agrégation déclaratif.
+
+Chaque statistique se décrit par un Aggregate: une fonction (count, sum, mean,
+variance, min ou max) d'une mesure, groupée par zéro, une ou plusieurs clés, éventuellement limitée
+aux lignes dont un indicateur (clé 0/1) vaut 1:
+
+    Aggregate('avg_marks_by_bac', 'mean', 'Mark', by=('Baccalaureat_Type',))
+    Aggregate('school_specialty', 'count', by=('School', 'Specialty'))
+    Aggregate('semester_threshold', 'mean', 'Semester_Avg', where='Graduated')
+
+Le plan compile la liste: les specs de mêmes clés (et même filtre) partagent une
+table de groupes {groupe: [effectif, puis pour chaque mesure: somme, effectif,
+somme des carrés, min, max]}, et chaque ligne met à jour toutes les tables en un
+seul passage (add_row). En bloc (add_columns), chaque table calcule ses groupes
+avec les noyaux de groupby.py (code composite pour plusieurs clés, bincount),
+quel que soit le nombre de specs ou de groupes qu'elle sert. Les mesures sont
+des entiers (virgule fixe, voir groupby.scaled_integers) divisés par leur
+échelle au moment du résultat: les sommes non pondérées sont exactes.
+
+Deux plans de mêmes specs se fusionnent (merge): effectifs, sommes et sommes
+des carrés s'additionnent, min et max se combinent. Sans pondération ce sont
+des entiers, la fusion est donc associative et exacte: quel que soit le
+découpage des lignes (morceaux, processus, lots ajoutés), le résultat est
+identique au bit près à celui d'un passage unique.
+
+Pour la même raison, une ligne se retire en l'ajoutant avec un poids -1
+(remove_row): les statistiques suivent insertions, suppressions et
+modifications (suppression puis insertion) en O(lignes modifiées). Seuls min et
+max ne se mettent pas à jour ainsi: un plan qui les demande refuse les retraits.
+"""
+
+from collections import namedtuple
+
+from groupby import (column, combine_codes, group_count, group_max, group_min, group_sum, group_sum_squares,
+                     select, split_code, zeros)
+
+COUNT = 'count'
+SUM = 'sum'
+MEAN = 'mean'
+VARIANCE = 'variance'
+MIN = 'min'
+MAX = 'max'
+FUNCTIONS = (COUNT, SUM, MEAN, VARIANCE, MIN, MAX)
+_MOMENTS = (VARIANCE, MIN, MAX)  # demandent la somme des carrés, le min et le max de la mesure
+
+Aggregate = namedtuple('Aggregate', ['name', 'func', 'measure', 'by', 'where'],
+                       defaults=(None, (), None))
+
+# Emplacements d'une mesure dans une cellule (après l'effectif)
+_SUM, _PRESENT, _SQUARES, _MIN, _MAX = range(5)
+_SLOT = 5
+
+
+class GroupTable:
+    """Effectif et moments des mesures par groupe (code, ou tuple de codes pour plusieurs clés)"""
+
+    def __init__(self, keys, where, measures, moments):
+        self.keys = keys
+        self.where = where
+        self.measures = measures
+        self.moments = moments  # par mesure: somme des carrés, min et max demandés
+        self.cells = {}
+
+    def slot(self, measure):
+        """Position dans une cellule des moments de `measure`: somme, effectif, somme des carrés, min, max"""
+        return 1 + _SLOT * self.measures.index(measure)
+
+    def _cell(self, group):
+        cell = self.cells.get(group)
+        if cell is None:
+            cell = self.cells[group] = [0] + [0, 0, 0, None, None] * len(self.measures)
+        return cell
+
+    def add(self, group, values, weight):
+        cell = self._cell(group)
+        cell[0] += weight
+        for index, measure in enumerate(self.measures):
+            value = values[measure]
+            if callable(value):
+                value = values[measure] = value()  # Mesure calculée à la demande, une fois par ligne
+            if value is None:
+                continue
+            if self.moments[index] and weight > 0:
+                _accumulate(cell, 1 + _SLOT * index, value * weight, weight, value * value * weight, value, value)
+            elif self.moments[index]:
+                _accumulate(cell, 1 + _SLOT * index, value * weight, weight, value * value * weight)
+            else:
+                _accumulate(cell, 1 + _SLOT * index, value * weight, weight)
+        if not cell[0]:
+            del self.cells[group]  # Groupe vidé par des retraits
+
+    def add_columns(self, codes, size, decode, columns, weights=None):
+        """
+        Ajout en bloc.
+
+        Args:
+            codes: Code du groupe de chaque ligne (0..size-1)
+            size: Nombre de groupes possibles
+            decode: Fonction code -> groupe
+            columns: {mesure: (valeurs, masque des lignes où la mesure est présente ou None)}
+            weights: Poids de chaque ligne (optionnel)
+        """
+        counts = group_count(codes, size, weights)
+        measures = []
+        for index, measure in enumerate(self.measures):
+            values, present = columns[measure]
+            measure_codes, measure_weights, measure_counts = codes, weights, counts
+            if present is not None:
+                measure_codes = select(codes, present)
+                values = select(values, present)
+                measure_weights = select(weights, present) if weights is not None else None
+                measure_counts = group_count(measure_codes, size, measure_weights)
+            results = [group_sum(measure_codes, size, values, measure_weights), measure_counts]
+            if self.moments[index]:
+                results += [group_sum_squares(measure_codes, size, values, measure_weights),
+                            group_min(measure_codes, size, values), group_max(measure_codes, size, values)]
+            measures.append(results)
+
+        for code, count in enumerate(counts):
+            if not count:
+                continue
+            group = decode(code)
+            cell = self._cell(group)
+            cell[0] += count
+            for index, results in enumerate(measures):
+                if self.moments[index] and count < 0:
+                    _accumulate(cell, 1 + _SLOT * index, *(result[code] for result in results[:_MIN]))
+                elif self.moments[index]:
+                    _accumulate(cell, 1 + _SLOT * index, *(result[code] for result in results))
+                else:
+                    _accumulate(cell, 1 + _SLOT * index, results[_SUM][code], results[_PRESENT][code])
+            if not cell[0]:
+                del self.cells[group]
+
+    def merge(self, other, translate=None):
+        """
+        Ajoute les cellules d'une table de même disposition.
+
+        Args:
+            other: GroupTable (mêmes clés, filtre et mesures)
+            translate: {clé: liste code de `other` -> code de cette table} pour les clés
+                dont les dictionnaires diffèrent (les autres codes sont repris tels quels)
+        """
+        translate = translate or {}
+        maps = [translate.get(key) for key in self.keys]
+        for group, other_cell in other.cells.items():
+            if len(self.keys) == 1:
+                group = maps[0][group] if maps[0] is not None else group
+            elif self.keys:
+                group = tuple(codes[code] if codes is not None else code for codes, code in zip(maps, group))
+            cell = self._cell(group)
+            cell[0] += other_cell[0]
+            for index in range(len(self.measures)):
+                base = 1 + _SLOT * index
+                _accumulate(cell, base, *other_cell[base:base + _SLOT])
+
+
+class AggregationPlan:
+    """
+    Liste de specs compilée en tables de groupes.
+
+    Args:
+        specs: Liste d'Aggregate
+        scales: Échelle de chaque mesure ({mesure: diviseur}, 1 par défaut)
+    """
+
+    def __init__(self, specs, scales=None):
+        self.specs = {}
+        self.scales = dict(scales or {})
+        layouts = {}
+        for spec in specs:
+            if spec.func not in FUNCTIONS:
+                raise ValueError(f"Fonction d'agrégation inconnue: {spec.func}")
+            if spec.func != COUNT and spec.measure is None:
+                raise ValueError(f"Mesure manquante pour {spec.name}")
+            spec = spec._replace(by=tuple(spec.by))
+            measures = layouts.setdefault((spec.by, spec.where), {})
+            if spec.measure is not None:
+                measures[spec.measure] = measures.get(spec.measure, False) or spec.func in _MOMENTS
+            self.specs[spec.name] = spec
+        self.tables = [GroupTable(by, where, tuple(measures), tuple(measures.values()))
+                       for (by, where), measures in layouts.items()]
+        self._table_of = {(table.keys, table.where): table for table in self.tables}
+
+    def add_row(self, keys, values, weight=1):
+        """
+        Ajoute une ligne à toutes les tables.
+
+        Args:
+            keys: {clé: code} (indicateurs: 0 ou 1)
+            values: {mesure: valeur entière, None si absente, ou fonction la calculant}
+            weight: Poids de la ligne
+        """
+        for table in self.tables:
+            if table.where is not None and not keys[table.where]:
+                continue
+            if len(table.keys) == 1:
+                group = keys[table.keys[0]]
+            else:
+                group = tuple(keys[key] for key in table.keys)
+            table.add(group, values, weight)
+
+    @property
+    def invertible(self):
+        """Des lignes peuvent être retirées si aucune spec ne demande un min ou un max"""
+        return not any(spec.func in (MIN, MAX) for spec in self.specs.values())
+
+    def remove_row(self, keys, values):
+        """Retire une ligne ajoutée auparavant (mêmes clés et valeurs): poids -1"""
+        if not self.invertible:
+            raise ValueError("Retrait impossible: le min et le max ne se mettent pas à jour par retrait")
+        self.add_row(keys, values, weight=-1)
+
+    def add_columns(self, length, keys, values, weights=None, sizes=None):
+        """
+        Ajoute en bloc `length` lignes données par colonnes.
+
+        Args:
+            length: Nombre de lignes
+            keys: {clé: codes de chaque ligne}
+            values: {mesure: valeurs de chaque ligne, ou (valeurs, masque des lignes où la
+                mesure est présente), ou fonction sans argument retournant l'un ou l'autre
+                (calculée seulement si une table utilise la mesure)}
+            weights: Poids de chaque ligne (optionnel; -1 pour retirer des lignes, voir remove_row)
+            sizes: Nombre de codes possibles de chaque clé (2 par défaut: indicateurs 0/1)
+        """
+        sizes = sizes or {}
+        resolved = {}
+
+        def measure_column(measure):
+            if measure not in resolved:
+                values_column = values[measure]
+                if callable(values_column):
+                    values_column = values_column()
+                if not isinstance(values_column, tuple):
+                    values_column = (values_column, None)
+                resolved[measure] = (column(values_column[0]),
+                                     column(values_column[1]) if values_column[1] is not None else None)
+            return resolved[measure]
+
+        if weights is not None:
+            weights = column(weights)
+        for table in self.tables:
+            key_sizes = [sizes.get(key, 2) for key in table.keys]
+            if not table.keys:
+                codes, size, decode = zeros(length), 1, lambda code: ()
+            elif len(table.keys) == 1:
+                codes, size, decode = column(keys[table.keys[0]]), key_sizes[0], int
+            else:
+                codes, size = combine_codes([keys[key] for key in table.keys], key_sizes)
+                decode = lambda code, key_sizes=key_sizes: split_code(code, key_sizes)
+
+            columns = {measure: measure_column(measure) for measure in table.measures}
+            table_weights = weights
+            if table.where is not None:
+                mask = column(keys[table.where])
+                codes = select(codes, mask)
+                table_weights = select(weights, mask) if weights is not None else None
+                columns = {measure: (select(values_column, mask),
+                                     select(present, mask) if present is not None else None)
+                           for measure, (values_column, present) in columns.items()}
+            table.add_columns(codes, size, decode, columns, table_weights)
+
+    def merge(self, other, translate=None):
+        """
+        Fusionne un plan de mêmes specs (calculé sur d'autres lignes) dans celui-ci.
+
+        Args:
+            other: AggregationPlan
+            translate: {clé: liste code de `other` -> code de ce plan} (voir GroupTable.merge)
+
+        Returns:
+            Ce plan
+        """
+        if self.specs != other.specs:
+            raise ValueError("Fusion impossible: plans d'agrégation différents")
+        for table in self.tables:
+            table.merge(other._table_of[(table.keys, table.where)], translate)
+        return self
+
+    def result(self, name):
+        """
+        Résultat d'une spec: {groupe: valeur} (valeur seule pour une spec sans clé).
+        Moyenne, variance, min et max d'un groupe sans valeur de la mesure valent None.
+        """
+        spec = self.specs[name]
+        table = self._table_of[(spec.by, spec.where)]
+        if spec.func == COUNT:
+            results = {group: cell[0] for group, cell in table.cells.items()}
+        else:
+            base = 1 + _SLOT * table.measures.index(spec.measure)
+            scale = self.scales.get(spec.measure, 1)
+            results = {group: _finish(spec.func, cell[base:base + _SLOT], scale)
+                       for group, cell in table.cells.items()}
+        if not spec.by:
+            return results.get((), 0 if spec.func in (COUNT, SUM) else None)
+        return results
+
+
+def _accumulate(cell, base, total, present, squares=0, low=None, high=None):
+    """Ajoute les moments d'une mesure (somme, effectif, somme des carrés, min, max) à une cellule"""
+    cell[base + _SUM] += total
+    cell[base + _PRESENT] += present
+    cell[base + _SQUARES] += squares
+    if low is not None:
+        current = cell[base + _MIN]
+        cell[base + _MIN] = low if current is None else min(current, low)
+    if high is not None:
+        current = cell[base + _MAX]
+        cell[base + _MAX] = high if current is None else max(current, high)
+
+
+def _finish(func, slot, scale):
+    """Valeur d'une fonction à partir des moments d'une mesure dans un groupe"""
+    total, present, squares, low, high = slot
+    if func == SUM:
+        return total / scale if scale != 1 else total
+    if not present:
+        return None
+    if func == MEAN:
+        return total / (present * scale)
+    if func == VARIANCE:
+        return (squares * present - total * total) / (present * present * scale * scale)
+    if func == MIN:
+        return low / scale
+    return high / scale
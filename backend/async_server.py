@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Serveur HTTP asyncio pour l'API.
+
+Une boucle d'événements gère toutes les connexions: une connexion inactive
+(keep-alive) ne coûte qu'une coroutine en attente, pas un thread. Chaque
+requête est lue et découpée sur la boucle, puis traitée par le gestionnaire
+HTTP existant (un BaseHTTPRequestHandler, ex. EuromedAPIHandler) sans socket:
+mêmes routes et mêmes réponses que le serveur à threads. Le traitement se fait
+dans un pool de threads (prédictions, chargement d'un fichier...) pour que la
+boucle ne soit jamais bloquée; seules les requêtes auxquelles `inline(handler)`
+répond immédiatement (réponse déjà rendue) sont traitées sur la boucle.
+
+Les réponses sont envoyées en HTTP/1.1 avec Content-Length (voir
+http_keepalive.finalize_response). La connexion reste ouverte (HTTP/1.1 sans
+`Connection: close`, HTTP/1.0 avec `Connection: keep-alive`) jusqu'à
+KEEPALIVE_TIMEOUT secondes d'inactivité; les requêtes enchaînées sur une
+connexion (pipelining) sont répondues dans l'ordre.
+"""
+
+import asyncio
+import http.client
+import http.server
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from http_keepalive import finalize_response
+
+logger = logging.getLogger(__name__)
+
+# Threads de traitement des requêtes
+DEFAULT_THREADS = 16
+# Fermeture d'une connexion inactive (secondes)
+KEEPALIVE_TIMEOUT = 15
+# Taille maximum de la ligne de requête et des en-têtes
+MAX_HEADER_BYTES = 64 * 1024
+# Taille maximum du corps d'une requête (au-delà: 413 sans lire le corps)
+MAX_BODY_BYTES = 16 * 1024 * 1024
+# File d'attente des connexions du noyau (listen)
+LISTEN_BACKLOG = 1024
+
+
+class _RequestError(Exception):
+    """Requête invalide: réponse d'erreur puis fermeture de la connexion"""
+
+    def __init__(self, status):
+        super().__init__(status.phrase)
+        self.status = status
+
+
+def parse_request(head):
+    """(méthode, cible, version, en-têtes) d'une requête, ou _RequestError"""
+    request_line, _, header_block = head.partition(b'\r\n')
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+        raise _RequestError(HTTPStatus.BAD_REQUEST)
+    try:
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+    except http.client.HTTPException:
+        raise _RequestError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+    return parts[0], parts[1], parts[2], headers
+
+
+def wants_keep_alive(version, headers):
+    connection = headers.get('Connection', '').lower()
+    if version == 'HTTP/1.0':
+        return 'keep-alive' in connection
+    return 'close' not in connection
+
+
+def error_response(status, keep_alive=False):
+    body = f'{{"error": "{status.phrase}"}}'.encode()
+    return (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n').encode() + body
+
+
+class AsyncHTTPServer:
+    """
+    Serveur asyncio exécutant `handler_class` (BaseHTTPRequestHandler) pour chaque requête.
+
+    Args:
+        handler_class: Gestionnaire des requêtes (méthodes do_GET, do_POST...)
+        threads: Threads de traitement des requêtes
+        inline: inline(handler) -> bool, appelée sur la boucle: répond sans bloquer si possible
+        keepalive_timeout: Secondes d'inactivité avant fermeture d'une connexion
+        max_body: Taille maximum (octets) du corps d'une requête
+    """
+
+    def __init__(self, handler_class, threads=DEFAULT_THREADS, inline=None, keepalive_timeout=KEEPALIVE_TIMEOUT,
+                 max_body=MAX_BODY_BYTES):
+        self.handler_class = handler_class
+        self.threads = max(1, threads)
+        self.inline = inline
+        self.keepalive_timeout = keepalive_timeout
+        self.max_body = max_body
+        self.connections = 0
+        self._open = {}  # tâche de la connexion -> writer
+        self._executor = None
+        self._loop = None
+        self._stopped = None
+
+    def run(self, host, port):
+        """Sert jusqu'à stop() (ou Ctrl+C)"""
+        asyncio.run(self.serve(host, port))
+
+    async def serve(self, host, port):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='async-http')
+        server = await asyncio.start_server(self._connection, host, port, limit=MAX_HEADER_BYTES,
+                                            reuse_address=True, backlog=LISTEN_BACKLOG)
+        try:
+            async with server:
+                await self._stopped.wait()
+                # Connexions encore ouvertes (inactives pour la plupart) fermées sans attendre leur délai
+                for writer in list(self._open.values()):
+                    writer.close()
+                if self._open:
+                    await asyncio.wait(list(self._open), timeout=1)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def stop(self):
+        """Arrête le serveur (depuis un autre thread)"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def _connection(self, reader, writer):
+        self.connections += 1
+        self._open[asyncio.current_task()] = writer
+        client_address = writer.get_extra_info('peername') or ('', 0)
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+                except asyncio.LimitOverrunError:
+                    writer.write(error_response(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE))
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break  # connexion inactive ou fermée par le client
+                try:
+                    method, target, version, headers = parse_request(head)
+                    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+                        raise _RequestError(HTTPStatus.LENGTH_REQUIRED)
+                    content_length = int(headers.get('Content-Length') or 0)
+                    if content_length < 0:
+                        raise ValueError(content_length)
+                    if content_length > self.max_body:
+                        raise _RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                except ValueError:
+                    writer.write(error_response(HTTPStatus.BAD_REQUEST))
+                    break
+                except _RequestError as e:
+                    writer.write(error_response(e.status))
+                    break
+                if content_length and version != 'HTTP/1.0' and headers.get('Expect', '').lower() == '100-continue':
+                    writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                body = await reader.readexactly(content_length) if content_length else b''
+                response, keep_alive = await self._respond(method, target, version, headers, body,
+                                                           client_address, wants_keep_alive(version, headers))
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            self._open.pop(asyncio.current_task(), None)
+            writer.close()
+
+    def _handler(self, method, target, version, headers, body, client_address):
+        """Gestionnaire prêt à traiter une requête, sans socket (corps et réponse en mémoire)"""
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.server = self
+        handler.client_address = client_address
+        handler.command, handler.path, handler.request_version = method, target, version
+        handler.requestline = f"{method} {target} {version}"
+        handler.headers = headers
+        handler.rfile = io.BytesIO(body)
+        handler.wfile = io.BytesIO()
+        handler.close_connection = True
+        if isinstance(handler, http.server.SimpleHTTPRequestHandler):
+            handler.directory = os.getcwd()  # fichiers servis par défaut (HEAD, GET hors API)
+        return handler
+
+    async def _respond(self, method, target, version, headers, body, client_address, keep_alive):
+        handler = self._handler(method, target, version, headers, body, client_address)
+        action = getattr(handler, 'do_' + method, None)
+        try:
+            if action is None:
+                handler.send_error(HTTPStatus.NOT_IMPLEMENTED, f"Méthode non prise en charge ({method})")
+            elif self.inline is None or not self.inline(handler):
+                await self._loop.run_in_executor(self._executor, action)
+        except Exception:
+            logger.exception("Erreur lors du traitement de %s %s", method, target)
+            return error_response(HTTPStatus.INTERNAL_SERVER_ERROR), False
+        response, keep_alive = finalize_response(handler.wfile.getvalue(), keep_alive, head_only=method == 'HEAD')
+        if response is None:
+            return error_response(HTTPStatus.INTERNAL_SERVER_ERROR), False
+        return response, keep_alive
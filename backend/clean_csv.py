@@ -1,6 +1,9 @@
 import os
 import sys
 
+from compressed_input import is_compressed, open_input
+from line_filter import LineFilter
+
 def clean_csv(input_filepath, output_filepath=None):
     """
     Clean a CSV file by removing comment lines and fixing JSON formatting issues.
@@ -20,40 +23,35 @@ def clean_csv(input_filepath, output_filepath=None):
         base_dir = os.path.dirname(input_filepath)
         filename = os.path.basename(input_filepath)
         name, ext = os.path.splitext(filename)
+        if is_compressed(input_filepath) and ext in ('.gz', '.bz2', '.xz'):
+            # The cleaned copy is written uncompressed
+            name, ext = os.path.splitext(name)
         output_filepath = os.path.join(base_dir, f"{name}_clean{ext}")
     
     try:
-        with open(input_filepath, 'r', encoding='utf-8') as input_file:
-            lines = input_file.readlines()
-        
-        # Find the header line (first line without // comments)
-        header_index = 0
-        for i, line in enumerate(lines):
-            if not line.strip().startswith('//'):
-                header_index = i
-                break
-        
-        # Extract header and data
-        header = lines[header_index].strip()
-        data_lines = [line.strip() for line in lines[header_index+1:] if line.strip() and not line.strip().startswith('//')]
-        
-        # Clean each line, removing extra spaces in JSON parts and fixing trailing commas
-        cleaned_data = []
-        for line in data_lines:
-            # Clean trailing spaces at the ends of fields
-            line = line.replace(', ', ',')
-            # Fix repeated commas
-            while ',,' in line:
-                line = line.replace(',,', ',')
-            # Make sure the line doesn't end with a comma
-            if line.endswith(','):
-                line = line[:-1]
-            cleaned_data.append(line)
-        
-        # Write the cleaned file
-        with open(output_filepath, 'w', encoding='utf-8') as output_file:
+        # Stream the file: comment and blank lines are dropped on the fly
+        with open_input(input_filepath, 'r', encoding='utf-8') as input_file, \
+                open(output_filepath, 'w', encoding='utf-8') as output_file:
+            lines = LineFilter(input_file)
+            
+            # The header is the first line without // comments
+            header = next(lines, '').strip()
             output_file.write(header + '\n')
-            output_file.write('\n'.join(cleaned_data))
+            
+            # Clean each line, removing extra spaces in JSON parts and fixing trailing commas
+            separator = ''
+            for line in lines:
+                line = line.strip()
+                # Clean trailing spaces at the ends of fields
+                line = line.replace(', ', ',')
+                # Fix repeated commas
+                while ',,' in line:
+                    line = line.replace(',,', ',')
+                # Make sure the line doesn't end with a comma
+                if line.endswith(','):
+                    line = line[:-1]
+                output_file.write(separator + line)
+                separator = '\n'
         
         print(f"Cleaned CSV file saved to {output_filepath}")
         return output_filepath
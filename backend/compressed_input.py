@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Lecture transparente des fichiers CSV compressés (gzip, bz2, xz).
+
+Les exports nocturnes arrivent compressés (`students.csv.gz`). Plutôt que de les
+décompresser sur disque, chaque chargeur ouvre son fichier avec open_input():
+le format est reconnu à ses premiers octets (pas à l'extension) et le contenu
+est décompressé au fil de la lecture. Un fichier non compressé est ouvert
+normalement, sans surcoût.
+
+Les décisions fondées sur la taille (seuil des grands fichiers, comptage des
+lignes) utilisent estimated_size(), la taille décompressée estimée. Un flux
+compressé n'offre pas d'accès direct: seek() y relit le flux depuis le début,
+les traitements par plages d'octets restent donc réservés aux fichiers bruts.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import struct
+import zlib
+
+GZIP = 'gzip'
+BZ2 = 'bz2'
+XZ = 'xz'
+
+_MAGIC = (
+    (b'\x1f\x8b', GZIP),
+    (b'BZh', BZ2),
+    (b'\xfd7zXZ\x00', XZ),
+)
+_OPENERS = {GZIP: gzip.open, BZ2: bz2.open, XZ: lzma.open}
+
+# Taille des lectures dans le flux décompressé (les décompresseurs travaillent par blocs)
+READ_BUFFER = 1024 * 1024
+
+# Octets compressés décompressés pour estimer le taux de compression
+ESTIMATE_BYTES = 1024 * 1024
+
+
+def detect_compression(file_path):
+    """Format de compression reconnu à la signature du fichier: 'gzip', 'bz2', 'xz' ou None"""
+    with open(file_path, 'rb') as f:
+        head = f.read(6)
+    for magic, compression in _MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def is_compressed(file_path):
+    return detect_compression(file_path) is not None
+
+
+def open_input(file_path, mode='rb', encoding=None, newline=None):
+    """
+    Ouvre un fichier en lecture en décompressant son contenu au fil de l'eau si nécessaire.
+
+    Args:
+        file_path: Chemin du fichier (compressé ou non)
+        mode: 'rb' (octets) ou 'r' (texte)
+        encoding, newline: Comme pour open() en mode texte
+    """
+    compression = detect_compression(file_path)
+    if compression is None:
+        return open(file_path, mode, encoding=encoding, newline=newline)
+
+    stream = io.BufferedReader(_OPENERS[compression](file_path, 'rb'), READ_BUFFER)
+    if 'b' in mode:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
+
+
+def _decompressor(compression):
+    if compression == GZIP:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == BZ2:
+        return bz2.BZ2Decompressor()
+    return lzma.LZMADecompressor()
+
+
+def _ratio_estimate(file_path, compression, size):
+    """Taille décompressée extrapolée à partir des ESTIMATE_BYTES premiers octets compressés"""
+    with open(file_path, 'rb') as f:
+        data = f.read(ESTIMATE_BYTES)
+    try:
+        output = len(_decompressor(compression).decompress(data))
+    except (OSError, EOFError, ValueError, zlib.error, lzma.LZMAError):
+        return size
+    if len(data) >= size:
+        return output  # Fichier entièrement décompressé: taille exacte (premier membre)
+    return round(output * size / len(data))
+
+
+def estimated_size(file_path):
+    """
+    Taille (en octets) du contenu décompressé: exacte pour un fichier brut, estimée sinon.
+    Pour gzip, la taille inscrite en fin de fichier (modulo 2**32) est recalée sur
+    l'estimation par taux de compression.
+    """
+    size = os.path.getsize(file_path)
+    compression = detect_compression(file_path)
+    if compression is None:
+        return size
+
+    estimate = _ratio_estimate(file_path, compression, size)
+    if compression == GZIP and size >= 18:
+        with open(file_path, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            trailer_size = struct.unpack('<I', f.read(4))[0]
+        # Plus proche valeur trailer_size + k * 2**32 de l'estimation (fichier à un seul membre)
+        wraps = max(0, round((estimate - trailer_size) / 2 ** 32))
+        candidate = trailer_size + wraps * 2 ** 32
+        if abs(candidate - estimate) <= estimate / 2:
+            return candidate
+    return estimate
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Serveur HTTP concurrent pour l'API.
+
+`socketserver.TCPServer` traite une connexion à la fois: une requête lente
+(prédiction qui parcourt toutes les lignes) bloque toutes les autres. Ce module
+fournit:
+
+- PooledHTTPServer: les connexions acceptées sont traitées par un pool borné
+  de `threads` threads. Au-delà de `max_pending` connexions en attente, le
+  thread d'acceptation patiente (les connexions restent dans la file du
+  noyau) au lieu de créer des threads sans limite.
+- PreforkServer: `processes` processus créés par fork servent le même port
+  (socket d'écoute partagée), chacun avec son pool de threads. Les données
+  chargées sont partagées en copie sur écriture; les réponses peu coûteuses
+  passent alors à l'échelle avec le nombre de cœurs (le GIL ne limite qu'un
+  processus). Quand les données changent dans le processus principal (lignes
+  ajoutées, rechargement), de nouveaux processus sont créés puis les anciens
+  terminent leurs requêtes en cours et s'arrêtent.
+- ReadWriteLock: les requêtes lisent les données sous un verrou partagé et les
+  modifications (ajout de lignes, rechargement) prennent le verrou exclusif.
+  Chaque requête voit ainsi une version des données qui ne change pas pendant
+  son traitement.
+"""
+
+import logging
+import os
+import signal
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Threads de traitement des requêtes par processus
+DEFAULT_THREADS = 16
+# Connexions acceptées en attente d'un thread libre (au-delà: attente dans la file du noyau)
+MAX_PENDING_PER_THREAD = 4
+# File d'attente des connexions du noyau (listen)
+LISTEN_BACKLOG = 256
+
+
+class ReadWriteLock:
+    """
+    Verrou partagé / exclusif. `with lock:` prend le verrou exclusif (réentrant pour
+    le thread qui le détient), `with lock.shared:` le verrou partagé. Un écrivain en
+    attente bloque les nouveaux lecteurs (pas de famine des modifications).
+    """
+
+    def __init__(self):
+        self.shared = _SharedLock(self)
+        self.after_fork()
+
+    def after_fork(self):
+        """État initial; à appeler dans un processus créé par fork (le verrou a pu y être copié pris)"""
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return True
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    def acquire_shared(self):
+        depth = getattr(self._local, 'depth', 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.depth = depth + 1  # déjà lecteur ou écrivain: pas d'attente
+            return True
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.depth = 1
+        return True
+
+    def release_shared(self):
+        self._local.depth -= 1
+        if self._local.depth or self._writer == threading.get_ident():
+            return
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class _SharedLock:
+    """Vue `with lock.shared:` d'un ReadWriteLock"""
+
+    def __init__(self, lock):
+        self._lock = lock
+
+    def __enter__(self):
+        return self._lock.acquire_shared()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._lock.release_shared()
+
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """TCPServer dont les connexions sont traitées par un pool borné de threads"""
+
+    allow_reuse_address = True
+    request_queue_size = LISTEN_BACKLOG
+
+    def __init__(self, server_address, handler_class, threads=DEFAULT_THREADS, max_pending=None,
+                 bind_and_activate=True):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.threads = max(1, threads)
+        self.max_pending = max_pending or self.threads * MAX_PENDING_PER_THREAD
+        self._slots = threading.BoundedSemaphore(self.threads + self.max_pending)
+        self._waiting = 0  # connexions acceptées pas encore prises par un thread
+        self._waiting_lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='http-worker')
+        return self._executor
+
+    def saturated(self):
+        """Des connexions attendent un thread (les connexions persistantes inactives doivent le libérer)"""
+        return self._waiting > 0
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()  # pool et file d'attente pleins: l'acceptation attend
+        with self._waiting_lock:
+            self._waiting += 1
+        try:
+            self._pool().submit(self._process, request, client_address)
+        except RuntimeError:
+            with self._waiting_lock:
+                self._waiting -= 1
+            self._slots.release()  # pool arrêté
+            self.shutdown_request(request)
+
+    def _process(self, request, client_address):
+        with self._waiting_lock:
+            self._waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class PreforkServer:
+    """
+    Processus (fork) servant la socket d'écoute de `httpd`.
+
+    Args:
+        httpd: Serveur lié à son port (PooledHTTPServer), servi par chaque processus
+        processes: Nombre de processus
+        prepare: Appelée dans le processus principal avant chaque création de processus
+            (ex. précalcul des statistiques, hérité par les processus)
+        fork_lock: Verrou pris pendant les fork (aucune modification des données en cours)
+        after_fork: Appelée dans chaque nouveau processus (ex. recréation des verrous)
+        generation: Fonction retournant la version des données; les processus sont remplacés
+            quand elle change
+    """
+
+    def __init__(self, httpd, processes, prepare=None, fork_lock=None, after_fork=None, generation=None):
+        self.httpd = httpd
+        self.processes = max(1, processes)
+        self.prepare = prepare
+        self.fork_lock = fork_lock
+        self.after_fork = after_fork
+        self.generation = generation or (lambda: None)
+        self.children = {}   # pid -> génération servie
+        self._current = None
+
+    def _fork(self, generation):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = generation
+            return pid
+        # Processus fils: servir jusqu'à SIGTERM (les requêtes en cours sont terminées)
+        status = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+                target=self.httpd.shutdown, daemon=True).start())
+            if self.after_fork is not None:
+                self.after_fork()
+            self.httpd.serve_forever()
+            self.httpd.server_close()
+        except BaseException:
+            logger.exception("Erreur dans un processus du serveur")
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _spawn(self, count):
+        """Crée `count` processus pour la version courante des données"""
+        if self.prepare is not None:
+            self.prepare()
+        if self.fork_lock is not None:
+            with self.fork_lock:
+                generation = self.generation()
+                pids = [self._fork(generation) for _ in range(count)]
+        else:
+            generation = self.generation()
+            pids = [self._fork(generation) for _ in range(count)]
+        self._current = generation
+        return pids
+
+    def _reap(self):
+        """Retire les processus terminés; retourne le nombre de processus de la version courante"""
+        for pid in list(self.children):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                del self.children[pid]
+        return sum(1 for generation in self.children.values() if generation == self._current)
+
+    def _terminate(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def start(self):
+        self._spawn(self.processes)
+        return self
+
+    def supervise(self, interval=1.0, should_stop=None):
+        """
+        Boucle du processus principal: remplace les processus arrêtés et, quand les données
+        ont changé, crée de nouveaux processus puis arrête les anciens.
+        """
+        while should_stop is None or not should_stop():
+            time.sleep(interval)
+            if self.generation() != self._current:
+                old = list(self.children)
+                self._spawn(self.processes)
+                self._terminate(old)
+                logger.info("Processus du serveur remplacés (nouvelle version des données)")
+            missing = self.processes - self._reap()
+            if missing > 0:
+                logger.warning("%s processus du serveur arrêtés: redémarrage", missing)
+                self._spawn(missing)
+
+    def stop(self, timeout=10.0):
+        """Arrête tous les processus (requêtes en cours terminées) et attend leur fin"""
+        self._terminate(list(self.children))
+        deadline = time.time() + timeout
+        while self.children and time.time() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        self._terminate_now(list(self.children))
+
+    def _terminate_now(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self.children.pop(pid, None)
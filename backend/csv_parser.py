@@ -1,9 +1,12 @@
 import csv
-import json
 import os
-import gc  # Garbage collector pour libérer la mémoire
 import logging
 
+from compressed_input import estimated_size, is_compressed, open_input
+from line_filter import LineFilter
+from stats_accumulator import StatsAccumulator
+from student_store import StudentStore
+
 # Configurer les logs
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -18,7 +21,7 @@ def parse_csv(file_path, max_rows=None, chunk_size=10000):
         chunk_size: Process the file in chunks of this size
         
     Returns:
-        A dictionary with data and column information
+        A dictionary with the columnar StudentStore and column information
     """
     if not os.path.exists(file_path):
         logger.error(f"Erreur: Le fichier {file_path} n'existe pas.")
@@ -26,48 +29,24 @@ def parse_csv(file_path, max_rows=None, chunk_size=10000):
     
     try:
         # Get file size for progress reporting
-        file_size = os.path.getsize(file_path)
-        logger.info(f"Taille du fichier: {file_size/1024/1024:.2f} MB")
-        
-        # First pass: count lines and check if there are comment lines
-        with open(file_path, 'r', encoding='utf-8') as f:
-            # Read first few lines to check for comments
-            first_lines = []
-            for _ in range(10):  # Check first 10 lines
-                try:
-                    line = next(f)
-                    first_lines.append(line)
-                except StopIteration:
-                    break
-        
-        # Check if we need to remove comments
-        has_comments = any(line.strip().startswith('//') for line in first_lines)
+        file_size = estimated_size(file_path)
+        logger.info(f"Taille du fichier: {file_size/1024/1024:.2f} MB" +
+                    (" (décompressé, estimation)" if is_compressed(file_path) else ""))
         
-        # Create a temporary file without comments if needed
-        if has_comments:
-            logger.info("Détection de commentaires, création d'un fichier temporaire...")
-            temp_path = file_path + ".temp"
-            with open(file_path, 'r', encoding='utf-8') as infile:
-                with open(temp_path, 'w', encoding='utf-8') as outfile:
-                    for line in infile:
-                        if not line.strip().startswith('//'):
-                            outfile.write(line)
-            file_path = temp_path
-            logger.info(f"Fichier temporaire créé: {temp_path}")
-        
-        # Now process the file in chunks
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
+        # Les lignes de commentaire et les lignes vides sont écartées au fil de la lecture
+        with open_input(file_path, 'r', encoding='utf-8', newline='') as f:
+            lines = LineFilter(f)
+            reader = csv.reader(lines)
             headers = next(reader)
             
-            data = []
+            store = StudentStore(headers)
             row_count = 0
             chunk_count = 0
             
             logger.info("Début du traitement des données par chunks...")
             
             while True:
-                chunk = []
+                chunk_rows = 0
                 for _ in range(chunk_size):
                     try:
                         row = next(reader)
@@ -77,66 +56,35 @@ def parse_csv(file_path, max_rows=None, chunk_size=10000):
                             break
                             
                         if len(row) != len(headers):
-                            logger.warning(f"Ligne {row_count}: nombre de colonnes incorrect (ignorée)")
+                            logger.warning(f"Ligne {lines.line_number}: nombre de colonnes incorrect (ignorée)")
                             continue
                         
-                        # Process the row
-                        record = {}
-                        for i, header in enumerate(headers):
-                            value = row[i].strip() if i < len(row) else ""
-                            
-                            # Convert boolean values
-                            if value.lower() == 'true':
-                                value = True
-                            elif value.lower() == 'false':
-                                value = False
-                            
-                            # Try to parse JSON in semester columns
-                            elif header.startswith('S') and header[1:].isdigit() and value:
-                                try:
-                                    value = json.loads(value)
-                                except json.JSONDecodeError:
-                                    logger.warning(f"JSON invalide dans la colonne {header}: {value}")
-                            
-                            record[header] = value
-                        
-                        chunk.append(record)
+                        # Decode the row straight into the columnar store
+                        store.append(row)
+                        chunk_rows += 1
                         
                     except StopIteration:
                         break
                 
-                # Add current chunk to data
-                if chunk:
-                    data.extend(chunk)
+                if chunk_rows:
                     chunk_count += 1
-                    logger.info(f"Chunk {chunk_count} traité: {len(chunk)} lignes (total: {row_count})")
+                    logger.info(f"Chunk {chunk_count} traité: {chunk_rows} lignes (total: {row_count})")
                 else:
                     # No more data
                     break
                 
-                # Force garbage collection to free memory
-                chunk = None
-                gc.collect()
-                
                 if max_rows and row_count >= max_rows:
                     logger.info(f"Limite de {max_rows} lignes atteinte")
                     break
             
-            # Clean up temporary file
-            if has_comments and file_path.endswith('.temp'):
-                try:
-                    os.remove(file_path)
-                    logger.info("Fichier temporaire supprimé.")
-                except:
-                    logger.warning("Impossible de supprimer le fichier temporaire.")
-            
             result = {
                 "columns": headers,
-                "data": data,
-                "count": len(data)
+                "store": store,
+                "count": len(store)
             }
             
-            logger.info(f"Données chargées avec succès: {len(data)} étudiants")
+            logger.info(f"Données chargées avec succès: {len(store)} étudiants "
+                        f"({store.bytes_per_row()} octets/ligne)")
             return result
             
     except Exception as e:
@@ -145,56 +93,61 @@ def parse_csv(file_path, max_rows=None, chunk_size=10000):
         traceback.print_exc()
         return None
 
+def read_rows(file_path):
+    """
+    Lit les lignes brutes d'un fichier CSV (compressé ou non)
+    
+    Returns:
+        (en-têtes, lignes ayant le bon nombre de colonnes)
+    """
+    with open_input(file_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(LineFilter(f))
+        headers = next(reader)
+        return headers, [row for row in reader if len(row) == len(headers)]
+
+def _accumulator(data):
+    """Accumulateur des statistiques du jeu de données, calculé une fois sur toutes les lignes"""
+    accumulator = data.get("accumulator")
+    if accumulator is None:
+        accumulator = data["accumulator"] = StatsAccumulator(data["store"])
+        accumulator.add_store(data["store"])
+    return accumulator
+
+def append_rows(data, rows):
+    """
+    Ajoute des lignes brutes (alignées sur data["columns"]) au jeu de données.
+    Les statistiques sont mises à jour en O(lignes ajoutées) au lieu d'être recalculées.
+    """
+    accumulator = _accumulator(data)
+    store = data["store"]
+    for row in rows:
+        store.append(row)
+    accumulator.apply_insert(rows)
+    data["count"] = len(store)
+
 def get_statistics(data):
     """
     Generate basic statistics from the parsed data
     """
-    if not data or "data" not in data or not data["data"]:
+    if not data or not data.get("store"):
         return None
     
-    # Count occurrences for categorical columns
-    gender_counts = {}
-    nationality_counts = {}
-    school_counts = {}
-    bac_type_counts = {}
+    result = _accumulator(data).plan.result
+    row_count = result('total_students')
+    store = data["store"]
     
-    # Count boolean columns
-    scholarship_count = 0
-    graduated_count = 0
-    
-    for record in data["data"]:
-        # Gender counts
-        gender = record.get("Gender", "Unknown")
-        gender_counts[gender] = gender_counts.get(gender, 0) + 1
-        
-        # Nationality counts
-        nationality = record.get("Nationality", "Unknown")
-        nationality_counts[nationality] = nationality_counts.get(nationality, 0) + 1
-        
-        # School counts
-        school = record.get("School", "Unknown")
-        school_counts[school] = school_counts.get(school, 0) + 1
-        
-        # Bac type counts
-        bac_type = record.get("Baccalaureat_Type", "Unknown")
-        bac_type_counts[bac_type] = bac_type_counts.get(bac_type, 0) + 1
-        
-        # Scholarship count
-        if record.get("Scholarship") is True:
-            scholarship_count += 1
-        
-        # Graduated count
-        if record.get("Graduated") is True:
-            graduated_count += 1
+    def counts(name):
+        per_code = result(f'count_by_{name}')
+        return {value: per_code[code] for code, value in enumerate(store.categorical[name].values) if code in per_code}
     
     stats = {
-        "total_students": len(data["data"]),
-        "gender_distribution": gender_counts,
-        "nationalities": nationality_counts,
-        "schools": school_counts,
-        "bac_types": bac_type_counts,
-        "scholarship_percentage": (scholarship_count / len(data["data"])) * 100 if data["data"] else 0,
-        "graduation_rate": (graduated_count / len(data["data"])) * 100 if data["data"] else 0
+        "total_students": row_count,
+        "gender_distribution": counts("Gender"),
+        "nationalities": counts("Nationality"),
+        "schools": counts("School"),
+        "bac_types": counts("Baccalaureat_Type"),
+        "scholarship_percentage": (result('scholarship_count') / row_count) * 100,
+        "graduation_rate": (result('graduated_count') / row_count) * 100
     }
     
     return stats
@@ -212,8 +165,8 @@ if __name__ == "__main__":
     
     if data:
         logger.info("\n=== Aperçu des données ===")
-        for i, record in enumerate(data["data"][:5]):
-            logger.info(f"Record {i+1}: {record}")
+        for i in range(min(5, data["count"])):
+            logger.info(f"Record {i+1}: {data['store'].record(i)}")
             
         stats = get_statistics(data)
         logger.info("\n=== Statistiques des données ===")
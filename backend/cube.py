@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Cube OLAP pré-agrégé sur les dimensions principales des étudiants.
+
+Une cellule par combinaison présente de CUBE_DIMENSIONS (School, Specialty,
+Gender, Baccalaureat_Type, Scholarship, Start_Year, Current_Status, Graduated)
+contient l'effectif, la somme et la somme des carrés de Mark (virgule fixe,
+MARK_SCALE) et la somme des moyennes semestrielles (étudiants ayant au moins
+6 semestres, échelle de stats_accumulator.MEASURE_SCALES).
+
+Le cube est une GroupTable (voir aggregation.py) dont le groupe est le tuple
+des codes des dimensions; chaque dimension a son propre dictionnaire de
+valeurs. La construction (`add_store`) est un seul passage sur les colonnes du
+StudentStore: code composite des dimensions, puis sommes par cellule avec les
+noyaux de groupby.py. Quand le nombre de combinaisons possibles dépasse
+largement le nombre de lignes, les codes composites sont d'abord renumérotés
+sur les seules combinaisons présentes.
+
+Une requête (`query`) agrège les cellules, jamais les lignes: filtres sur
+n'importe quelles dimensions (slice/dice), puis regroupement sur les
+dimensions demandées (roll-up des autres). Le cube se fusionne (`merge`) et se
+complète avec les lignes ajoutées au fichier.
+"""
+
+import sys
+import time
+
+from aggregation import GroupTable
+from groupby import column, combine_codes, group_sum, numpy_available, scaled_integers, split_code
+from stats_accumulator import MEASURE_SCALES, semester_averages
+from student_store import MARK_SCALE, MISSING_YEAR
+
+if numpy_available:
+    import numpy as np
+
+CUBE_DIMENSIONS = ('School', 'Specialty', 'Gender', 'Baccalaureat_Type', 'Scholarship', 'Start_Year',
+                   'Current_Status', 'Graduated')
+FLAG_DIMENSIONS = ('Scholarship', 'Graduated')  # 1 si la valeur est True, 0 sinon
+CUBE_MEASURES = ('Mark', 'Semester_Avg')
+
+# Au-delà de ce rapport combinaisons possibles / lignes, les codes composites sont renumérotés
+DENSE_RATIO = 4
+
+
+def parse_value(dimension, text):
+    """Valeur d'une dimension à partir de sa forme texte (paramètre de requête)"""
+    if dimension in FLAG_DIMENSIONS:
+        lowered = text.strip().lower()
+        if lowered not in ('true', 'false', '1', '0'):
+            raise ValueError(f"{dimension} vaut true ou false (reçu: {text})")
+        return lowered in ('true', '1')
+    if dimension == 'Start_Year':
+        text = text.strip()
+        if text.lower() in ('', 'none', 'null'):
+            return None
+        if not text.isdigit():
+            raise ValueError(f"Start_Year doit être une année (reçu: {text})")
+        return int(text)
+    return text
+
+
+class StudentCube:
+    """Cube pré-agrégé (voir le docstring du module)"""
+
+    def __init__(self, dimensions=CUBE_DIMENSIONS):
+        self.dimensions = tuple(dimensions)
+        self.labels = {name: [False, True] if name in FLAG_DIMENSIONS else [] for name in self.dimensions}
+        self._index = {name: {value: code for code, value in enumerate(values)}
+                       for name, values in self.labels.items()}
+        self.table = GroupTable(self.dimensions, None, CUBE_MEASURES, (True, False))
+        self.rows = 0
+        self.build_seconds = 0.0
+        self._arrays = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_arrays'] = None
+        return state
+
+    def _code(self, dimension, value):
+        index = self._index[dimension]
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(self.labels[dimension])
+            self.labels[dimension].append(value)
+        return code
+
+    def _dimension_codes(self, store, name, start, end):
+        """Codes (dans le dictionnaire du cube) de la dimension `name` pour les lignes [start, end)"""
+        if name in FLAG_DIMENSIONS:
+            flags = store.scholarship if name == 'Scholarship' else store.graduated
+            return flags.flags(True)[start:end]
+        if name == 'Start_Year':
+            years = store.start_years[start:end]
+            if numpy_available:
+                distinct, inverse = np.unique(column(years), return_inverse=True)
+                lookup = np.array([self._code(name, int(year) if year != MISSING_YEAR else None)
+                                   for year in distinct.tolist()], dtype=np.int64)
+                return lookup[inverse]
+            return [self._code(name, year if year != MISSING_YEAR else None) for year in years]
+        lookup = [self._code(name, value) for value in store.categories(name)]
+        codes = store.codes(name)[start:end]
+        if numpy_available:
+            return np.array(lookup, dtype=np.int64)[column(codes)]
+        return [lookup[code] for code in codes]
+
+    def add_store(self, store, start=0, weights=None, end=None):
+        """
+        Ajoute les lignes store[start:end] au cube (un passage sur les colonnes).
+        `weights` (optionnel): poids d'inclusion de chaque ligne du stockage.
+
+        Returns:
+            Ce cube
+        """
+        end = len(store) if end is None else min(end, len(store))
+        if start >= end:
+            return self
+        began = time.time()
+        length = end - start
+        columns = [self._dimension_codes(store, name, start, end) for name in self.dimensions]
+        sizes = [len(self.labels[name]) for name in self.dimensions]
+        codes, size = combine_codes(columns, sizes)
+        decode = lambda code: split_code(code, sizes)
+        if size > DENSE_RATIO * length:
+            # Combinaisons possibles bien plus nombreuses que les lignes: numéroter les seules présentes
+            if numpy_available:
+                present, codes = np.unique(codes, return_inverse=True)
+                present = present.tolist()
+            else:
+                renumber = {}
+                codes = [renumber.setdefault(code, len(renumber)) for code in codes]
+                present = sorted(renumber, key=renumber.get)
+            size = len(present)
+            decode = lambda code: split_code(present[code], sizes)
+
+        averages, averages_present = semester_averages(store.semesters, start, end)
+        measures = {
+            'Mark': (column(scaled_integers(store.marks[start:end], MARK_SCALE)), None),
+            'Semester_Avg': (column(averages), column(averages_present))
+        }
+        self.table.add_columns(codes, size, decode, measures,
+                               column(weights[start:end]) if weights is not None else None)
+        self.rows += length
+        self.build_seconds += time.time() - began
+        self._arrays = None
+        return self
+
+    def merge(self, other):
+        """Ajoute les cellules d'un cube calculé sur d'autres lignes (codes traduits par valeur)"""
+        translate = {name: [self._code(name, value) for value in other.labels[name]] for name in self.dimensions}
+        self.table.merge(other.table, translate)
+        self.rows += other.rows
+        self._arrays = None
+        return self
+
+    @property
+    def cells(self):
+        return self.table.cells
+
+    def info(self):
+        """Taille du cube: cellules présentes, combinaisons possibles, mémoire estimée"""
+        possible = 1
+        for name in self.dimensions:
+            possible *= max(1, len(self.labels[name]))
+        cells = self.table.cells
+        nbytes = sys.getsizeof(cells) + sum(sys.getsizeof(group) + sys.getsizeof(cell) +
+                                            sum(sys.getsizeof(value) for value in cell)
+                                            for group, cell in cells.items())
+        return {
+            "dimensions": {name: len(self.labels[name]) for name in self.dimensions},
+            "cells": len(cells),
+            "possible_cells": possible,
+            "density": round(len(cells) / possible, 6) if possible else 0,
+            "rows": self.rows,
+            "bytes": nbytes,
+            "build_seconds": round(self.build_seconds, 3)
+        }
+
+    def _cell_arrays(self):
+        """Cellules en colonnes (codes des dimensions, effectifs et moments), recalculées après un ajout"""
+        if self._arrays is None:
+            groups = list(self.table.cells)
+            cells = [self.table.cells[group] for group in groups]
+            mark, semester = self.table.slot('Mark'), self.table.slot('Semester_Avg')
+            slots = {
+                'count': [cell[0] for cell in cells],
+                'mark_sum': [cell[mark] for cell in cells],
+                'mark_present': [cell[mark + 1] for cell in cells],
+                'mark_squares': [cell[mark + 2] for cell in cells],
+                'semester_sum': [cell[semester] for cell in cells],
+                'semester_present': [cell[semester + 1] for cell in cells]
+            }
+            coordinates = list(zip(*groups)) if groups else [[] for _ in self.dimensions]
+            if numpy_available:
+                coordinates = [np.array(codes, dtype=np.int64) for codes in coordinates]
+                slots = {name: _numeric_array(values) for name, values in slots.items()}
+            self._arrays = (coordinates, slots)
+        return self._arrays
+
+    def query(self, group_by=(), filters=None):
+        """
+        Agrège les cellules du cube.
+
+        Args:
+            group_by: Dimensions du regroupement (les autres sont agrégées)
+            filters: {dimension: liste de valeurs acceptées} (slice sur une valeur, dice sur plusieurs)
+
+        Returns:
+            Liste de groupes {dimension: valeur, ..., "count", "graduated", "graduation_rate",
+            "scholarship_rate", "avg_mark", "mark_variance", "avg_semester_mark"}
+        """
+        group_by = tuple(group_by)
+        filters = filters or {}
+        for name in (*group_by, *filters):
+            if name not in self.dimensions:
+                raise ValueError(f"Dimension inconnue: {name} (disponibles: {', '.join(self.dimensions)})")
+
+        coordinates, slots = self._cell_arrays()
+        positions = {name: i for i, name in enumerate(self.dimensions)}
+        selected = None
+        for name, values in filters.items():
+            accepted = {self._index[name][value] for value in values if value in self._index[name]}
+            codes = coordinates[positions[name]]
+            if numpy_available:
+                mask = np.isin(codes, list(accepted))
+                selected = mask if selected is None else selected & mask
+            else:
+                mask = [code in accepted for code in codes]
+                selected = mask if selected is None else [a and b for a, b in zip(selected, mask)]
+
+        def pick(values):
+            if selected is None:
+                return values
+            if numpy_available:
+                return values[selected]
+            return [value for value, flag in zip(values, selected) if flag]
+
+        columns = [pick(coordinates[positions[name]]) for name in group_by]
+        sizes = [len(self.labels[name]) for name in group_by]
+        counts = pick(slots['count'])
+        if group_by:
+            codes, size = combine_codes(columns, sizes)
+        else:
+            codes, size = [0] * len(counts), 1
+        if numpy_available and len(counts):
+            present, codes = np.unique(np.asarray(codes), return_inverse=True)
+            present = present.tolist()
+        else:
+            renumber = {}
+            codes = [renumber.setdefault(code, len(renumber)) for code in codes]
+            present = sorted(renumber, key=renumber.get)
+        size = len(present)
+
+        def totals(values):
+            return group_sum(codes, size, values)
+
+        graduated_flags = pick(coordinates[positions['Graduated']]) if 'Graduated' in positions else None
+        scholarship_flags = pick(coordinates[positions['Scholarship']]) if 'Scholarship' in positions else None
+        count_totals = totals(counts)
+        graduated = totals(_times(counts, graduated_flags)) if graduated_flags is not None else None
+        scholarship = totals(_times(counts, scholarship_flags)) if scholarship_flags is not None else None
+        mark_sum, mark_present = totals(pick(slots['mark_sum'])), totals(pick(slots['mark_present']))
+        mark_squares = totals(pick(slots['mark_squares']))
+        semester_sum, semester_present = totals(pick(slots['semester_sum'])), totals(pick(slots['semester_present']))
+        semester_scale = MEASURE_SCALES['Semester_Avg']
+
+        results = []
+        for index, composite in enumerate(present):
+            count = count_totals[index]
+            group = {name: self.labels[name][code]
+                     for name, code in zip(group_by, split_code(composite, sizes) if group_by else ())}
+            group["count"] = round(count)
+            if graduated is not None:
+                group["graduated"] = round(graduated[index])
+                group["graduation_rate"] = round(graduated[index] / count * 100, 1) if count else 0
+            if scholarship is not None:
+                group["scholarship_rate"] = round(scholarship[index] / count * 100, 1) if count else 0
+            present_marks = mark_present[index]
+            group["avg_mark"] = round(mark_sum[index] / (present_marks * MARK_SCALE), 2) if present_marks else None
+            group["mark_variance"] = (round((mark_squares[index] * present_marks - mark_sum[index] ** 2) /
+                                            (present_marks * present_marks * MARK_SCALE * MARK_SCALE), 2)
+                                      if present_marks else None)
+            group["avg_semester_mark"] = (round(semester_sum[index] / (semester_present[index] * semester_scale), 2)
+                                          if semester_present[index] else None)
+            results.append(group)
+        results.sort(key=lambda group: tuple(str(group[name]) for name in group_by))
+        return results
+
+
+def _numeric_array(values):
+    """Tableau int64 si toutes les valeurs sont entières (sommes exactes), float64 sinon"""
+    if all(isinstance(value, int) for value in values):
+        return np.array(values, dtype=np.int64)
+    return np.array(values, dtype=np.float64)
+
+
+def _times(values, flags):
+    if numpy_available:
+        return values * flags
+    return [value * flag for value, flag in zip(values, flags)]
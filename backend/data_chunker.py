@@ -6,12 +6,20 @@ afin d'éviter les problèmes de mémoire et améliorer les performances.
 
 import os
 import csv
-import json
+import math
 import gc
 import time
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from compressed_input import estimated_size, is_compressed, open_input
+from line_filter import LineFilter
+from semester_decoder import MAX_ABS_MARK, decode_semester_mark
+from sketches import ColumnSketches
+from stats_accumulator import StatsAccumulator
+from student_store import CATEGORICAL_COLUMNS, MISSING_YEAR, NAN, SEMESTER_COLUMNS, DecodedRow, StudentStore
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,7 +28,7 @@ logger = logging.getLogger(__name__)
 class DataChunker:
     """Classe pour traiter des fichiers CSV volumineux par chunks."""
     
-    def __init__(self, file_path, chunk_size=5000, max_rows=None):
+    def __init__(self, file_path, chunk_size=5000, max_rows=None, workers=1):
         """
         Initialiser le chunker.
         
@@ -28,10 +36,12 @@ class DataChunker:
             file_path: Chemin vers le fichier CSV à traiter
             chunk_size: Nombre de lignes à traiter par chunk
             max_rows: Nombre maximum de lignes à traiter (None pour tout traiter)
+            workers: Nombre de processus pour le traitement parallèle (1 = séquentiel)
         """
         self.file_path = file_path
         self.chunk_size = chunk_size
         self.max_rows = max_rows
+        self.workers = max(1, int(workers or 1))
         self.headers = None
         self.total_rows_processed = 0
         self.start_time = None
@@ -53,13 +63,23 @@ class DataChunker:
         """
         Traite le fichier CSV par chunks en appelant processor_func sur chaque chunk.
         
+        Avec workers > 1, le fichier est découpé en plages d'octets alignées sur des
+        débuts d'enregistrement, traitées dans un pool de processus puis combinées
+        dans l'ordre du fichier. processor_func (et merge_func) doivent alors être des
+        fonctions de niveau module (sérialisables) et la fusion doit être associative
+        pour que le résultat soit identique au traitement séquentiel. max_rows impose
+        le traitement séquentiel.
+        
         Args:
             processor_func: Fonction de traitement prenant (chunk, headers, *args, **kwargs)
             *args, **kwargs: Arguments supplémentaires à passer à processor_func
+                (merge_func, si fourni, sert à combiner les résultats et n'est pas transmis)
             
         Returns:
             Résultat cumulatif retourné par processor_func pour chaque chunk
         """
+        merge_func = kwargs.pop('merge_func', None)
+        
         if not os.path.exists(self.file_path):
             logger.error(f"Fichier non trouvé: {self.file_path}")
             return None
@@ -69,11 +89,20 @@ class DataChunker:
         
         try:
             # Determiner la taille du fichier pour les rapports de progression
-            file_size = os.path.getsize(self.file_path)
-            logger.info(f"Début du traitement du fichier: {self.file_path} ({file_size / (1024*1024):.2f} MB)")
+            file_size = estimated_size(self.file_path)
+            compressed = is_compressed(self.file_path)
+            logger.info(f"Début du traitement du fichier: {self.file_path} ({file_size / (1024*1024):.2f} MB" +
+                        (", compressé)" if compressed else ")"))
+            
+            if self.workers > 1 and not self.max_rows:
+                if not compressed:
+                    return self._process_parallel(processor_func, args, kwargs, merge_func)
+                # Pas d'accès direct aux plages d'octets d'un flux compressé
+                logger.info("Fichier compressé: traitement séquentiel")
             
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
+            with open_input(self.file_path, 'r', encoding='utf-8', newline='') as f:
+                lines = LineFilter(f)
+                reader = csv.reader(lines)
                 self.headers = next(reader)
                 
                 chunk = []
@@ -87,54 +116,19 @@ class DataChunker:
                         break
                     
                     if len(row) != len(self.headers):
-                        logger.warning(f"Ligne {row_count}: nombre de colonnes incorrect (ignorée)")
+                        logger.warning(f"Ligne {lines.line_number}: nombre de colonnes incorrect (ignorée)")
                         continue
                     
-                    # Convertir la ligne en dictionnaire
-                    record = {}
-                    for i, header in enumerate(self.headers):
-                        value = row[i].strip() if i < len(row) else ""
-                        
-                        # Convertir les booléens
-                        if value.lower() == 'true':
-                            value = True
-                        elif value.lower() == 'false':
-                            value = False
-                        
-                        # Essayer de parser les colonnes JSON (comme les semestres S1, S2, etc.)
-                        elif header.startswith('S') and header[1:].isdigit() and value:
-                            try:
-                                value = json.loads(value)
-                            except json.JSONDecodeError:
-                                logger.warning(f"JSON invalide dans la colonne {header}: {value}")
-                        
-                        record[header] = value
-                    
-                    chunk.append(record)
+                    chunk.append(self._to_record(row))
                     
                     # Traiter le chunk quand il atteint la taille définie
                     if len(chunk) >= self.chunk_size:
                         chunk_count += 1
                         self.total_rows_processed += len(chunk)
                         
-                        # Appeler la fonction de traitement
+                        # Appeler la fonction de traitement et combiner les résultats
                         chunk_result = processor_func(chunk, self.headers, *args, **kwargs)
-                        
-                        # Combiner les résultats
-                        if result is None:
-                            result = chunk_result
-                        elif chunk_result is not None:
-                            if isinstance(result, dict) and isinstance(chunk_result, dict):
-                                # Fusionner les dictionnaires
-                                self._merge_dicts(result, chunk_result)
-                            elif isinstance(result, list) and isinstance(chunk_result, list):
-                                # Fusionner les listes
-                                result.extend(chunk_result)
-                            else:
-                                # Utiliser la fonction de fusion personnalisée si fournie
-                                merge_func = kwargs.get('merge_func')
-                                if merge_func and callable(merge_func):
-                                    result = merge_func(result, chunk_result)
+                        result = self._combine(result, chunk_result, merge_func)
                         
                         # Rapport de progression
                         progress_percent = min(100, (self.total_rows_processed / (self.max_rows or float('inf'))) * 100)
@@ -151,18 +145,7 @@ class DataChunker:
                     self.total_rows_processed += len(chunk)
                     
                     chunk_result = processor_func(chunk, self.headers, *args, **kwargs)
-                    
-                    if result is None:
-                        result = chunk_result
-                    elif chunk_result is not None:
-                        if isinstance(result, dict) and isinstance(chunk_result, dict):
-                            self._merge_dicts(result, chunk_result)
-                        elif isinstance(result, list) and isinstance(chunk_result, list):
-                            result.extend(chunk_result)
-                        else:
-                            merge_func = kwargs.get('merge_func')
-                            if merge_func and callable(merge_func):
-                                result = merge_func(result, chunk_result)
+                    result = self._combine(result, chunk_result, merge_func)
                     
                     logger.info(f"Dernier chunk traité: {len(chunk)} lignes (total: {self.total_rows_processed})")
             
@@ -174,10 +157,149 @@ class DataChunker:
             traceback.print_exc()
             return None
     
+    def _to_record(self, row):
+        """Convertit une ligne CSV en dictionnaire typé"""
+        record = {}
+        for i, header in enumerate(self.headers):
+            value = row[i].strip() if i < len(row) else ""
+            
+            # Convertir les booléens
+            if value.lower() == 'true':
+                value = True
+            elif value.lower() == 'false':
+                value = False
+            
+            # Les colonnes de semestre (S1, S2, etc.) sont décodées en note (NaN si absente)
+            elif header.startswith('S') and header[1:].isdigit():
+                value = decode_semester_mark(value)
+            
+            record[header] = value
+        return record
+    
+    def _combine(self, result, chunk_result, merge_func=None):
+        """
+        Combine le résultat d'un chunk (ou d'une plage) avec le résultat cumulé:
+        merge_func si fourni, sinon merge() des accumulateurs (voir StatsAccumulator),
+        fusion des dictionnaires ou concaténation des listes
+        """
+        if result is None:
+            return chunk_result
+        if chunk_result is None:
+            return result
+        if merge_func and callable(merge_func):
+            # Utiliser la fonction de fusion personnalisée si fournie
+            result = merge_func(result, chunk_result)
+        elif hasattr(result, 'merge'):
+            # Accumulateur fusionnable
+            result = result.merge(chunk_result)
+        elif isinstance(result, dict) and isinstance(chunk_result, dict):
+            # Fusionner les dictionnaires
+            self._merge_dicts(result, chunk_result)
+        elif isinstance(result, list) and isinstance(chunk_result, list):
+            # Fusionner les listes
+            result.extend(chunk_result)
+        return result
+    
+    def _split_ranges(self):
+        """Découpe les données en plages d'octets [début, fin) alignées sur des débuts d'enregistrement"""
+        file_size = os.path.getsize(self.file_path)
+        with open(self.file_path, 'rb') as f:
+            data_start = self._read_header(f)
+            
+            step = max(1, (file_size - data_start) // self.workers)
+            boundaries = [data_start]
+            for i in range(1, self.workers):
+                boundary = self._align_to_record(f, data_start + i * step, file_size)
+                if boundary > boundaries[-1]:
+                    boundaries.append(boundary)
+            if file_size > boundaries[-1]:
+                boundaries.append(file_size)
+        return list(zip(boundaries, boundaries[1:]))
+    
+    def _read_header(self, f):
+        """Lit l'en-tête (première ligne utile) d'un fichier binaire et retourne l'offset des données"""
+        lines = LineFilter(iter(f.readline, b''))
+        self.headers = next(csv.reader([next(lines).decode('utf-8')]))
+        return f.tell()
+    
+    def _align_to_record(self, f, offset, file_size):
+        """
+        Retourne le premier début d'enregistrement à partir de `offset`.
+        Une ligne n'est retenue que si elle forme à elle seule un enregistrement complet
+        (guillemets équilibrés, bon nombre de colonnes): on ne coupe donc jamais au milieu
+        d'une cellule JSON entre guillemets.
+        """
+        # Se placer juste avant l'offset pour ne pas sauter une ligne commençant exactement à l'offset
+        f.seek(offset - 1)
+        f.readline()
+        while True:
+            position = f.tell()
+            line = f.readline()
+            if not line:
+                return file_size
+            if line.count(b'"') % 2 == 0:
+                try:
+                    fields = next(csv.reader([line.decode('utf-8')]))
+                except (UnicodeDecodeError, csv.Error, StopIteration):
+                    continue
+                if len(fields) == len(self.headers):
+                    return position
+    
+    def _process_parallel(self, processor_func, args, kwargs, merge_func):
+        """Traite les plages d'octets dans un pool de processus et combine les résultats dans l'ordre"""
+        ranges = self._split_ranges()
+        logger.info(f"Traitement parallèle: {len(ranges)} plages sur {self.workers} processus")
+        
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(_process_range, self.file_path, self.chunk_size, start, end,
+                                       processor_func, args, kwargs, merge_func)
+                       for start, end in ranges]
+            
+            result = None
+            for index, future in enumerate(futures):
+                range_result, rows = future.result()
+                self.total_rows_processed += rows
+                result = self._combine(result, range_result, merge_func)
+                logger.info(f"Plage {index + 1}/{len(ranges)} traitée: {rows} lignes " +
+                           f"(total: {self.total_rows_processed})")
+        return result
+    
+    def _process_byte_range(self, start, end, processor_func, args, kwargs, merge_func):
+        """Traite les enregistrements commençant dans [start, end) (exécuté dans un processus du pool)"""
+        def lines():
+            with open(self.file_path, 'rb') as f:
+                f.seek(start)
+                position = start
+                while position < end:
+                    line = f.readline()
+                    if not line:
+                        break
+                    position += len(line)
+                    yield line.decode('utf-8')
+        
+        result = None
+        chunk = []
+        rows = 0
+        for row in csv.reader(LineFilter(lines())):
+            if len(row) != len(self.headers):
+                logger.warning(f"Octets {start}-{end}: nombre de colonnes incorrect (ligne ignorée)")
+                continue
+            chunk.append(self._to_record(row))
+            if len(chunk) >= self.chunk_size:
+                rows += len(chunk)
+                result = self._combine(result, processor_func(chunk, self.headers, *args, **kwargs), merge_func)
+                chunk = []
+        if chunk:
+            rows += len(chunk)
+            result = self._combine(result, processor_func(chunk, self.headers, *args, **kwargs), merge_func)
+        return result, rows
+    
     def _merge_dicts(self, dict1, dict2):
         """
         Fusionne récursivement dict2 dans dict1.
-        - Les valeurs numériques sont additionnées
+        - Les accumulateurs (objets ayant une méthode merge) sont fusionnés
+        - Les valeurs numériques sont additionnées: réservé aux effectifs et sommes,
+          une moyenne ou un taux doit être porté par un accumulateur
         - Les listes sont étendues
         - Les dictionnaires sont fusionnés récursivement
         - Les autres types sont remplacés par dict2
@@ -185,7 +307,9 @@ class DataChunker:
         for key, value in dict2.items():
             if key in dict1:
                 # Décider de la stratégie de fusion selon le type
-                if isinstance(dict1[key], (int, float)) and isinstance(value, (int, float)):
+                if hasattr(dict1[key], 'merge'):
+                    dict1[key] = dict1[key].merge(value)
+                elif isinstance(dict1[key], (int, float)) and isinstance(value, (int, float)):
                     dict1[key] += value
                 elif isinstance(dict1[key], list) and isinstance(value, list):
                     dict1[key].extend(value)
@@ -198,6 +322,13 @@ class DataChunker:
                 # Clé nouvelle, simplement ajouter
                 dict1[key] = value
 
+def _process_range(file_path, chunk_size, start, end, processor_func, args, kwargs, merge_func):
+    """Point d'entrée d'un processus du pool: traite une plage d'octets du fichier"""
+    chunker = DataChunker(file_path, chunk_size=chunk_size)
+    with open(file_path, 'rb') as f:
+        chunker._read_header(f)
+    return chunker._process_byte_range(start, end, processor_func, args, kwargs, merge_func)
+
 # Exemples de fonctions de traitement à utiliser avec DataChunker
 
 def count_by_attribute(chunk, headers, attribute):
@@ -213,88 +344,63 @@ def count_by_attribute(chunk, headers, attribute):
         counts[value] += 1
     return counts
 
+def _decoded_record(record):
+    """DecodedRow (voir student_store.RowDecoder) d'un enregistrement typé par DataChunker._to_record"""
+    categories = tuple(str(record[name]).strip() if name in record else "Unknown"
+                       for name in CATEGORICAL_COLUMNS)
+    
+    mark = record.get("Mark", 0.0)
+    try:
+        mark = float(mark) if not isinstance(mark, bool) else 0.0
+    except ValueError:
+        mark = 0.0
+    if not math.isfinite(mark) or abs(mark) > MAX_ABS_MARK:
+        mark = 0.0
+    
+    year = str(record.get("Start_Year", "")).strip()
+    start_year = int(year) if year.isdigit() else MISSING_YEAR
+    
+    scholarship = record.get("Scholarship")
+    graduated = record.get("Graduated")
+    semesters = [record[name] if isinstance(record.get(name), float) else NAN for name in SEMESTER_COLUMNS]
+    
+    return DecodedRow(categories, mark, start_year,
+                      scholarship if isinstance(scholarship, bool) else None,
+                      graduated if isinstance(graduated, bool) else None,
+                      semesters, ())
+
 def calculate_statistics(chunk, headers):
     """
-    Calcule diverses statistiques sur un chunk de données.
+    Calcule les statistiques du tableau de bord sur un chunk de données.
+    Le résultat est un StatsAccumulator: fusionné sur tous les chunks (merge_statistics),
+    il donne exactement les statistiques d'un passage unique (finalize()).
     """
-    stats = {
-        "total": len(chunk),
-        "gender_counts": {},
-        "nationality_counts": {},
-        "scholarship_count": 0,
-        "graduated_count": 0,
-        "mark_sum": 0,
-        "mark_count": 0
-    }
-    
+    accumulator = StatsAccumulator(StudentStore(headers))
     for record in chunk:
-        # Comptes par genre
-        gender = record.get("Gender", "Unknown")
-        if gender not in stats["gender_counts"]:
-            stats["gender_counts"][gender] = 0
-        stats["gender_counts"][gender] += 1
-        
-        # Comptes par nationalité
-        nationality = record.get("Nationality", "Unknown")
-        if nationality not in stats["nationality_counts"]:
-            stats["nationality_counts"][nationality] = 0
-        stats["nationality_counts"][nationality] += 1
-        
-        # Compter les bourses et diplômés
-        if record.get("Scholarship") is True:
-            stats["scholarship_count"] += 1
-        
-        if record.get("Graduated") is True:
-            stats["graduated_count"] += 1
-        
-        # Somme des notes pour calculer la moyenne
-        try:
-            mark = float(record.get("Mark", 0))
-            stats["mark_sum"] += mark
-            stats["mark_count"] += 1
-        except:
-            pass
-    
-    return stats
+        accumulator.add(_decoded_record(record))
+    return accumulator
+
+def calculate_sketches(chunk, headers, columns=('Nationality', 'City')):
+    """
+    Résumés approximatifs (valeurs distinctes et fréquentes, voir sketches.py) de colonnes
+    à forte cardinalité sur un chunk; fusionnés entre chunks par leur méthode merge().
+    """
+    sketches = ColumnSketches(columns)
+    for record in chunk:
+        for name in columns:
+            if name in record:
+                sketches[name].add(str(record[name]).strip())
+    return sketches
 
 def merge_statistics(stats1, stats2):
     """
-    Fonction personnalisée pour fusionner deux objets statistiques.
+    Fusionne deux accumulateurs de statistiques (fusion associative et exacte).
     """
     if stats1 is None:
         return stats2
     if stats2 is None:
         return stats1
-    
-    result = {
-        "total": stats1["total"] + stats2["total"],
-        "gender_counts": {},
-        "nationality_counts": {},
-        "scholarship_count": stats1["scholarship_count"] + stats2["scholarship_count"],
-        "graduated_count": stats1["graduated_count"] + stats2["graduated_count"],
-        "mark_sum": stats1["mark_sum"] + stats2["mark_sum"],
-        "mark_count": stats1["mark_count"] + stats2["mark_count"]
-    }
-    
-    # Fusionner les comptes par genre
-    for gender, count in stats1["gender_counts"].items():
-        result["gender_counts"][gender] = count
-    for gender, count in stats2["gender_counts"].items():
-        if gender in result["gender_counts"]:
-            result["gender_counts"][gender] += count
-        else:
-            result["gender_counts"][gender] = count
-    
-    # Fusionner les comptes par nationalité
-    for nat, count in stats1["nationality_counts"].items():
-        result["nationality_counts"][nat] = count
-    for nat, count in stats2["nationality_counts"].items():
-        if nat in result["nationality_counts"]:
-            result["nationality_counts"][nat] += count
-        else:
-            result["nationality_counts"][nat] = count
-    
-    return result
+    return stats1.merge(stats2)
 
 # Exemple d'utilisation
 
@@ -321,25 +427,22 @@ def main():
     
     # Exemple 2: Calculer des statistiques
     with DataChunker(csv_file, chunk_size=1000) as chunker:
-        statistics = chunker.process_file(calculate_statistics, merge_func=merge_statistics)
+        accumulator = chunker.process_file(calculate_statistics, merge_func=merge_statistics)
         
-        if statistics:
+        if accumulator:
+            statistics = accumulator.finalize()
             print("\n=== Statistiques générales ===")
-            print(f"Total d'étudiants: {statistics['total']}")
-            print(f"Nombre de boursiers: {statistics['scholarship_count']} " +
-                 f"({statistics['scholarship_count']/statistics['total']*100:.1f}%)")
-            print(f"Nombre de diplômés: {statistics['graduated_count']} " +
-                 f"({statistics['graduated_count']/statistics['total']*100:.1f}%)")
-            
-            if statistics['mark_count'] > 0:
-                avg_mark = statistics['mark_sum'] / statistics['mark_count']
-                print(f"Note moyenne: {avg_mark:.2f}/20")
+            print(f"Total d'étudiants: {statistics['total_students']}")
+            print(f"Boursiers: {statistics['scholarship_percentage']}%")
+            print(f"Diplômés: {statistics['graduation_rate']}%")
+            print(f"Note moyenne: {statistics['average_mark']:.2f}/20 " +
+                 f"(variance: {statistics['mark_variance']:.2f})")
             
             print("\nTop nationalités:")
-            sorted_nationalities = sorted(statistics['nationality_counts'].items(), 
+            sorted_nationalities = sorted(statistics['nationalities'].items(), 
                                          key=lambda x: x[1], reverse=True)
             for nat, count in sorted_nationalities[:5]:
-                print(f"{nat}: {count} ({count/statistics['total']*100:.1f}%)")
+                print(f"{nat}: {count} ({count/statistics['total_students']*100:.1f}%)")
     
     # Exemple 3: Traitement avec limitation du nombre de lignes
     with DataChunker(csv_file, chunk_size=1000, max_rows=5000) as chunker:
@@ -350,6 +453,25 @@ def main():
             sorted_schools = sorted(result.items(), key=lambda x: x[1], reverse=True)
             for school, count in sorted_schools:
                 print(f"{school}: {count}")
+    
+    # Exemple 4: Traitement parallèle sur plusieurs processus (même résultat que l'exemple 1)
+    with DataChunker(csv_file, chunk_size=1000, workers=os.cpu_count() or 1) as chunker:
+        gender_counts = chunker.process_file(count_by_attribute, 'Gender')
+        
+        if gender_counts:
+            print("\n=== Distribution par genre (parallèle) ===")
+            for gender, count in gender_counts.items():
+                print(f"{gender}: {count}")
+    
+    # Exemple 5: Villes distinctes et plus fréquentes en mémoire fixe (résumés fusionnés entre processus)
+    with DataChunker(csv_file, chunk_size=1000, workers=os.cpu_count() or 1) as chunker:
+        sketches = chunker.process_file(calculate_sketches)
+        
+        if sketches:
+            city_summary = sketches['City'].summary(5)
+            print(f"\n=== Villes (environ {city_summary['distinct']} distinctes) ===")
+            for city, count in city_summary['top'].items():
+                print(f"{city}: {count} (+{city_summary['error_bounds']['count_max_error']} au plus)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Noyaux group-by sur colonnes catégorielles encodées.
+
+Les colonnes catégorielles du StudentStore sont des codes entiers (0..size-1):
+effectifs, sommes, moyennes, variances, minimums/maximums et tableaux croisés
+par groupe se calculent sans objet Python par ligne, avec numpy.bincount et
+les ufuncs `at` (opérations vectorisées sur les tableaux des colonnes, lus sans
+copie depuis les `array` du stockage).
+
+NumPy est optionnel: sans lui, les mêmes fonctions bouclent en Python et
+renvoient les mêmes résultats. Les résultats sont des listes Python (une valeur
+par code). Les sommes de valeurs entières non pondérées sont exactes: bincount
+travaillant en float64, les valeurs sont découpées en deux moitiés de bits
+dont les sommes restent sous 2**53.
+"""
+
+from array import array
+
+try:
+    import numpy as np
+    numpy_available = True
+except ImportError:
+    np = None
+    numpy_available = False
+
+_EXACT_FLOAT = 2 ** 53
+_SPLIT_BITS = 26
+
+
+def column(values):
+    """
+    Colonne utilisable par les noyaux: tableau NumPy (sans copie pour array, bytes
+    et memoryview), ou liste Python sans NumPy.
+    """
+    if not numpy_available:
+        return values if isinstance(values, (list, tuple)) else list(values)
+    if isinstance(values, np.ndarray):
+        return values
+    if isinstance(values, (bytes, bytearray)):
+        return np.frombuffer(values, dtype=np.uint8)
+    if isinstance(values, (array, memoryview)):
+        typecode = values.typecode if isinstance(values, array) else values.format
+        if not len(values):
+            return np.zeros(0, dtype=typecode)
+        return np.frombuffer(values, dtype=typecode)
+    return np.asarray(values)
+
+
+def zeros(length):
+    """Colonne de `length` codes nuls (un seul groupe)"""
+    if numpy_available:
+        return np.zeros(length, dtype=np.int64)
+    return [0] * length
+
+
+def select(values, mask):
+    """Valeurs des lignes dont le masque (0/1) est non nul"""
+    if numpy_available:
+        return column(values)[column(mask).astype(bool)]
+    return [value for value, flag in zip(values, mask) if flag]
+
+
+def equal_mask(codes, code):
+    """Masque 0/1 des lignes dont le code vaut `code` (aucune si `code` est None)"""
+    if numpy_available:
+        codes = column(codes)
+        if code is None:
+            return np.zeros(len(codes), dtype=np.uint8)
+        return (codes == code).view(np.uint8)
+    return [1 if value == code else 0 for value in codes]
+
+
+def within_mask(values, center, radius):
+    """Masque 0/1 des lignes dont la valeur est à au plus `radius` de `center`"""
+    if numpy_available:
+        return (np.abs(column(values).astype(np.float64) - center) <= radius).view(np.uint8)
+    return [1 if abs(value - center) <= radius else 0 for value in values]
+
+
+def at_least_mask(values, threshold):
+    """Masque 0/1 des lignes dont la valeur est au moins `threshold`"""
+    if numpy_available:
+        return (column(values) >= threshold).view(np.uint8)
+    return [1 if value >= threshold else 0 for value in values]
+
+
+def combine_codes(columns, sizes):
+    """
+    Code composite de plusieurs colonnes de codes: c1 * (s2 * s3...) + c2 * s3 + c3.
+
+    Returns:
+        (codes composites, nombre de groupes)
+    """
+    if not columns:
+        raise ValueError("Au moins une colonne est nécessaire")
+    size = 1
+    codes = None
+    for values, column_size in zip(columns, sizes):
+        if numpy_available:
+            values = column(values).astype(np.int64)
+            codes = values if codes is None else codes * column_size + values
+        else:
+            values = list(values)
+            codes = values if codes is None else [code * column_size + value for code, value in zip(codes, values)]
+        size *= column_size
+    return codes, size
+
+
+def split_code(code, sizes):
+    """Codes d'origine d'un code composite (inverse de combine_codes)"""
+    parts = []
+    for column_size in reversed(sizes[1:]):
+        code, part = divmod(code, column_size)
+        parts.append(part)
+    parts.append(code)
+    return tuple(reversed(parts))
+
+
+def _integral(values):
+    return numpy_available and values.dtype.kind in 'iub'
+
+
+def group_count(codes, size, weights=None):
+    """Nombre de lignes (ou somme des poids) par code"""
+    if numpy_available:
+        codes = column(codes)
+        if weights is None:
+            return np.bincount(codes, minlength=size).tolist()
+        weights = column(weights)
+        counts = np.bincount(codes, weights=weights, minlength=size)
+        if _integral(weights):
+            counts = counts.astype(np.int64)  # masques 0/1: effectifs entiers
+        return counts.tolist()
+    counts = [0] * size
+    if weights is None:
+        for code in codes:
+            counts[code] += 1
+    else:
+        for code, weight in zip(codes, weights):
+            counts[code] += weight
+    return counts
+
+
+def group_sum(codes, size, values, weights=None):
+    """Somme des valeurs (pondérées le cas échéant) par code; exacte pour des entiers à poids entiers"""
+    if numpy_available:
+        codes = column(codes)
+        values = column(values)
+        if weights is not None:
+            weights = column(weights)
+            if not (_integral(values) and _integral(weights)):
+                return np.bincount(codes, weights=values * weights, minlength=size).tolist()
+            values = values.astype(np.int64) * weights  # poids entiers (±1): somme exacte
+        if not _integral(values):
+            return np.bincount(codes, weights=values, minlength=size).tolist()
+        values = values.astype(np.int64)
+        largest = int(np.abs(values).max()) if len(values) else 0
+        if largest * len(values) < _EXACT_FLOAT:
+            return [int(total) for total in np.bincount(codes, weights=values, minlength=size)]
+        # Découpage v = high * 2**26 + low: chaque somme partielle reste exacte en float64
+        low = np.bincount(codes, weights=values & ((1 << _SPLIT_BITS) - 1), minlength=size)
+        high = np.bincount(codes, weights=values >> _SPLIT_BITS, minlength=size)
+        return [(int(h) << _SPLIT_BITS) + int(l) for h, l in zip(high, low)]
+    sums = [0] * size
+    if weights is None:
+        for code, value in zip(codes, values):
+            sums[code] += value
+    else:
+        for code, value, weight in zip(codes, values, weights):
+            sums[code] += value * weight
+    return sums
+
+
+def group_sum_squares(codes, size, values, weights=None):
+    """Somme des carrés des valeurs par code (exacte pour des entiers de moins de 31 bits à poids entiers)"""
+    if numpy_available:
+        values = column(values)
+        exact_weights = weights is None or _integral(column(weights))
+        if _integral(values) and exact_weights and (not len(values) or int(np.abs(values).max()) < 2 ** 31):
+            values = values.astype(np.int64)
+        else:
+            values = values.astype(np.float64)
+        return group_sum(codes, size, values * values, weights)
+    return group_sum(codes, size, [value * value for value in values], weights)
+
+
+def group_mean(codes, size, values, weights=None):
+    """Moyenne par code (None pour un code sans ligne)"""
+    counts = group_count(codes, size, weights)
+    sums = group_sum(codes, size, values, weights)
+    return [total / count if count else None for total, count in zip(sums, counts)]
+
+
+def group_variance(codes, size, values, weights=None):
+    """Variance (population) par code (None pour un code sans ligne)"""
+    counts = group_count(codes, size, weights)
+    sums = group_sum(codes, size, values, weights)
+    squares = group_sum_squares(codes, size, values, weights)
+    return [(square * count - total * total) / (count * count) if count else None
+            for total, square, count in zip(sums, squares, counts)]
+
+
+def _group_extreme(codes, size, values, numpy_ufunc, python_func):
+    if numpy_available:
+        codes = column(codes)
+        values = column(values)
+        if not len(values):
+            return [None] * size
+        present = np.bincount(codes, minlength=size) > 0
+        start = values.max() if numpy_ufunc is np.minimum else values.min()
+        result = np.full(size, start, dtype=values.dtype)
+        numpy_ufunc.at(result, codes, values)
+        return [value if flag else None for value, flag in zip(result.tolist(), present.tolist())]
+    result = [None] * size
+    for code, value in zip(codes, values):
+        current = result[code]
+        result[code] = value if current is None else python_func(current, value)
+    return result
+
+
+def group_min(codes, size, values):
+    """Minimum par code (None pour un code sans ligne)"""
+    return _group_extreme(codes, size, values, np.minimum if numpy_available else None, min)
+
+
+def group_max(codes, size, values):
+    """Maximum par code (None pour un code sans ligne)"""
+    return _group_extreme(codes, size, values, np.maximum if numpy_available else None, max)
+
+
+def crosstab(codes_a, size_a, codes_b, size_b, weights=None):
+    """Tableau croisé des effectifs: table[a][b] = lignes (ou poids) de codes (a, b)"""
+    codes, size = combine_codes([codes_a, codes_b], [size_a, size_b])
+    counts = group_count(codes, size, weights)
+    return [counts[a * size_b:(a + 1) * size_b] for a in range(size_a)]
+
+
+def value_counts(values, missing=None, weights=None):
+    """
+    {valeur: nombre de lignes} d'une colonne entière non encodée (années...), sans la valeur `missing`.
+    Avec `weights`: somme des poids des lignes de chaque valeur.
+    """
+    if numpy_available:
+        values = column(values)
+        if weights is not None:
+            weights = column(weights)[:len(values)]
+        if missing is not None:
+            present = values != missing
+            values = values[present]
+            if weights is not None:
+                weights = weights[present]
+        if weights is None:
+            distinct, counts = np.unique(values, return_counts=True)
+        else:
+            distinct, inverse = np.unique(values, return_inverse=True)
+            counts = np.bincount(inverse, weights=weights, minlength=len(distinct))
+        return dict(zip(distinct.tolist(), counts.tolist()))
+    counts = {}
+    if weights is None:
+        for value in values:
+            if value != missing:
+                counts[value] = counts.get(value, 0) + 1
+    else:
+        for value, weight in zip(values, weights):
+            if value != missing:
+                counts[value] = counts.get(value, 0) + weight
+    return counts
+
+
+def scaled_integers(values, scale):
+    """round(valeur * scale) pour chaque valeur (notes float32 en virgule fixe)"""
+    if numpy_available:
+        return np.rint(column(values).astype(np.float64) * scale).astype(np.int64)
+    cache = {}
+    result = []
+    for value in values:
+        scaled = cache.get(value)
+        if scaled is None:
+            scaled = cache[value] = round(value * scale)
+        result.append(scaled)
+    return result
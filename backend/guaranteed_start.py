@@ -9,15 +9,42 @@ Ce script:
 
 import os
 import sys
+import argparse
 import socket
 import http.server
-import socketserver
 import json
-from urllib.parse import urlparse
+import logging
+import math
+from urllib.parse import parse_qs, unquote, urlparse
 import threading
 import time
 import csv
 import shutil
+from bisect import bisect_right
+import email.policy
+from email.message import EmailMessage
+from email.parser import BytesHeaderParser
+
+from compressed_input import estimated_size, is_compressed, open_input
+from async_server import AsyncHTTPServer
+from concurrent_server import PooledHTTPServer, PreforkServer, ReadWriteLock
+from cube import StudentCube, parse_value
+from groupby import (at_least_mask, column, combine_codes, equal_mask, group_count, group_sum, scaled_integers,
+                     value_counts, within_mask, zeros)
+from http_keepalive import KeepAliveHandler
+from line_filter import LineFilter
+from parallel_stats import accumulate_statistics
+from mark_distribution import DEFAULT_BINS, DISTRIBUTION_COLUMNS, MAX_BINS, MarkDistributions
+from ingest import SchemaSink, SketchSink, StatsSink, StoreSink, ingest_csv
+from response_cache import accepts_gzip, render_body
+from row_index import RowIndex, RowIndexSink, write_index
+from sampling import ReservoirSink
+from tail_ingest import TAIL_BATCH_BYTES, TailBatch, TailWatcher, capture_state, read_tail
+from trajectories import AT_RISK_DROP, TrajectoryEngine
+from snapshot import PrefixHash, capture_snapshot, load_snapshot, source_key, write_snapshot_file
+from stat_graph import StatGraph
+from stats_accumulator import SemesterSuccessMap
+from student_store import MISSING_YEAR, MARK_SCALE, SEMESTER_COUNT
 
 # Configuration
 BASE_PORT = 8000  # Primary port to try first
@@ -28,17 +55,72 @@ CSV_FILE = os.path.join(DATA_DIR, 'students.csv')
 CLEAN_CSV_FILE = os.path.join(SAMPLE_DATA_DIR, 'euromed_students_clean.csv')
 ORIGINAL_CSV_FILE = os.path.join(SAMPLE_DATA_DIR, 'euromed_students.csv')
 
+# Au-delà de LARGE_FILE_MB, les statistiques sont calculées sur un échantillon aléatoire
+# stratifié de SAMPLE_SIZE lignes (strates: valeurs de SAMPLE_STRATA_KEY, ex. 'School'
+# ou 'Start_Year'; None pour un échantillon aléatoire simple)
+LARGE_FILE_MB = 50
+SAMPLE_SIZE = 100000
+SAMPLE_STRATA_KEY = 'School'
+
+# Résumés approximatifs en mémoire fixe (voir sketches.py) des colonnes à forte cardinalité:
+# False (comptage exact), True, ou 'auto' (seulement au-delà de LARGE_FILE_MB)
+SKETCH_MODE = False
+SKETCH_COLUMNS = ('Nationality', 'City')
+SKETCH_REPORTED_VALUES = 50  # valeurs fréquentes renvoyées par /api/statistics/city et /nationality
+
+# Processus de calcul des statistiques sur des partitions de lignes (voir parallel_stats.py):
+# 1 = calcul pendant la lecture, dans le processus du serveur; None = un processus par cœur
+STATS_WORKERS = 1
+
+# Serveur HTTP: threads de traitement des requêtes (par processus) et processus servant le port
+# (SERVER_PROCESSES > 1: processus créés par fork, voir concurrent_server.py)
+SERVER_THREADS = 16
+SERVER_PROCESSES = 1
+
+# Taille maximum d'un fichier envoyé à /api/upload
+MAX_UPLOAD_MB = 200
+
+# Nombre maximum de lignes renvoyées par page par /api/students
+MAX_PAGE_ROWS = 1000
+
+# Période (secondes) de vérification des lignes ajoutées au CSV (None pour désactiver)
+TAIL_POLL_SECONDS = 5
+
+# Délai (secondes) avant l'enregistrement de l'instantané et de l'index après un ajout de lignes:
+# les ajouts rapprochés sont enregistrés ensemble, en arrière-plan
+PERSIST_DELAY_SECONDS = 2
+
 # Données globales pour les endpoints
 csv_data = None
-stats = {}  # Initialisation de stats comme un dictionnaire vide
+# Chargement complet et ajout de lignes: `with data_lock:` (exclusif); requêtes et préchauffage:
+# `with data_lock.shared:` (les données ne changent pas pendant le traitement d'une requête)
+data_lock = ReadWriteLock()
+# Ajouts de lignes et rechargements, un à la fois (pris avant data_lock): la lecture des lignes
+# ajoutées se fait sous append_lock seul, les requêtes continuent d'être servies
+append_lock = threading.RLock()
+# Enregistrement de l'instantané et de l'index (un à la fois) et minuterie de l'enregistrement différé
+persist_lock = threading.Lock()
+persist_timer = None
+graph = StatGraph()  # Statistiques et réponses GET calculées à la demande (voir stat_graph.py)
+
+# Résultats du graphe enregistrés dans l'instantané quand ils sont déjà calculés
+PERSISTED_NODES = ("distributions", "cube")
 
 # Importer notre analyseur de schéma
 try:
-    from schema_analyzer import analyze_csv_schema, get_available_features
+    from schema_analyzer import (analyze_csv_schema, cache_schema, file_version, get_available_features,
+                                 get_cached_schema)
     schema_analyzer_available = True
 except ImportError:
     schema_analyzer_available = False
 
+# NumPy (optionnel) pour les scores calculés sur toutes les lignes
+try:
+    import numpy as np
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
 
 def is_port_available(port):
     """Vérifie si un port est disponible"""
@@ -71,14 +153,10 @@ def setup_data_directory():
         elif os.path.exists(ORIGINAL_CSV_FILE):
             # Copier en nettoyant
             print(f"🔄 Nettoyage et copie du fichier original...")
-            with open(ORIGINAL_CSV_FILE, 'r', encoding='utf-8') as infile:
-                lines = infile.readlines()
-            
-            # Supprimer les commentaires et autres problèmes
-            data_lines = [line for line in lines if not line.strip().startswith('//')]
-            
-            with open(CSV_FILE, 'w', encoding='utf-8') as outfile:
-                outfile.writelines(data_lines)
+            # Les commentaires et lignes vides sont supprimés au fil de la copie
+            with open_input(ORIGINAL_CSV_FILE, 'r', encoding='utf-8', newline='') as infile, \
+                    open(CSV_FILE, 'w', encoding='utf-8', newline='') as outfile:
+                outfile.writelines(LineFilter(infile))
             
             print(f"✅ Fichier nettoyé créé: {CSV_FILE}")
         
@@ -104,9 +182,8 @@ def create_sample_data():
 
 
 def parse_csv():
-    """Parse le fichier CSV sans dépendances externes - Optimisé pour les grands volumes"""
+    """Charge le fichier CSV en un seul passage (schéma, données et statistiques)"""
     global csv_data
-    global stats
     global schema_info
     global available_features
     
@@ -116,119 +193,142 @@ def parse_csv():
     
     try:
         print(f"📊 Chargement du fichier CSV: {CSV_FILE}")
-        file_size_mb = os.path.getsize(CSV_FILE) / (1024 * 1024)
-        print(f"📈 Taille du fichier: {file_size_mb:.2f} MB")
+        # Fichier compressé (gzip, bz2, xz): décompressé au fil de la lecture, seuils appliqués
+        # à la taille décompressée estimée
+        file_size_mb = estimated_size(CSV_FILE) / (1024 * 1024)
+        if is_compressed(CSV_FILE):
+            print(f"📈 Taille du fichier: {file_size_mb:.2f} MB (décompressé, estimation)")
+        else:
+            print(f"📈 Taille du fichier: {file_size_mb:.2f} MB")
         
         # Initialize schema variables regardless of file size
         schema_info = None
         available_features = []
+        is_large_file = file_size_mb > LARGE_FILE_MB
+        use_sketches = SKETCH_MODE is True or (SKETCH_MODE == 'auto' and is_large_file)
         
-        # Analyze schema if available - for all file sizes
-        if schema_analyzer_available:
-            print("📊 Analyse du schéma de données...")
-            try:
-                # For large files, use sample
-                sample_rows = 10000 if file_size_mb > 50 else None
-                schema_info = analyze_csv_schema(CSV_FILE, sample_rows=sample_rows)
-                if schema_info:
-                    available_features = get_available_features(schema_info)
-                    print(f"✅ Schéma analysé: {len(schema_info['headers'])} colonnes, {schema_info['row_count']} lignes")
-                    print(f"✅ {len(available_features)} fonctionnalités disponibles: {', '.join(available_features)}")
-            except Exception as e:
-                print(f"⚠️ Erreur lors de l'analyse du schéma: {str(e)}")
-                schema_info = None
-                available_features = []
-        
-        # Utiliser un chargement optimisé pour les grands fichiers
-        if file_size_mb > 50:  # Si plus de 50 MB
-            print("🚀 Utilisation du mode de chargement pour grands volumes de données")
-            
-            # Première étape: compter les lignes
-            with open(CSV_FILE, 'r', encoding='utf-8') as f:
-                total_rows = sum(1 for _ in f) - 1  # -1 pour l'en-tête
-            
-            print(f"📋 Nombre total de lignes: {total_rows}")
-            
-            # Déterminer si échantillonnage nécessaire
-            sample_size = None
-            if total_rows > 100000:  # Si plus de 100,000 lignes
-                print("⚠️ Le fichier est très volumineux. Utilisation d'un échantillon de 100,000 lignes pour les calculs.")
-                sample_size = 100000
-            
-            # Lire les données avec notre fonction optimisée
-            from csv_parser import parse_csv as optimized_parse_csv
-            result = optimized_parse_csv(CSV_FILE, max_rows=sample_size, chunk_size=10000)
-            
-            if not result:
-                print("❌ Échec du chargement des données!")
-                return False
-            
-            # Mise à jour des données globales
-            csv_data = result
-            csv_data["schema"] = schema_info
-            csv_data["available_features"] = available_features
-            csv_data["total_rows"] = total_rows  # Garder le décompte total même si échantillonné
-            
-            if sample_size and total_rows > sample_size:
-                csv_data["sampled"] = True
-                csv_data["sample_size"] = sample_size
-                print(f"⚙️ Traitement statistique sur un échantillon de {sample_size} lignes sur {total_rows} total")
-            
-            # Calculer les statistiques
-            print("📊 Calcul des statistiques...")
-            compute_statistics()
-            
-            print(f"✅ Données chargées et statistiques calculées avec succès")
-            return True
-            
-        else:
-            # Méthode standard pour les fichiers plus petits
-            # Lire le fichier CSV
-            with open(CSV_FILE, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                headers = next(reader)  # Lire les en-têtes
-                
-                # Lire toutes les lignes
-                data = []
-                for row in reader:
-                    if len(row) != len(headers):
-                        continue  # Ignorer les lignes avec un nombre incorrect de colonnes
-                    
-                    record = {}
-                    for i, header in enumerate(headers):
-                        value = row[i].strip() if i < len(row) else ""
-                        
-                        # Convertir les booléens
-                        if value.lower() == 'true':
-                            value = True
-                        elif value.lower() == 'false':
-                            value = False
-                        
-                        # Essayer de parser le JSON dans les colonnes de semestre
-                        elif header.startswith('S') and header[1:].isdigit() and value:
-                            try:
-                                value = json.loads(value)
-                            except:
-                                pass
-                        
-                        record[header] = value
-                    
-                    data.append(record)
-            
-            # Mettre à jour les données globales
+        # Instantané binaire à jour: pas besoin de relire le CSV
+        snapshot = load_snapshot(CSV_FILE, allow_append=True)
+        if snapshot is not None and snapshot["extras"].get("sampling", {}).get(
+                "strata_key", SAMPLE_STRATA_KEY) != SAMPLE_STRATA_KEY:
+            snapshot = None  # Échantillon tiré avec une autre stratification
+        if snapshot is not None and ("sketches" in snapshot["extras"]) != use_sketches:
+            snapshot = None  # Instantané enregistré dans l'autre mode (sketches ou comptage exact)
+        if snapshot is not None:
+            store = snapshot["store"]
+            schema_info = snapshot["schema_info"]
+            extras = snapshot["extras"]
+            available_features = extras.get("available_features", [])
+            persisted = {name: extras.pop(name) for name in PERSISTED_NODES if name in extras}
             csv_data = {
-                "columns": headers,
-                "data": data,
-                "count": len(data),
+                "columns": store.headers,
+                "store": store,
+                "count": len(store),
                 "schema": schema_info,
-                "available_features": available_features
+                **extras
             }
-            
-            # Calculer les statistiques de base
-            compute_statistics()
-            
-            print(f"✅ Données chargées avec succès: {len(data)} étudiants")
+            csv_data["tail_state"] = capture_state(CSV_FILE, extras["tail_offset"])
+            csv_data["prefix_hash"] = PrefixHash(CSV_FILE)
+            stats = snapshot["stats"]
+            stats["semester_success_map"] = SemesterSuccessMap(store)
+            csv_data["row_index"] = load_row_index(extras["tail_offset"])
+            # Résultats de l'instantané repris tels quels, les autres calculés à la demande
+            graph.reset({"data": csv_data, "stats_accumulator": snapshot["accumulator"], "stats": stats,
+                         **persisted})
+            print(f"⚡ Instantané chargé: {len(store)} étudiants ({CSV_FILE}.snap)")
+            # Lignes ajoutées au CSV depuis l'instantané: ne lire que celles-ci
+            append_new_rows()
+            # Résultats absents de l'instantané: calculés en arrière-plan puis enregistrés
+            warm_statistics(save=any(name not in persisted for name in PERSISTED_NODES))
             return True
+        
+        file_info = os.stat(CSV_FILE)
+        key = source_key(CSV_FILE)
+        version = file_version(CSV_FILE) if schema_analyzer_available else None
+        
+        # Pour les grands fichiers, le schéma est inféré sur un échantillon et seul un
+        # échantillon aléatoire stratifié est conservé (tiré sur l'ensemble du fichier)
+        sample_size = SAMPLE_SIZE if is_large_file else None
+        if is_large_file:
+            print("🚀 Utilisation du mode de chargement pour grands volumes de données")
+            reservoir_sink = ReservoirSink(sample_size, strata_key=SAMPLE_STRATA_KEY)
+            sinks = [reservoir_sink]
+            stats_sink = None  # statistiques calculées sur l'échantillon après la lecture
+        else:
+            reservoir_sink = None
+            store_sink = StoreSink()
+            sinks = [store_sink]
+            # En mode parallèle, les statistiques sont calculées après la lecture, par partitions
+            stats_sink = StatsSink(store_sink) if STATS_WORKERS == 1 else None
+            if stats_sink is not None:
+                sinks.append(stats_sink)
+        schema_sink = None
+        if schema_analyzer_available:
+            # Schéma inféré sur un échantillon borné, réutilisé tant que le fichier n'a pas changé
+            schema_info = get_cached_schema(version)
+            if schema_info is None:
+                schema_sink = SchemaSink()
+                sinks.append(schema_sink)
+        # Index ligne -> position et ID -> ligne, sur toutes les lignes même échantillonnées
+        index_sink = RowIndexSink()
+        sinks.append(index_sink)
+        # Valeurs distinctes et fréquentes des colonnes à forte cardinalité, sur toutes les lignes
+        sketch_sink = SketchSink(SKETCH_COLUMNS) if use_sketches else None
+        if sketch_sink is not None:
+            sinks.append(sketch_sink)
+        
+        # Un seul passage sur le fichier alimente tous les consommateurs
+        result = ingest_csv(CSV_FILE, sinks)
+        store = reservoir_sink.store if reservoir_sink else store_sink.store
+        total_rows = result.row_count
+        print(f"📋 Nombre total de lignes: {total_rows}")
+        
+        if schema_sink is not None and schema_sink.schema:
+            schema_info = schema_sink.schema
+            cache_schema(version, schema_info)
+        if schema_info:
+            available_features = get_available_features(schema_info)
+            print(f"✅ Schéma analysé: {len(schema_info['headers'])} colonnes, {schema_info['row_count']} lignes")
+            print(f"✅ {len(available_features)} fonctionnalités disponibles: {', '.join(available_features)}")
+        
+        # Mettre à jour les données globales
+        csv_data = {
+            "columns": result.headers,
+            "store": store,
+            "count": len(store),
+            "schema": schema_info,
+            "available_features": available_features,
+            "total_rows": total_rows,  # Garder le décompte total même si échantillonné
+            "tail_state": capture_state(CSV_FILE, result.end_offset, file_info),
+            "prefix_hash": PrefixHash(CSV_FILE),
+            "row_index": index_sink.index
+        }
+        if sketch_sink is not None:
+            csv_data["sketches"] = sketch_sink.sketches
+        
+        if reservoir_sink is not None:
+            # Poids d'inclusion par ligne: les statistiques estiment le fichier complet
+            csv_data["row_weights"] = reservoir_sink.row_weights
+            csv_data["sampling"] = {"strata_key": SAMPLE_STRATA_KEY, "strata": reservoir_sink.strata}
+            if len(store) < result.processed_rows:
+                csv_data["sampled"] = True
+                csv_data["sample_size"] = len(store)
+                print(f"⚙️ Traitement statistique sur un échantillon stratifié ({SAMPLE_STRATA_KEY}) "
+                      f"de {len(store)} lignes sur {total_rows} total")
+        
+        # Statistiques, résumés et réponses calculés à la demande (voir stat_graph.py): le serveur
+        # peut répondre dès la fin de la lecture
+        graph.reset({"data": csv_data})
+        if stats_sink is not None:
+            # Les agrégats ont été accumulés pendant la lecture
+            graph.provide("stats_accumulator", stats_sink.accumulator)
+        
+        write_row_index(file_hash=key["hash"] if key["size"] == result.end_offset else None)
+        # Préchauffage en arrière-plan, puis instantané des résultats calculés
+        warm_statistics(save=True, key=key)
+        
+        print(f"✅ Données chargées avec succès: {len(store)} étudiants ({store.bytes_per_row()} octets/ligne)")
+        return True
             
     except Exception as e:
         print(f"❌ Erreur lors du parsing CSV: {e}")
@@ -237,347 +337,709 @@ def parse_csv():
         return False
 
 
-def compute_statistics():
-    """Calcule les statistiques de base à partir des données - Optimisé pour grands volumes"""
-    global stats
-    
-    if not csv_data or "data" not in csv_data or not csv_data["data"]:
-        return
-    
-    # Indiquer si les stats sont calculées sur un échantillon
-    is_sampled = csv_data.get("sampled", False)
-    total_count = csv_data.get("total_rows", len(csv_data["data"]))
-    
-    print(f"📊 Calcul des statistiques sur {len(csv_data['data'])} lignes" + 
-          (f" (échantillon de {total_count} total)" if is_sampled else ""))
-    
-    # Réinitialiser stats pour éviter des données obsolètes
-    stats = {}
-    
-    # Utiliser des compteurs optimisés pour la mémoire
-    from collections import Counter
-    
-    # Initialiser les compteurs
-    gender_counts = Counter()
-    nationality_counts = Counter()
-    city_counts = Counter()
-    school_counts = Counter()
-    bac_type_counts = Counter()
-    specialty_counts = Counter()
-    
-    # Compter les colonnes booléennes
-    scholarship_count = 0
-    graduated_count = 0
-    
-    # Traitement par lots pour éviter la surcharge mémoire
-    batch_size = 5000
-    total_batches = (len(csv_data["data"]) + batch_size - 1) // batch_size
-    
-    for batch_num in range(total_batches):
-        start_idx = batch_num * batch_size
-        end_idx = min((batch_num + 1) * batch_size, len(csv_data["data"]))
-        batch = csv_data["data"][start_idx:end_idx]
-        
-        # Traiter le lot actuel
-        for record in batch:
-            # Comptes par genre
-            gender = record.get("Gender", "Unknown")
-            gender_counts[gender] += 1
-            
-            # Comptes par nationalité
-            nationality = record.get("Nationality", "Unknown")
-            nationality_counts[nationality] += 1
-            
-            # Comptes par ville
-            city = record.get("City", "Unknown")
-            city_counts[city] += 1
-            
-            # Comptes par école
-            school = record.get("School", "Unknown")
-            school_counts[school] += 1
-            
-            # Comptes par type de bac
-            bac_type = record.get("Baccalaureat_Type", "Unknown")
-            bac_type_counts[bac_type] += 1
-            
-            # Comptes par spécialité
-            specialty = record.get("Specialty", "Unknown")
-            specialty_counts[specialty] += 1
-            
-            # Compter les bourses
-            if record.get("Scholarship") is True:
-                scholarship_count += 1
-            
-            # Compter les diplômés
-            if record.get("Graduated") is True:
-                graduated_count += 1
-        
-        # Libérer la mémoire après chaque lot
-        if total_batches > 1:
-            import gc
-            gc.collect()
-            print(f"  Traitement du lot {batch_num+1}/{total_batches} terminé")
-
-    # Statistiques par type de bac et genre
-    scholarships_by_gender = {}
-    for gender in gender_counts.keys():
-        gender_records = [r for r in csv_data["data"] if r.get("Gender") == gender]
-        gender_scholarships = sum(1 for r in gender_records if r.get("Scholarship") is True)
-        scholarships_by_gender[gender] = round((gender_scholarships / len(gender_records) * 100), 1) if gender_records else 0
-    
-    scholarships_by_bac = {}
-    for bac in bac_type_counts.keys():
-        bac_records = [r for r in csv_data["data"] if r.get("Baccalaureat_Type") == bac]
-        bac_scholarships = sum(1 for r in bac_records if r.get("Scholarship") is True)
-        scholarships_by_bac[bac] = round((bac_scholarships / len(bac_records) * 100), 1) if bac_records else 0
-    
-    # Success rate by bac type
-    success_by_bac = {}
-    for bac in bac_type_counts.keys():
-        bac_records = [r for r in csv_data["data"] if r.get("Baccalaureat_Type") == bac]
-        bac_success = sum(1 for r in bac_records if r.get("Graduated") is True)
-        success_by_bac[bac] = round((bac_success / len(bac_records) * 100), 1) if bac_records else 0
-    
-    # Marks by gender, bac, scholarship
-    marks_by_gender = {}
-    marks_by_bac = {}
-    marks_by_scholarship = {True: [], False: []}
-    marks_by_specialty = {}
-    marks_by_graduation = {"graduated": [], "not_graduated": []}
-    
-    for record in csv_data["data"]:
-        mark = record.get("Mark", 0)
-        if isinstance(mark, str):
+def persist_data(key=None, version=None):
+    """
+    Enregistre l'instantané binaire (voir snapshot.py) et l'index des lignes (voir row_index.py):
+    les données sont copiées sous le verrou partagé, les fichiers écrits hors verrou.
+    key: clé du CSV lu (par défaut, celle de la partie déjà lue); version: n'enregistrer que si
+    les données n'ont pas changé depuis cette version du graphe
+    """
+    with persist_lock:
+        with data_lock.shared:
+            if not csv_data or (version is not None and graph.version != version):
+                return
+            state = csv_data["tail_state"]
+            if key is None and is_compressed(CSV_FILE):
+                key = source_key(CSV_FILE)
+            elif key is None:
+                # Empreinte complétée avec les seuls octets ajoutés depuis le dernier enregistrement
+                key = {"size": state.offset, "mtime_ns": state.mtime_ns,
+                       "hash": csv_data["prefix_hash"].hexdigest(state.offset)}
+            extras = {k: csv_data[k] for k in ("available_features", "total_rows", "sampled", "sample_size",
+                                                "row_weights", "sampling", "sketches")
+                      if k in csv_data}
+            extras.update({name: graph.peek(name) for name in PERSISTED_NODES if graph.computed(name)})
+            extras["tail_offset"] = state.offset
+            snapshot = capture_snapshot(key, csv_data["store"], graph.get("stats"), csv_data.get("schema"),
+                                        extras, graph.get("stats_accumulator"))
+            index = csv_data.get("row_index")
+            if index is not None:
+                index = index.capture(CSV_FILE, key["hash"] if index.end_offset == key["size"] else None)
+        try:
+            write_snapshot_file(CSV_FILE, snapshot)
+            print(f"💾 Instantané enregistré: {CSV_FILE}.snap")
+        except OSError as e:
+            print(f"⚠️ Impossible d'écrire l'instantané: {e}")
+        if index is not None:
             try:
-                mark = float(mark)
-            except:
-                mark = 0
-        
-        # By gender
-        gender = record.get("Gender", "Unknown")
-        if gender not in marks_by_gender:
-            marks_by_gender[gender] = []
-        marks_by_gender[gender].append(mark)
-        
-        # By bac
-        bac = record.get("Baccalaureat_Type", "Unknown")
-        if bac not in marks_by_bac:
-            marks_by_bac[bac] = []
-        marks_by_bac[bac].append(mark)
-        
-        # By scholarship
-        scholarship = record.get("Scholarship") is True
-        if scholarship:
-            marks_by_scholarship[True].append(mark)
-        else:
-            marks_by_scholarship[False].append(mark)
-        
-        # By specialty
-        specialty = record.get("Specialty", "Unknown")
-        if specialty not in marks_by_specialty:
-            marks_by_specialty[specialty] = []
-        marks_by_specialty[specialty].append(mark)
-        
-        # By graduation status
-        graduated = record.get("Graduated") is True
-        if graduated:
-            marks_by_graduation["graduated"].append(mark)
-        else:
-            marks_by_graduation["not_graduated"].append(mark)
-    
-    # Calculer les moyennes
-    avg_marks_by_gender = {}
-    for gender, marks in marks_by_gender.items():
-        avg_marks_by_gender[gender] = round(sum(marks) / len(marks), 1) if marks else 0
-    
-    avg_marks_by_bac = {}
-    for bac, marks in marks_by_bac.items():
-        avg_marks_by_bac[bac] = round(sum(marks) / len(marks), 1) if marks else 0
-    
-    avg_marks_by_scholarship = {}
-    for status, marks in marks_by_scholarship.items():
-        avg_marks_by_scholarship[status] = round(sum(marks) / len(marks), 1) if marks else 0
-    
-    avg_marks_by_specialty = {}
-    for specialty, marks in marks_by_specialty.items():
-        avg_marks_by_specialty[specialty] = round(sum(marks) / len(marks), 1) if marks else 0
-    
-    avg_marks_by_graduation = {}
-    for status, marks in marks_by_graduation.items():
-        avg_marks_by_graduation[status] = round(sum(marks) / len(marks), 1) if marks else 0
-    
-    # Distribution des spécialités par école
-    school_specialty_distribution = {}
-    for school in school_counts.keys():
-        school_records = [r for r in csv_data["data"] if r.get("School") == school]
-        specialties = {}
-        for record in school_records:
-            specialty = record.get("Specialty", "Unknown")
-            specialties[specialty] = specialties.get(specialty, 0) + 1
-        school_specialty_distribution[school] = specialties
-    
-    # Ajouter des calculs des moyennes par semestre pour chaque étudiant
-    semester_averages = {}
-    for record in csv_data["data"]:
-        student_id = record.get("ID", "")
-        if not student_id:
-            continue
-            
-        semester_marks = []
-        for i in range(1, 13):  # S1 à S12
-            semester_key = f"S{i}"
-            if semester_key in record and record[semester_key]:
-                try:
-                    if isinstance(record[semester_key], dict) and "mark" in record[semester_key]:
-                        semester_marks.append(record[semester_key]["mark"])
-                    elif isinstance(record[semester_key], str):
-                        # Essayer de parser comme JSON
-                        try:
-                            semester_data = json.loads(record[semester_key])
-                            if "mark" in semester_data:
-                                semester_marks.append(semester_data["mark"])
-                        except:
-                            pass
-                except:
-                    pass
-        
-        if semester_marks:
-            semester_averages[student_id] = sum(semester_marks) / len(semester_marks)
+                write_index(CSV_FILE, index)
+            except OSError as e:
+                print(f"⚠️ Impossible d'écrire l'index des lignes: {e}")
+
+
+def schedule_persist():
+    """
+    Enregistrement de l'instantané et de l'index dans PERSIST_DELAY_SECONDS, s'il n'est pas
+    déjà prévu (appelée sous append_lock). Un enregistrement perdu à l'arrêt du serveur est sans
+    conséquence: les lignes ajoutées depuis sont relues au démarrage suivant.
+    """
+    global persist_timer
+    if persist_timer is not None:
+        return
+
+    def run():
+        global persist_timer
+        persist_timer = None  # les ajouts suivants prévoient un nouvel enregistrement
+        persist_data()
+
+    persist_timer = threading.Timer(PERSIST_DELAY_SECONDS, run)
+    persist_timer.daemon = True
+    persist_timer.start()
+
+
+def write_row_index(index=None, file_hash=None):
+    """Enregistre l'index des lignes à côté du CSV (voir row_index.py)"""
+    try:
+        (csv_data["row_index"] if index is None else index).save(CSV_FILE, file_hash)
+    except OSError as e:
+        print(f"⚠️ Impossible d'écrire l'index des lignes: {e}")
+
+
+def load_row_index(offset):
+    """
+    Index des lignes du CSV jusqu'à `offset` (fin de la partie déjà chargée): l'index
+    enregistré est réutilisé, complété s'il s'arrête avant, reconstruit s'il est périmé.
+    """
+    index = RowIndex.load(CSV_FILE)
+    if index is not None and index.end_offset == offset:
+        return index
+    if index is not None and index.end_offset < offset:
+        ingest_csv(CSV_FILE, [RowIndexSink(index)], start_offset=index.end_offset, headers=index.headers,
+                   stop_offset=offset)
+    else:
+        print("🔎 Construction de l'index des lignes")
+        index_sink = RowIndexSink()
+        ingest_csv(CSV_FILE, [index_sink], stop_offset=offset)
+        index = index_sink.index
+    write_row_index(index)
+    return index
+
+
+def append_new_rows():
+    """
+    Intègre les lignes ajoutées à la fin du CSV depuis la dernière lecture: seuls les
+    octets ajoutés sont analysés, sans bloquer les requêtes, puis le stockage et les
+    statistiques sont complétés sous le verrou exclusif. L'instantané et l'index sont
+    enregistrés plus tard, en arrière-plan (schedule_persist).
+    """
+    added = 0
+    with append_lock:
+        while csv_data and csv_data.get("tail_state") is not None:
+            state = csv_data["tail_state"]
+            batch, new_state = read_tail(CSV_FILE, state, csv_data["store"].headers)
+            with data_lock:
+                added += integrate_rows(batch, new_state)
+            if new_state.offset - state.offset < TAIL_BATCH_BYTES:
+                break  # sinon, la suite des lignes ajoutées est lue par lots
+        if added:
+            schedule_persist()
+    return added
+
+
+def integrate_rows(batch, state):
+    """Ajoute les lignes lues par read_tail() aux données chargées (sous data_lock)"""
+    store = csv_data["store"]
+    start = len(store)
+    sinks = [StoreSink(store)]
+    if csv_data.get("row_index") is not None:
+        sinks.append(RowIndexSink(csv_data["row_index"]))
+    if csv_data.get("sketches"):
+        sinks.append(SketchSink(SKETCH_COLUMNS, csv_data["sketches"]))
+    batch.replay(sinks)
+    csv_data["tail_state"] = state
+    result = batch.result
+    if not result.row_count:
+        return 0
     
-    if semester_averages:
-        stats["semester_averages"] = semester_averages
+    # Échantillon pondéré: les nouvelles lignes sont toutes conservées (poids 1)
+    weights = csv_data.get("row_weights")
+    if weights is not None:
+        weights.extend([1.0] * (len(store) - start))
+        if csv_data.get("sampled"):
+            csv_data["sample_size"] = len(store)
     
-    # Calculer le seuil de réussite basé sur les données
-    graduated_marks = []
-    non_graduated_marks = []
-    for record in csv_data["data"]:
-        mark = record.get("Mark", 0)
-        if isinstance(mark, str):
-            try:
-                mark = float(mark)
-            except:
-                mark = 0
-        
-        if record.get("Graduated") is True:
-            graduated_marks.append(mark)
-        else:
-            non_graduated_marks.append(mark)
+    # Résultats déjà calculés complétés sur place; les autres le seront à la demande
+    for name in ("stats_accumulator", "distributions", "cube"):
+        if graph.computed(name):
+            graph.peek(name).add_store(store, start, weights)
+    csv_data["count"] = len(store)
+    csv_data["total_rows"] += result.row_count
+    if csv_data.get("schema"):
+        csv_data["schema"]["row_count"] += result.row_count
+    # Le moteur de trajectoires se complète seul: seuls les nœuds qui en dépendent sont recalculés
+    graph.changed("data", "stats_accumulator", "distributions", "cube", "trajectories")
+    print(f"➕ {result.processed_rows} nouvelles lignes intégrées (total: {len(store)} étudiants)")
+    return result.processed_rows
+
+
+def reload_data():
+    """Rechargement complet (fichier tronqué ou réécrit)"""
+    with append_lock, data_lock:
+        return parse_csv()
+
+
+def parse_multipart(content_type, body):
+    """Champs {nom: octets} d'un corps multipart/form-data, ou None pour un autre Content-Type"""
+    header = EmailMessage()
+    header['Content-Type'] = content_type
+    boundary = header.get_param('boundary')
+    if header.get_content_type() != 'multipart/form-data' or not boundary:
+        return None
+    fields = {}
+    for part in body.split(b'--' + boundary.encode('latin-1'))[1:]:
+        if part.startswith(b'--'):
+            break  # délimiteur final
+        head, _, content = part.partition(b'\r\n\r\n')
+        part_headers = BytesHeaderParser(policy=email.policy.HTTP).parsebytes(head.lstrip(b'\r\n') + b'\r\n\r\n')
+        name = part_headers.get_param('name', header='content-disposition')
+        if name:
+            fields[name] = content[:-2] if content.endswith(b'\r\n') else content
+    return fields
+
+
+def common_prefix_size(path, other_path):
+    """Nombre d'octets identiques au début des deux fichiers"""
+    size = 0
+    with open(path, 'rb') as f, open(other_path, 'rb') as other:
+        while True:
+            block, other_block = f.read(1024 * 1024), other.read(1024 * 1024)
+            if block != other_block or not block:
+                # Premier octet différent, par dichotomie sur des comparaisons de tranches
+                low, high = 0, min(len(block), len(other_block))
+                while low < high:
+                    middle = (low + high + 1) // 2
+                    if block[low:middle] == other_block[low:middle]:
+                        low = middle
+                    else:
+                        high = middle - 1
+                return size + low
+            size += len(block)
+
+
+def prefix_update(upload_file):
+    """
+    Prépare le remplacement incrémental des données par `upload_file` (sous append_lock, sans
+    bloquer les requêtes): quand le nouveau fichier reprend le début du fichier chargé, seules les
+    lignes qui suivent la partie commune sont lues, dans l'ancien fichier (lignes à retirer) et
+    dans le nouveau (lignes à ajouter).
+
+    Returns:
+        {"rows", "removed", "added", "state", "index"}, ou None si un rechargement complet est
+        nécessaire (échantillon, résumés approximatifs, fichier compressé, trop de lignes modifiées...)
+    """
+    index = csv_data.get("row_index") if csv_data else None
+    if (index is None or "row_weights" in csv_data or csv_data.get("sketches")
+            or len(index) != len(csv_data["store"]) or is_compressed(CSV_FILE) or is_compressed(upload_file)
+            or os.path.getsize(upload_file) > LARGE_FILE_MB * 1024 * 1024):
+        return None
+    accumulator = graph.peek("stats_accumulator")
+    if accumulator is not None and not accumulator.plan.invertible:
+        return None
     
-    grad_threshold = 0
-    if graduated_marks:
-        grad_threshold = sum(graduated_marks) / len(graduated_marks)
+    # Première ligne dont les octets ont pu changer
+    common = common_prefix_size(CSV_FILE, upload_file)
+    rows = len(index) if common >= index.end_offset else bisect_right(index.offsets, common) - 1
+    if rows < 0:
+        return None  # en-tête modifié
+    start = index.offsets[rows] if rows < len(index) else index.end_offset
+    old_end = csv_data["tail_state"].offset
+    info = os.stat(upload_file)
+    if old_end - start > TAIL_BATCH_BYTES or info.st_size - start > TAIL_BATCH_BYTES:
+        return None
     
-    stats["graduation_threshold"] = grad_threshold
+    headers = csv_data["store"].headers
+    removed = TailBatch()
+    ingest_csv(CSV_FILE, [removed], start_offset=start, headers=headers, stop_offset=old_end)
+    added = TailBatch()
+    result = ingest_csv(upload_file, [added], start_offset=start, headers=headers)
+    if result.end_offset < info.st_size or len(removed.valid_rows()) != len(index) - rows:
+        return None  # dernière ligne sans fin de ligne, ou lignes retirées différentes du stockage
+    new_index = index.prefix(rows)
+    added.replay([RowIndexSink(new_index)])
+    return {"rows": rows, "removed": removed, "added": added,
+            "state": capture_state(upload_file, result.end_offset, info), "index": new_index}
+
+
+def apply_prefix_update(update):
+    """
+    Remplace les lignes qui suivent la partie commune (voir prefix_update), sous data_lock:
+    les agrégats des statistiques sont mis à jour par retrait et ajout de ces seules lignes.
+    """
+    store = csv_data["store"]
+    removed, added = update["removed"], update["added"]
+    accumulator = graph.peek("stats_accumulator")
+    if accumulator is not None:
+        accumulator.apply_update(removed.valid_rows(), added.valid_rows())
+    store.truncate(update["rows"])
+    added.replay([StoreSink(store)])
+    csv_data["row_index"] = update["index"]
+    csv_data["tail_state"] = update["state"]
+    csv_data["prefix_hash"] = PrefixHash(CSV_FILE)
+    csv_data["count"] = len(store)
+    change = added.result.row_count - removed.result.row_count
+    csv_data["total_rows"] += change
+    if csv_data.get("schema"):
+        csv_data["schema"]["row_count"] += change
+    # Agrégats conservés; distributions, cube et trajectoires (sans retrait possible) recalculés à la demande
+    graph.changed("data", "stats_accumulator")
+    print(f"🔁 {len(removed.valid_rows())} lignes retirées, {len(added.valid_rows())} ajoutées "
+          f"(total: {len(store)} étudiants)")
+
+
+def upload_csv(content, mode='replace'):
+    """
+    Fichier CSV envoyé à /api/upload.
+    mode 'append': lignes ajoutées à la fin du fichier de données (mêmes colonnes) puis intégrées
+    comme les ajouts surveillés; 'replace': fichier de données remplacé puis rechargé (l'ancien
+    est rétabli si le nouveau ne peut pas être chargé). Si le nouveau fichier reprend le début de
+    l'ancien, seules les lignes modifiées sont retirées puis ajoutées (voir prefix_update).
     
-    # Ajouter la relation entre spécialité et réussite
-    specialty_success = {}
-    for record in csv_data["data"]:
-        specialty = record.get("Specialty", "Unknown")
-        if specialty not in specialty_success:
-            specialty_success[specialty] = {"total": 0, "graduated": 0}
-        
-        specialty_success[specialty]["total"] += 1
-        if record.get("Graduated") is True:
-            specialty_success[specialty]["graduated"] += 1
+    Returns:
+        (succès, message)
+    """
+    if mode not in ('append', 'replace'):
+        return False, "mode doit être 'replace' ou 'append'"
+    if mode == 'append':
+        if not csv_data:
+            return False, "Ajout impossible: aucune donnée chargée"
+        if is_compressed(CSV_FILE):
+            return False, "Ajout impossible: le fichier de données est compressé"
+        header, _, rows = content.partition(b'\n')
+        columns = next(csv.reader([header.decode('utf-8-sig', 'replace').rstrip('\r')]), [])
+        # Lignes écrites puis lues sous append_lock seul: les requêtes continuent d'être servies
+        with append_lock:
+            if columns != list(csv_data["columns"]):
+                return False, "Les colonnes du fichier diffèrent de celles des données chargées"
+            if rows.strip():
+                with open(CSV_FILE, 'rb+') as f:
+                    f.seek(0, os.SEEK_END)
+                    if f.tell():
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b'\n':
+                            f.write(b'\n')
+                    f.write(rows if rows.endswith(b'\n') else rows + b'\n')
+            added = append_new_rows()
+            return True, f"{added} lignes ajoutées ({csv_data['count']} étudiants)"
     
-    # Calculer le taux de réussite par spécialité
-    for specialty, counts in specialty_success.items():
-        if counts["total"] > 0:
-            counts["success_rate"] = (counts["graduated"] / counts["total"]) * 100
-        else:
-            counts["success_rate"] = 0
+    upload_file = CSV_FILE + '.upload'
+    previous_file = CSV_FILE + '.previous'
+    with open(upload_file, 'wb') as f:
+        f.write(content)
+    with append_lock:
+        update = prefix_update(upload_file)
+        with data_lock:
+            if os.path.exists(CSV_FILE):
+                os.replace(CSV_FILE, previous_file)
+            os.replace(upload_file, CSV_FILE)
+            if update is not None:
+                apply_prefix_update(update)
+                if os.path.exists(previous_file):
+                    os.remove(previous_file)
+                schedule_persist()
+                return True, f"Fichier chargé: {csv_data['count']} étudiants ({update['rows']} lignes inchangées)"
+            if not parse_csv():
+                if os.path.exists(previous_file):
+                    os.replace(previous_file, CSV_FILE)
+                    parse_csv()
+                return False, "Impossible de charger les données du fichier"
+            if os.path.exists(previous_file):
+                os.remove(previous_file)
+            return True, f"Fichier chargé: {csv_data['count']} étudiants"
+
+
+def warm_statistics(save=False, key=None):
+    """
+    Calcule en arrière-plan les statistiques et réponses pas encore demandées.
+    save: enregistrer ensuite l'instantané (clé `key` du CSV lu, si fournie)
+    """
+    version = graph.version
     
-    stats["specialty_success"] = specialty_success
+    def done(warmed):
+        print(f"🔥 {len(warmed)} statistiques et réponses préchauffées (version {version})")
+        if save:
+            persist_data(key, version)  # seulement si les données n'ont pas changé depuis le lancement
     
-    # Mettre à jour les statistiques globales
-    stats = {
-        "total_students": len(csv_data["data"]),
-        "gender_distribution": gender_counts,
-        "nationalities": nationality_counts,
-        "cities": city_counts,
-        "schools": school_counts,
-        "specialties": specialty_counts,
-        "bac_types": bac_type_counts,
-        "scholarship_percentage": round((scholarship_count / len(csv_data["data"])) * 100, 1) if csv_data["data"] else 0,
-        "graduation_rate": round((graduated_count / len(csv_data["data"])) * 100, 1) if csv_data["data"] else 0,
-        "scholarship_by_gender": scholarships_by_gender,
-        "scholarship_by_bac": scholarships_by_bac,
-        "success_rate_by_bac": success_by_bac,
-        "avg_marks_by_gender": avg_marks_by_gender,
-        "avg_marks_by_bac": avg_marks_by_bac,
-        "avg_marks_by_scholarship": avg_marks_by_scholarship,
-        "avg_marks_by_specialty": avg_marks_by_specialty,
-        "avg_marks_by_graduation": avg_marks_by_graduation,
-        "school_specialty_distribution": school_specialty_distribution,
-        "counts": {
-            "scholarship": {
-                True: scholarship_count,
-                False: len(csv_data["data"]) - scholarship_count
-            }
+    # Un nœud à la fois sous data_lock: un ajout de lignes attend la fin du calcul en cours
+    return graph.warm(on_done=done, lock=data_lock.shared)
+
+
+def start_tail_watcher():
+    """Démarre la surveillance périodique des lignes ajoutées au CSV"""
+    if not TAIL_POLL_SECONDS:
+        return None
+    watcher = TailWatcher(CSV_FILE, lambda: csv_data.get("tail_state") if csv_data else None,
+                          append_new_rows, reload_data, interval=TAIL_POLL_SECONDS)
+    watcher.start()
+    print(f"👀 Surveillance des ajouts au fichier CSV (toutes les {TAIL_POLL_SECONDS}s)")
+    return watcher
+
+
+def build_accumulator(data):
+    """Agrégats des statistiques sur toutes les lignes (parallèle selon STATS_WORKERS)"""
+    store = data["store"]
+    print(f"📊 Calcul des statistiques sur {len(store)} lignes" +
+          (f" (échantillon de {data.get('total_rows')} total)" if data.get("sampled") else ""))
+    # Échantillon stratifié: effectifs et pourcentages pondérés par les poids d'inclusion
+    return accumulate_statistics(store, data.get("row_weights"), STATS_WORKERS)
+
+
+def build_stats(data, accumulator):
+    """Dictionnaire des statistiques servi par l'API, à partir des agrégats"""
+    stats = accumulator.finalize(total_rows=data.get("total_rows", len(data["store"])),
+                                 is_sampled=data.get("sampled", False))
+    if "sampling" in data:
+        stats["data_info"]["sampling"] = data["sampling"]
+    return stats
+
+
+def build_distributions(data):
+    """Distributions des notes par groupe (percentiles, histogrammes), pondérées comme les statistiques"""
+    return MarkDistributions().add_store(data["store"], weights=data.get("row_weights"))
+
+
+def build_cube(data):
+    """Cube pré-agrégé sur les dimensions principales (voir cube.py)"""
+    return StudentCube().add_store(data["store"], weights=data.get("row_weights"))
+
+
+def build_trajectories(data):
+    """Trajectoires semestrielles (voir trajectories.py), complétées à la demande après un ajout"""
+    return TrajectoryEngine(data["store"], data.get("row_weights"))
+
+
+def similarity_mask(marks, mark, bac_matches, scholarship_matches):
+    """Masque 0/1 des étudiants similaires (score de similarité > 50) pour la prédiction de réussite"""
+    if numpy_available:
+        mark_diff = np.abs(mark - column(marks).astype(np.float64))
+        scores = (10 - np.minimum(10, mark_diff)) * 0.7 + column(bac_matches) * 20 + column(scholarship_matches) * 10
+        return (scores > 50).view(np.uint8)
+    return [1 if (10 - min(10, abs(mark - record_mark))) * 0.7 + bac_match * 20 + scholarship_match * 10 > 50 else 0
+            for record_mark, bac_match, scholarship_match in zip(marks, bac_matches, scholarship_matches)]
+
+
+def schema_response(data):
+    """Colonnes, schéma inféré et fonctionnalités disponibles"""
+    schema = {
+        "columns": data["columns"],
+        "schema": data.get("schema", {}),
+        "available_features": data.get("available_features", [])
+    }
+    return schema
+
+
+def summary_response(data):
+    """Nombre de lignes et colonnes du jeu de données"""
+    summary = {
+        "row_count": data["count"],
+        "column_count": len(data["columns"]),
+        "columns": data["columns"]
+    }
+    return summary
+
+
+def gender_response(stats):
+    """Répartition par genre"""
+    gender_stats = {
+        "counts": stats["gender_distribution"],
+        "percentages": {gender: round((count / stats["total_students"]) * 100, 1) 
+                      for gender, count in stats["gender_distribution"].items()},
+        "total": stats["total_students"]
+    }
+    return gender_stats
+
+
+def sketched_breakdown(sketch, name):
+    """Répartition approximative d'une colonne résumée (voir sketches.py): valeurs fréquentes seulement"""
+    summary = sketch.summary(SKETCH_REPORTED_VALUES)
+    rows = summary["rows"]
+    return {
+        "counts": summary["top"],
+        "percentages": {value: round((count / rows) * 100, 1) for value, count in summary["top"].items()},
+        "total": rows,
+        f"distinct_{name}": summary["distinct"],
+        f"top_{name}": dict(list(summary["top"].items())[:5]),
+        "approximate": True,
+        "error_bounds": summary["error_bounds"]
+    }
+
+
+def nationality_response(data, stats):
+    """Répartition par nationalité (top 5 inclus)"""
+    if data.get("sketches"):
+        return sketched_breakdown(data["sketches"]["Nationality"], "nationalities")
+    nationality_stats = {
+        "counts": stats["nationalities"],
+        "percentages": {nat: round((count / stats["total_students"]) * 100, 1) 
+                      for nat, count in stats["nationalities"].items()},
+        "total": stats["total_students"],
+        "distinct_nationalities": len(stats["nationalities"]),
+        "top_nationalities": dict(sorted(stats["nationalities"].items(), 
+                                         key=lambda x: x[1], reverse=True)[:5])
+    }
+    return nationality_stats
+
+
+def city_response(data, stats):
+    """Répartition par ville (top 5 inclus)"""
+    if data.get("sketches"):
+        return sketched_breakdown(data["sketches"]["City"], "cities")
+    city_stats = {
+        "counts": stats["cities"],
+        "percentages": {city: round((count / stats["total_students"]) * 100, 1) 
+                      for city, count in stats["cities"].items()},
+        "total": stats["total_students"],
+        "distinct_cities": len(stats["cities"]),
+        "top_cities": dict(sorted(stats["cities"].items(), 
+                                 key=lambda x: x[1], reverse=True)[:5])
+    }
+    return city_stats
+
+
+def bac_type_response(stats):
+    """Répartition, réussite et notes par type de bac"""
+    bac_stats = {
+        "counts": stats["bac_types"],
+        "percentages": {bac: round((count / stats["total_students"]) * 100, 1) 
+                       for bac, count in stats["bac_types"].items()},
+        "success_rate": stats["success_rate_by_bac"],
+        "avg_mark": stats["avg_marks_by_bac"],
+        "total": stats["total_students"]
+    }
+    return bac_stats
+
+
+def school_specialty_response(stats):
+    """Écoles, spécialités et répartition croisée"""
+    school_specialty_stats = {
+        "schools": stats["schools"],
+        "specialties": stats["specialties"],
+        "school_specialty_distribution": stats["school_specialty_distribution"],
+        "avg_mark_by_school": stats["avg_marks_by_school"],
+        "avg_mark_by_specialty": stats["avg_marks_by_specialty"]
+    }
+    return school_specialty_stats
+
+
+def scholarship_response(data, stats):
+    """Bourses: effectifs, répartitions et taux de réussite (parcourt les colonnes)"""
+    store = data["store"]
+    weights = data.get("row_weights")
+    # Codes 0 (bourse inconnue), 1 (sans bourse), 2 (avec bourse); effectifs pondérés en mode échantillon
+    codes, size = combine_codes([store.scholarship.flags(True), store.scholarship.flags(False)], [2, 2])
+    totals = group_count(codes, size, weights)
+    graduated = group_sum(codes, size, store.graduated.flags(True), weights)
+    scholarship_stats = {
+        "counts": stats["counts"]["scholarship"],
+        "percentage": stats["scholarship_percentage"],
+        "by_gender": stats["scholarship_by_gender"],
+        "by_bac_type": stats["scholarship_by_bac"],
+        "success_rate": {
+            "with_scholarship": round(graduated[2] / totals[2] * 100, 1) if totals[2] else 0.0,
+            "without_scholarship": round(graduated[1] / totals[1] * 100, 1) if totals[1] else 0.0
         }
     }
-    
-    # Calculer plus de statistiques pour les prédictions
-    # Analyser les données de semestres plus en détail pour les prédictions de réussite
-    semester_success_map = {}
-    for record in csv_data["data"]:
-        student_id = record.get("ID", "")
-        graduated = record.get("Graduated", False)
-        
-        # Compter les semestres réussis et calculer leur moyenne
-        semester_marks = []
-        for i in range(1, 13):  # S1 à S12
-            semester_key = f"S{i}"
-            if semester_key in record and record[semester_key]:
-                try:
-                    if isinstance(record[semester_key], dict) and "mark" in record[semester_key]:
-                        mark = record[semester_key]["mark"]
-                        semester_marks.append(mark)
-                    elif isinstance(record[semester_key], str):
-                        try:
-                            semester_data = json.loads(record[semester_key])
-                            if "mark" in semester_data:
-                                mark = semester_data["mark"]
-                                semester_marks.append(mark)
-                        except:
-                            pass
-                except:
-                    pass
-        
-        if semester_marks:
-            avg_semester_mark = sum(semester_marks) / len(semester_marks)
-            semester_success_map[student_id] = {
-                "avg_mark": avg_semester_mark,
-                "graduated": graduated,
-                "semester_count": len(semester_marks)
-            }
-    
-    stats["semester_success_map"] = semester_success_map
-    
-    # Calculer les seuils de réussite basés sur les notes des semestres
-    graduated_semester_marks = [data["avg_mark"] for _, data in semester_success_map.items() 
-                               if data["graduated"] and data["semester_count"] >= 6]
-    
-    semester_threshold = 0
-    if graduated_semester_marks:
-        semester_threshold = sum(graduated_semester_marks) / len(graduated_semester_marks)
-    
-    stats["semester_graduation_threshold"] = semester_threshold
-    
-    # Ajouter des informations sur l'échantillonnage
-    stats["data_info"] = {
-        "is_sampled": is_sampled,
-        "total_rows": total_count,
-        "processed_rows": len(csv_data["data"]),
-        "sampling_factor": round(len(csv_data["data"]) / total_count, 2) if is_sampled else 1.0
+    return scholarship_stats
+
+
+def mark_correlations_response(data, stats):
+    """Notes moyennes par groupe et moyenne globale (parcourt les notes)"""
+    mark_stats = {
+        "by_gender": stats["avg_marks_by_gender"],
+        "by_bac_type": stats["avg_marks_by_bac"],
+        "by_scholarship": stats["avg_marks_by_scholarship"],
+        "by_specialty": stats["avg_marks_by_specialty"],
+        "by_graduation": stats["avg_marks_by_graduation"],
+        "overall_avg": round(stats["average_mark"], 1),  # moyenne pondérée en mode échantillon
+        "overall_variance": stats["mark_variance"]
+    }
+    return mark_stats
+
+
+def cube_info_response(cube):
+    """Taille du cube pré-agrégé et valeurs de ses dimensions"""
+    info = cube.info()
+    info["values"] = cube.labels
+    return info
+
+
+def trajectory_cohorts_response(data, trajectories):
+    """Effectif, moyenne et percentiles de chaque semestre par cohorte (Start_Year)"""
+    return {
+        "sampled": bool(data.get("sampled")),
+        "cohorts": trajectories.cohort_semesters()
+    }
+
+
+def trajectory_retention_response(data, trajectories):
+    """Courbe de rétention par cohorte: part des étudiants ayant au moins k semestres"""
+    return {
+        "sampled": bool(data.get("sampled")),
+        "semesters": list(range(1, SEMESTER_COUNT + 1)),
+        "cohorts": trajectories.retention()
     }
 
 
+def trajectory_trends_response(data, trajectories):
+    """Pente et volatilité moyennes des notes semestrielles par cohorte"""
+    return {
+        "sampled": bool(data.get("sampled")),
+        "at_risk_drop": AT_RISK_DROP,
+        "cohorts": trajectories.trends()
+    }
+
+
+def next_year_students_response(data, stats):
+    """Prévision des inscriptions à partir des années de début (parcourt les années)"""
+    # Extraire les années de début réelles de nos données (effectifs estimés en mode échantillon)
+    year_counts = value_counts(data["store"].start_years, MISSING_YEAR, data.get("row_weights"))
+    year_counts = {year: round(count) for year, count in year_counts.items()}
+
+    if not year_counts:
+        # Fallback si aucune année de début n'est disponible
+        current_year = 2023
+        total_students = stats["total_students"]
+        historical_counts = {
+            current_year - 4: int(total_students * 0.7),
+            current_year - 3: int(total_students * 0.8),
+            current_year - 2: int(total_students * 0.9),
+            current_year - 1: int(total_students * 0.95),
+            current_year: total_students
+        }
+    else:
+        # Utiliser les années réelles pour créer l'historique
+        # Trier par année
+        historical_counts = dict(sorted(year_counts.items()))
+
+        # Vérifier si nous avons assez d'années
+        if len(historical_counts) < 3:
+            # Compléter avec des valeurs extrapolées
+            current_year = max(historical_counts.keys())
+            current_count = historical_counts[current_year]
+
+            for i in range(1, 5):
+                past_year = current_year - i
+                if past_year not in historical_counts:
+                    # Estimer avec une légère diminution par année
+                    historical_counts[past_year] = int(current_count * (0.95 ** i))
+
+            # Trier à nouveau
+            historical_counts = dict(sorted(historical_counts.items()))
+
+    # Calculer la tendance de croissance sur les données réelles
+    years = list(historical_counts.keys())
+    growth_rates = []
+
+    for i in range(1, len(years)):
+        prev_year = years[i-1]
+        curr_year = years[i]
+        prev_count = historical_counts[prev_year]
+        curr_count = historical_counts[curr_year]
+
+        if prev_count > 0:
+            growth_rate = (curr_count - prev_count) / prev_count
+            growth_rates.append(growth_rate)
+
+    # Calculer la croissance moyenne récente (limiter à des valeurs plausibles)
+    if growth_rates:
+        avg_growth_rate = sum(growth_rates) / len(growth_rates)
+        avg_growth_rate = max(-0.05, min(0.15, avg_growth_rate))  # Entre -5% et +15%
+    else:
+        avg_growth_rate = 0.07  # Valeur par défaut de 7%
+
+    # Prédire pour l'année suivante
+    current_year = max(historical_counts.keys())
+    current_count = historical_counts[current_year]
+    predicted_count = int(current_count * (1 + avg_growth_rate))
+
+    # Répartition par école basée sur les données réelles
+    predicted_by_school = {}
+    for school, count in stats["schools"].items():
+        # Calculer la part actuelle de chaque école
+        current_share = count / stats["total_students"]
+
+        # Calculer le nombre d'étudiants prédit pour cette école
+        predicted_by_school[school] = int(predicted_count * current_share)
+
+    # Résumé des facteurs de croissance basé sur les données réelles
+    growth_factors = {
+        "Tendance historique des inscriptions": 40,
+        "Performance académique des écoles": 25,
+        "Popularité des spécialités": 20,
+        "Facteurs économiques généraux": 15
+    }
+
+    next_year_stats = {
+        "current_year": current_year,
+        "next_year": current_year + 1,
+        "historical_counts": historical_counts,
+        "avg_growth_rate": round(avg_growth_rate * 100, 1),
+        "predicted_count": predicted_count,
+        "by_school": dict(sorted(predicted_by_school.items(), key=lambda x: x[1], reverse=True)),
+        "growth_factors": growth_factors,
+        "based_on_data": True
+    }
+    return next_year_stats
+
+
+# Endpoints GET dont la réponse ne dépend que des données chargées: (constructeur, nœuds
+# d'entrée du graphe), rendus à la première demande puis mémorisés jusqu'au prochain changement
+RESPONSE_BUILDERS = {
+    '/api/schema': (schema_response, ('data',)),
+    '/api/data/summary': (summary_response, ('data',)),
+    '/api/statistics/gender': (gender_response, ('stats',)),
+    '/api/statistics/nationality': (nationality_response, ('data', 'stats')),
+    '/api/statistics/city': (city_response, ('data', 'stats')),
+    '/api/statistics/bac-type': (bac_type_response, ('stats',)),
+    '/api/statistics/school-specialty': (school_specialty_response, ('stats',)),
+    '/api/statistics/scholarship': (scholarship_response, ('data', 'stats')),
+    '/api/statistics/mark-correlations': (mark_correlations_response, ('data', 'stats')),
+    '/api/predictions/next-year-students': (next_year_students_response, ('data', 'stats')),
+    '/api/cube/info': (cube_info_response, ('cube',)),
+    '/api/trajectories/cohorts': (trajectory_cohorts_response, ('data', 'trajectories')),
+    '/api/trajectories/retention': (trajectory_retention_response, ('data', 'trajectories')),
+    '/api/trajectories/trends': (trajectory_trends_response, ('data', 'trajectories'))
+}
+
+
+def rendered_response(builder):
+    """Nœud du graphe: réponse JSON sérialisée une fois, avec variante gzip et ETag (voir response_cache.py)"""
+    def render(*inputs):
+        return render_body(builder(*inputs), graph.version)
+    return render
+
+
+# Statistiques calculées à la demande (source "data": csv_data), dans l'ordre du préchauffage
+graph.register('stats_accumulator', build_accumulator, ('data',))
+graph.register('stats', build_stats, ('data', 'stats_accumulator'))
+graph.register('trajectories', build_trajectories, ('data',))
+for path, (builder, inputs) in RESPONSE_BUILDERS.items():
+    graph.register(path, rendered_response(builder), inputs)
+graph.register('distributions', build_distributions, ('data',))
+graph.register('cube', build_cube, ('data',))
+
+
+def current_stats():
+    """Statistiques de la version chargée (calculées si nécessaire), None sans données"""
+    return graph.get('stats') if csv_data else None
+
+
 # Définir le port globalement avant la classe du handler
 PORT = BASE_PORT
 
-class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
+class EuromedAPIHandler(KeepAliveHandler, http.server.SimpleHTTPRequestHandler):
     """Gestionnaire HTTP pour l'API Euromed"""
+    max_body = MAX_UPLOAD_MB * 1024 * 1024  # le corps le plus volumineux: fichier envoyé à /api/upload
+    
     def _set_headers(self, content_type='application/json'):
         self.send_response(200)
         self.send_header('Content-Type', content_type)
@@ -594,10 +1056,107 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
     
+    def _send_rendered(self, rendered):
+        """
+        Envoie une réponse pré-rendue: 304 si le client a déjà cette version (If-None-Match),
+        variante gzip si elle existe et que le client l'accepte.
+        """
+        known_tags = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        if rendered.etag in known_tags or '*' in known_tags:
+            self.send_response(304)
+            body = b''
+        else:
+            self.send_response(200)
+            body = rendered.body
+            if rendered.gzip_body is not None and accepts_gzip(self.headers.get('Accept-Encoding', '')):
+                body = rendered.gzip_body
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', rendered.etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+        self.wfile.write(body)
+    
     def do_OPTIONS(self):
         self._set_headers()
     
     def do_POST(self):
+        # Le chargement d'un fichier modifie les données: verrou exclusif pris par upload_csv
+        if urlparse(self.path).path == '/api/upload':
+            self._handle_upload()
+            return
+        with data_lock.shared:
+            self._handle_post()
+    
+    def do_GET(self):
+        if self.send_prerendered():
+            return
+        with data_lock.shared:
+            self._handle_get()
+    
+    def send_prerendered(self):
+        """
+        Envoie la réponse GET si elle est déjà rendue pour la version chargée des données
+        (voir RESPONSE_BUILDERS): sans verrou ni calcul. Retourne False sinon.
+        """
+        path = urlparse(self.path).path
+        rendered = graph.peek(path) if self.command == 'GET' and path in RESPONSE_BUILDERS else None
+        if rendered is None:
+            return False
+        self._send_rendered(rendered)
+        return True
+    
+    def _handle_upload(self):
+        """POST /api/upload (multipart/form-data): champ `file` (CSV) et `mode` ('replace' ou 'append')"""
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self._set_error_headers(400)
+            self.wfile.write(json.dumps({"success": False, "error": "Content-Length invalide"}).encode())
+            return
+        if content_length > MAX_UPLOAD_MB * 1024 * 1024:
+            self._set_error_headers(413)
+            self.wfile.write(json.dumps({"success": False,
+                                         "error": f"Fichier trop volumineux (maximum {MAX_UPLOAD_MB} MB)"}).encode())
+            return
+        fields = parse_multipart(self.headers.get('Content-Type', ''), self.rfile.read(content_length))
+        if fields is None:
+            self._set_error_headers(415)
+            self.wfile.write(json.dumps({"success": False,
+                                         "error": "Content-Type doit être multipart/form-data"}).encode())
+            return
+        if not fields.get('file'):
+            self._set_error_headers(400)
+            self.wfile.write(json.dumps({"success": False, "error": "Aucun fichier reçu (champ 'file')"}).encode())
+            return
+        
+        try:
+            mode = fields.get('mode', b'replace').decode('utf-8', 'replace').strip()
+            success, message = upload_csv(fields['file'], mode)
+        except Exception as e:
+            self._set_error_headers(500)
+            self.wfile.write(json.dumps({"success": False, "error": str(e)}).encode())
+            return
+        if not success:
+            self._set_error_headers(400)
+            self.wfile.write(json.dumps({"success": False, "error": message}).encode())
+            return
+        with data_lock.shared:
+            summary = {
+                "row_count": csv_data["count"],
+                "column_count": len(csv_data["columns"]),
+                "columns": csv_data["columns"]
+            }
+        self._set_headers()
+        self.wfile.write(json.dumps({"success": True, "message": message, "summary": summary}).encode())
+    
+    def _handle_post(self):
         parsed_url = urlparse(self.path)
         path = parsed_url.path
         
@@ -614,6 +1173,8 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                 bac_type = student_data.get('Baccalaureat_Type', '')
                 has_scholarship = student_data.get('Scholarship', False)
                 
+                stats = current_stats()
+                
                 # Initialize thresholds with default values to prevent errors
                 grad_threshold = 15.0  # Default threshold
                 semester_threshold = 15.0  # Default threshold
@@ -626,35 +1187,26 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                     semester_threshold = stats.get("semester_graduation_threshold")
                     
                 # Rechercher des patterns similaires dans les données existantes
-                similar_students = []
-                success_count = 0
+                store = csv_data["store"]
+                bac_column = store.categorical["Baccalaureat_Type"]
+                bac_code = bac_column.index.get(bac_type)
+                graduated_flags = store.graduated.flags(True)
                 
-                for record in csv_data["data"]:
-                    record_mark = float(record.get('Mark', 0)) if isinstance(record.get('Mark'), (int, float, str)) else 0
-                    record_bac = record.get('Baccalaureat_Type', '')
-                    record_scholarship = record.get('Scholarship', False)
-                    record_graduated = record.get('Graduated', False)
-                    
-                    # Calculer un score de similarité
-                    mark_diff = abs(mark - record_mark)
-                    bac_match = 1 if bac_type == record_bac else 0
-                    scholarship_match = 1 if has_scholarship == record_scholarship else 0
-                    
-                    similarity_score = (10 - min(10, mark_diff)) * 0.7 + bac_match * 20 + scholarship_match * 10
-                    
-                    if similarity_score > 50:  # Seuil de similarité
-                        similar_students.append({
-                            "record": record,
-                            "similarity": similarity_score,
-                            "graduated": record_graduated
-                        })
-                        
-                        if record_graduated:
-                            success_count += 1
+                if has_scholarship is True:
+                    scholarship_matches = store.scholarship.flags(True)
+                elif has_scholarship is False:
+                    scholarship_matches = store.scholarship.flags(False)
+                else:
+                    scholarship_matches = zeros(len(store))
+                
+                # Étudiants similaires (score de similarité > 50), groupés par le masque de similarité
+                similar = similarity_mask(store.marks, mark, equal_mask(bac_column.codes, bac_code), scholarship_matches)
+                similar_count = group_count(similar, 2)[1]
+                success_count = group_count(similar, 2, graduated_flags)[1]
                 
                 # Calculer la probabilité de réussite basée sur des étudiants similaires
-                if similar_students:
-                    success_probability = (success_count / len(similar_students)) * 100
+                if similar_count:
+                    success_probability = (success_count / similar_count) * 100
                     
                     # Valeur minimale pour ne pas avoir 0%
                     if success_probability < 10 and success_count > 0:
@@ -684,13 +1236,12 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                     
                     # Impact de la bourse basé sur les données réelles
                     scholarship_factor = 0
-                    with_scholarship_success = sum(1 for r in csv_data["data"] 
-                                                  if r.get("Scholarship") is True and r.get("Graduated") is True)
-                    total_with_scholarship = sum(1 for r in csv_data["data"] if r.get("Scholarship") is True)
+                    graduated_mask = store.graduated.true_mask()
+                    with_scholarship_success = (store.scholarship.true_mask() & graduated_mask).bit_count()
+                    total_with_scholarship = store.scholarship.count_true()
                     
-                    without_scholarship_success = sum(1 for r in csv_data["data"] 
-                                                     if r.get("Scholarship") is False and r.get("Graduated") is True)
-                    total_without_scholarship = sum(1 for r in csv_data["data"] if r.get("Scholarship") is False)
+                    without_scholarship_success = (store.scholarship.false_mask() & graduated_mask).bit_count()
+                    total_without_scholarship = store.scholarship.count_false()
                     
                     with_rate = with_scholarship_success / total_with_scholarship if total_with_scholarship > 0 else 0
                     without_rate = without_scholarship_success / total_without_scholarship if total_without_scholarship > 0 else 0
@@ -715,17 +1266,21 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                 }
                 
                 # Statistiques de réussite basées sur nos données
-                total_students = len(csv_data["data"])
-                current_graduated = sum(1 for r in csv_data["data"] if r.get("Graduated") is True)
-                current_active = sum(1 for r in csv_data["data"] if r.get("Graduated") is False)
+                total_students = len(store)
+                current_graduated = store.graduated.count_true()
+                current_active = store.graduated.count_false()
+                not_graduated_flags = store.graduated.flags(False)
+                # Notes (float32) et seuil (moyenne float64) comparés en virgule fixe, comme les
+                # sommes des statistiques: une note égale au seuil compte quelle que soit sa précision
+                reaches_threshold = at_least_mask(scaled_integers(store.marks, MARK_SCALE),
+                                                  round(grad_threshold * MARK_SCALE))
                 
                 graduation_stats = {
                     "currently_graduated": current_graduated,
                     "currently_active": current_active,
-                    "predicted_to_graduate": sum(1 for r in csv_data["data"] 
-                                             if r.get("Graduated") is False and float(r.get("Mark", 0)) >= grad_threshold),
+                    "predicted_to_graduate": group_count(not_graduated_flags, 2, reaches_threshold)[1],
                     "total_students": total_students,
-                    "similar_students_found": len(similar_students)
+                    "similar_students_found": similar_count
                 }
                     
                 response = {
@@ -758,31 +1313,42 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                 interests = student_data.get('Interests', '')
                 
                 # 1. Extraire toutes les spécialités disponibles dans nos données
-                specialties = list(set(record.get('Specialty', '') for record in csv_data["data"] if record.get('Specialty')))
+                store = csv_data["store"]
+                specialty_column = store.categorical["Specialty"]
+                bac_column = store.categorical["Baccalaureat_Type"]
+                bac_code = bac_column.index.get(bac_type)
+                graduated_flags = store.graduated.flags(True)
                 
-                # 2. Pour chaque spécialité, calculer:
+                # 2. En un seul passage, calculer pour chaque spécialité:
                 #    - Combien d'étudiants avec le même type de bac l'ont choisie
                 #    - Combien d'étudiants avec des notes similaires l'ont choisie
                 #    - Le taux de réussite dans cette spécialité
+                category_count = len(specialty_column.values)
+                specialty_codes = column(specialty_column.codes)
+                marks = column(store.marks)
+                totals = group_count(specialty_codes, category_count)
+                bac_matches = group_count(specialty_codes, category_count, equal_mask(bac_column.codes, bac_code))
+                mark_matches = group_count(specialty_codes, category_count, within_mask(marks, mark, 2))
+                successes = group_count(specialty_codes, category_count, graduated_flags)
+                mark_sums = group_sum(specialty_codes, category_count, scaled_integers(marks, MARK_SCALE))
+                
+                specialties = [s for s in specialty_column.values if s]
                 specialty_scores = {}
-                for specialty in specialties:
-                    specialty_records = [r for r in csv_data["data"] if r.get('Specialty') == specialty]
+                for code, specialty in enumerate(specialty_column.values):
+                    if not specialty:
+                        continue
                     
                     # Nombre total d'étudiants dans cette spécialité
-                    total_count = len(specialty_records)
+                    total_count = totals[code]
                     
                     # Étudiants avec même type de bac
-                    bac_match_count = sum(1 for r in specialty_records if r.get('Baccalaureat_Type') == bac_type)
-                    bac_match_rate = bac_match_count / max(1, total_count)
+                    bac_match_rate = bac_matches[code] / max(1, total_count)
                     
                     # Étudiants avec des notes similaires (±2 points)
-                    mark_match_count = sum(1 for r in specialty_records 
-                                         if abs(float(r.get('Mark', 0)) - mark) <= 2)
-                    mark_match_rate = mark_match_count / max(1, total_count)
+                    mark_match_rate = mark_matches[code] / max(1, total_count)
                     
                     # Taux de réussite dans cette spécialité
-                    success_count = sum(1 for r in specialty_records if r.get('Graduated') is True)
-                    success_rate = success_count / max(1, total_count)
+                    success_rate = successes[code] / max(1, total_count)
                     
                     # Mapper l'intérêt aux domaines de spécialité
                     interest_match = 0
@@ -812,7 +1378,7 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                         "success_rate": round(success_rate * 100, 1),
                         "interest_match": interest_match == 1,
                         "total_students": total_count,
-                        "avg_mark": round(sum(float(r.get('Mark', 0)) for r in specialty_records) / max(1, total_count), 1)
+                        "avg_mark": round(mark_sums[code] / (max(1, total_count) * MARK_SCALE), 1)
                     }
                 
                 # Trier les spécialités par score
@@ -867,138 +1433,160 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
             response = {"error": "Endpoint non trouvé"}
             self.wfile.write(json.dumps(response).encode())
     
-    def do_GET(self):
+    def _handle_get(self):
         parsed_url = urlparse(self.path)
         path = parsed_url.path
         
-        # Ajouter un nouvel endpoint pour exposer les informations de schéma
-        if path == '/api/schema':
-            self._set_headers()
-            schema_response = {
-                "columns": csv_data["columns"],
-                "schema": csv_data.get("schema", {}),
-                "available_features": csv_data.get("available_features", [])
-            }
-            self.wfile.write(json.dumps(schema_response).encode())
-            return
-        
         # Vérifier si les données sont chargées
-        if csv_data is None or stats is None:
+        if csv_data is None:
             self._set_error_headers(500)
             response = {"error": "Les données n'ont pas été correctement chargées"}
             self.wfile.write(json.dumps(response).encode())
             return
         
         try:
-            # API DATA SUMMARY
-            if path == '/api/data/summary':
-                self._set_headers()
-                summary = {
-                    "row_count": csv_data["count"],
-                    "column_count": len(csv_data["columns"]),
-                    "columns": csv_data["columns"]
-                }
-                self.wfile.write(json.dumps(summary).encode())
+            # Réponse pas encore rendue pour cette version: calculée maintenant puis mémorisée
+            if path in RESPONSE_BUILDERS:
+                self._send_rendered(graph.get(path))
             
-            # API GENDER STATS
-            elif path == '/api/statistics/gender':
-                self._set_headers()
-                gender_stats = {
-                    "counts": stats["gender_distribution"],
-                    "percentages": {gender: round((count / stats["total_students"]) * 100, 1) 
-                                  for gender, count in stats["gender_distribution"].items()},
-                    "total": stats["total_students"]
-                }
-                self.wfile.write(json.dumps(gender_stats).encode())
-            
-            # API NATIONALITY STATS
-            elif path == '/api/statistics/nationality':
-                self._set_headers()
-                nationality_stats = {
-                    "counts": stats["nationalities"],
-                    "percentages": {nat: round((count / stats["total_students"]) * 100, 1) 
-                                  for nat, count in stats["nationalities"].items()},
-                    "total": stats["total_students"],
-                    "distinct_nationalities": len(stats["nationalities"]),
-                    "top_nationalities": dict(sorted(stats["nationalities"].items(), 
-                                                     key=lambda x: x[1], reverse=True)[:5])
-                }
-                self.wfile.write(json.dumps(nationality_stats).encode())
-            
-            # API CITY STATS
-            elif path == '/api/statistics/city':
-                self._set_headers()
-                city_stats = {
-                    "counts": stats["cities"],
-                    "percentages": {city: round((count / stats["total_students"]) * 100, 1) 
-                                  for city, count in stats["cities"].items()},
-                    "total": stats["total_students"],
-                    "distinct_cities": len(stats["cities"]),
-                    "top_cities": dict(sorted(stats["cities"].items(), 
-                                             key=lambda x: x[1], reverse=True)[:5])
-                }
-                self.wfile.write(json.dumps(city_stats).encode())
-            
-            # API BAC TYPE STATS
-            elif path == '/api/statistics/bac-type':
-                self._set_headers()
-                bac_stats = {
-                    "counts": stats["bac_types"],
-                    "percentages": {bac: round((count / stats["total_students"]) * 100, 1) 
-                                   for bac, count in stats["bac_types"].items()},
-                    "success_rate": stats["success_rate_by_bac"],
-                    "avg_mark": stats["avg_marks_by_bac"],
-                    "total": stats["total_students"]
-                }
-                self.wfile.write(json.dumps(bac_stats).encode())
+            # API STUDENTS (lecture directe dans le CSV via l'index des lignes)
+            elif path == '/api/students' or path.startswith('/api/students/'):
+                row_index = csv_data.get("row_index")
+                if row_index is None:
+                    self._set_error_headers(503)
+                    self.wfile.write(json.dumps({"error": "Index des lignes indisponible"}).encode())
+                    return
+                
+                if path == '/api/students':
+                    # Page de lignes: /api/students?offset=N&limit=k
+                    query = parse_qs(parsed_url.query)
+                    try:
+                        offset = max(0, int(query.get("offset", ["0"])[0]))
+                        limit = min(MAX_PAGE_ROWS, max(0, int(query.get("limit", ["20"])[0])))
+                    except ValueError:
+                        self._set_error_headers(400)
+                        self.wfile.write(json.dumps({"error": "offset et limit doivent être des entiers"}).encode())
+                        return
+                    rows = row_index.read_rows(CSV_FILE, offset, limit)
+                    self._set_headers()
+                    self.wfile.write(json.dumps({
+                        "offset": offset,
+                        "limit": limit,
+                        "total": len(row_index),
+                        "students": [row_index.record(row) for row in rows]
+                    }).encode())
+                else:
+                    # Fiche d'un étudiant: /api/students/<ID>
+                    student_id = unquote(path[len('/api/students/'):])
+                    row_number = row_index.find(student_id)
+                    if row_number is None:
+                        self._set_error_headers(404)
+                        self.wfile.write(json.dumps({"error": f"Étudiant introuvable: {student_id}"}).encode())
+                        return
+                    row = row_index.read_rows(CSV_FILE, row_number, 1)[0]
+                    self._set_headers()
+                    self.wfile.write(json.dumps({"row": row_number, "student": row_index.record(row)}).encode())
             
-                        # API SCHOOL-SPECIALTY STATS
-            elif path == '/api/statistics/school-specialty':
+            # API MARK DISTRIBUTION (percentiles et histogramme par groupe, voir mark_distribution.py)
+            elif path == '/api/statistics/mark-distribution':
+                query = parse_qs(parsed_url.query)
+                distributions = graph.get("distributions")
+                column_name = query.get("column", ["Mark"])[0]
+                group = query.get("group", [None])[0]
+                value = query.get("value", [None])[0]
+                try:
+                    bins = int(query.get("bins", [str(DEFAULT_BINS)])[0])
+                except ValueError:
+                    bins = 0
+                if column_name not in DISTRIBUTION_COLUMNS:
+                    error = f"Colonne inconnue: {column_name} (disponibles: {', '.join(DISTRIBUTION_COLUMNS)})"
+                elif group is not None and group not in distributions.groups:
+                    error = f"Groupe inconnu: {group} (disponibles: {', '.join(distributions.groups)})"
+                elif not 1 <= bins <= MAX_BINS:
+                    error = f"bins doit être un entier entre 1 et {MAX_BINS}"
+                else:
+                    error = None
+                if error:
+                    self._set_error_headers(400)
+                    self.wfile.write(json.dumps({"error": error}).encode())
+                    return
+                
+                response = {"column": column_name, "group": group, "approximate": True}
+                if group is None or value is not None:
+                    distribution = distributions.describe(column_name, group, value, bins=bins)
+                    if distribution is None:
+                        self._set_error_headers(404)
+                        self.wfile.write(json.dumps({"error": f"Aucune valeur pour {group} = {value}"}).encode())
+                        return
+                    response["value"] = value
+                    response["distribution"] = distribution
+                else:
+                    response["distributions"] = {
+                        group_value: distributions.describe(column_name, group, group_value, bins=bins)
+                        for group_value in distributions.values(group)
+                    }
                 self._set_headers()
-                school_specialty_stats = {
-                    "schools": stats["schools"],
-                    "specialties": stats["specialties"],
-                    "school_specialty_distribution": stats["school_specialty_distribution"],
-                    "avg_mark_by_school": stats["avg_marks_by_specialty"],
-                    "avg_mark_by_specialty": stats["avg_marks_by_specialty"]
-                }
-                self.wfile.write(json.dumps(school_specialty_stats).encode())
+                self.wfile.write(json.dumps(response).encode())
             
-            # API SCHOLARSHIP STATS
-            elif path == '/api/statistics/scholarship':
+            # API CUBE (roll-up / slice sur le cube pré-agrégé, sans parcourir les lignes)
+            elif path == '/api/cube':
+                query = parse_qs(parsed_url.query)
+                cube = graph.get("cube")
+                group_by = [name for value in query.pop("group_by", []) for name in value.split(',') if name]
+                try:
+                    filters = {}
+                    for name, values in query.items():
+                        if name not in cube.dimensions:
+                            raise ValueError(f"Paramètre inconnu: {name} (dimensions: {', '.join(cube.dimensions)})")
+                        filters[name] = [parse_value(name, text) for value in values for text in value.split(',')]
+                    groups = cube.query(group_by, filters)
+                except ValueError as e:
+                    self._set_error_headers(400)
+                    self.wfile.write(json.dumps({"error": str(e)}).encode())
+                    return
                 self._set_headers()
-                scholarship_stats = {
-                    "counts": stats["counts"]["scholarship"],
-                    "percentage": stats["scholarship_percentage"],
-                    "by_gender": stats["scholarship_by_gender"],
-                    "by_bac_type": stats["scholarship_by_bac"],
-                    "success_rate": {
-                        "with_scholarship": round(sum(1 for r in csv_data["data"] 
-                                                     if r.get("Scholarship") is True and r.get("Graduated") is True) / 
-                                               max(1, sum(1 for r in csv_data["data"] if r.get("Scholarship") is True)) * 100, 1),
-                        "without_scholarship": round(sum(1 for r in csv_data["data"] 
-                                                        if r.get("Scholarship") is False and r.get("Graduated") is True) / 
-                                                  max(1, sum(1 for r in csv_data["data"] if r.get("Scholarship") is False)) * 100, 1)
-                    }
-                }
-                self.wfile.write(json.dumps(scholarship_stats).encode())
+                self.wfile.write(json.dumps({
+                    "group_by": group_by,
+                    "filters": filters,
+                    "groups": groups,
+                    "cells": len(cube.cells)
+                }).encode())
             
-            # API MARK CORRELATIONS
-            elif path == '/api/statistics/mark-correlations':
+            # API TRAJECTORIES (étudiants dont les notes chutent entre deux semestres consécutifs)
+            elif path == '/api/trajectories/at-risk':
+                query = parse_qs(parsed_url.query)
+                try:
+                    drop = float(query.get("drop", [str(AT_RISK_DROP)])[0])
+                    if not math.isfinite(drop):
+                        raise ValueError(drop)
+                    offset = max(0, int(query.get("offset", ["0"])[0]))
+                    limit = min(MAX_PAGE_ROWS, max(0, int(query.get("limit", ["20"])[0])))
+                except ValueError:
+                    self._set_error_headers(400)
+                    self.wfile.write(json.dumps({"error": "drop doit être un nombre fini, offset et limit des entiers"}).encode())
+                    return
+                engine = graph.get("trajectories")
+                store = csv_data["store"]
+                ids = store.strings_column('ID')
+                total, rows = engine.at_risk(drop, offset, limit)
+                students = []
+                for row in rows:
+                    student = {"row": row, "ID": ids[row] if ids is not None else None}
+                    student.update(engine.student(row))
+                    students.append(student)
                 self._set_headers()
-                mark_stats = {
-                    "by_gender": stats["avg_marks_by_gender"],
-                    "by_bac_type": stats["avg_marks_by_bac"],
-                    "by_scholarship": stats["avg_marks_by_scholarship"],
-                    "by_specialty": stats["avg_marks_by_specialty"],
-                    "by_graduation": stats["avg_marks_by_graduation"],
-                    "overall_avg": round(sum(float(r.get("Mark", 0)) for r in csv_data["data"]) / 
-                                       max(1, len(csv_data["data"])), 1)
-                }
-                self.wfile.write(json.dumps(mark_stats).encode())
+                self.wfile.write(json.dumps({
+                    "drop": drop,
+                    "offset": offset,
+                    "limit": limit,
+                    "total": total,
+                    "sampled": bool(csv_data.get("sampled")),
+                    "students": students
+                }).encode())
             
             # API FACULTY REVENUE
             elif path == '/api/predictions/faculty-revenue':
+                stats = current_stats()
                 self._set_headers()
                 
                 # Utiliser les écoles réellement présentes dans les données
@@ -1042,16 +1630,9 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                 # Création d'une analyse par spécialité
                 revenue_per_specialty = {}
                 
-                # Utiliser les vraies données pour construire la répartition par spécialité   
+                # Utiliser la répartition école/spécialité calculée sur les vraies données
                 for school in schools:
-                    school_records = [r for r in csv_data["data"] if r.get("School") == school]
-                    
-                    specialties = {}
-                    for record in school_records:
-                        specialty = record.get("Specialty", "Unknown")
-                        if specialty not in specialties:
-                            specialties[specialty] = 0
-                        specialties[specialty] += 1
+                    specialties = stats["school_specialty_distribution"].get(school, {})
                     
                     for specialty, count in specialties.items():
                         key = f"{school} - {specialty}"
@@ -1078,108 +1659,9 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                 }
                 self.wfile.write(json.dumps(revenue_stats).encode())
             
-            # API NEXT YEAR STUDENTS
-            elif path == '/api/predictions/next-year-students':
-                self._set_headers()
-                
-                # Extraire les années de début réelles de nos données
-                start_years = [int(record.get("Start_Year", 0)) for record in csv_data["data"] 
-                              if record.get("Start_Year") and record.get("Start_Year").isdigit()]
-                
-                if not start_years:
-                    # Fallback si aucune année de début n'est disponible
-                    current_year = 2023
-                    total_students = stats["total_students"]
-                    historical_counts = {
-                        current_year - 4: int(total_students * 0.7),
-                        current_year - 3: int(total_students * 0.8),
-                        current_year - 2: int(total_students * 0.9),
-                        current_year - 1: int(total_students * 0.95),
-                        current_year: total_students
-                    }
-                else:
-                    # Utiliser les années réelles pour créer l'historique
-                    year_counts = {}
-                    for year in start_years:
-                        if year not in year_counts:
-                            year_counts[year] = 0
-                        year_counts[year] += 1
-                    
-                    # Trier par année
-                    historical_counts = dict(sorted(year_counts.items()))
-                    
-                    # Vérifier si nous avons assez d'années
-                    if len(historical_counts) < 3:
-                        # Compléter avec des valeurs extrapolées
-                        current_year = max(historical_counts.keys())
-                        current_count = historical_counts[current_year]
-                        
-                        for i in range(1, 5):
-                            past_year = current_year - i
-                            if past_year not in historical_counts:
-                                # Estimer avec une légère diminution par année
-                                historical_counts[past_year] = int(current_count * (0.95 ** i))
-                        
-                        # Trier à nouveau
-                        historical_counts = dict(sorted(historical_counts.items()))
-                
-                # Calculer la tendance de croissance sur les données réelles
-                years = list(historical_counts.keys())
-                growth_rates = []
-                
-                for i in range(1, len(years)):
-                    prev_year = years[i-1]
-                    curr_year = years[i]
-                    prev_count = historical_counts[prev_year]
-                    curr_count = historical_counts[curr_year]
-                    
-                    if prev_count > 0:
-                        growth_rate = (curr_count - prev_count) / prev_count
-                        growth_rates.append(growth_rate)
-                
-                # Calculer la croissance moyenne récente (limiter à des valeurs plausibles)
-                if growth_rates:
-                    avg_growth_rate = sum(growth_rates) / len(growth_rates)
-                    avg_growth_rate = max(-0.05, min(0.15, avg_growth_rate))  # Entre -5% et +15%
-                else:
-                    avg_growth_rate = 0.07  # Valeur par défaut de 7%
-                
-                # Prédire pour l'année suivante
-                current_year = max(historical_counts.keys())
-                current_count = historical_counts[current_year]
-                predicted_count = int(current_count * (1 + avg_growth_rate))
-                
-                # Répartition par école basée sur les données réelles
-                predicted_by_school = {}
-                for school, count in stats["schools"].items():
-                    # Calculer la part actuelle de chaque école
-                    current_share = count / stats["total_students"]
-                    
-                    # Calculer le nombre d'étudiants prédit pour cette école
-                    predicted_by_school[school] = int(predicted_count * current_share)
-                
-                # Résumé des facteurs de croissance basé sur les données réelles
-                growth_factors = {
-                    "Tendance historique des inscriptions": 40,
-                    "Performance académique des écoles": 25,
-                    "Popularité des spécialités": 20,
-                    "Facteurs économiques généraux": 15
-                }
-                
-                next_year_stats = {
-                    "current_year": current_year,
-                    "next_year": current_year + 1,
-                    "historical_counts": historical_counts,
-                    "avg_growth_rate": round(avg_growth_rate * 100, 1),
-                    "predicted_count": predicted_count,
-                    "by_school": dict(sorted(predicted_by_school.items(), key=lambda x: x[1], reverse=True)),
-                    "growth_factors": growth_factors,
-                    "based_on_data": True
-                }
-                self.wfile.write(json.dumps(next_year_stats).encode())
-            
             # API AVERAGE FEE
             elif path == '/api/predictions/average-fee':
+                stats = current_stats()
                 self._set_headers()
                 
                 # Récupérer les frais calculés pour les écoles
@@ -1308,6 +1790,14 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                         <h3>GET /api/statistics/nationality</h3>
                         <pre>curl -X GET http://localhost:{PORT}/api/statistics/nationality</pre>
                     </div>
+                    <div class="endpoint">
+                        <h3>GET /api/students?offset=0&amp;limit=20</h3>
+                        <pre>curl -X GET "http://localhost:{PORT}/api/students?offset=0&limit=20"</pre>
+                    </div>
+                    <div class="endpoint">
+                        <h3>GET /api/students/&lt;ID&gt;</h3>
+                        <pre>curl -X GET http://localhost:{PORT}/api/students/E001</pre>
+                    </div>
                     <div class="endpoint">
                         <h3>GET /api/statistics/city</h3>
                         <pre>curl -X GET http://localhost:{PORT}/api/statistics/city</pre>
@@ -1328,10 +1818,41 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                         <h3>GET /api/statistics/mark-correlations</h3>
                         <pre>curl -X GET http://localhost:{PORT}/api/statistics/mark-correlations</pre>
                     </div>
+                    <div class="endpoint">
+                        <h3>GET /api/cube?group_by=School&amp;Scholarship=true&amp;Start_Year=2020</h3>
+                        <pre>curl -X GET "http://localhost:{PORT}/api/cube?group_by=School,Gender&amp;Graduated=true"</pre>
+                    </div>
+                    <div class="endpoint">
+                        <h3>GET /api/cube/info</h3>
+                        <pre>curl -X GET http://localhost:{PORT}/api/cube/info</pre>
+                    </div>
+                    <div class="endpoint">
+                        <h3>GET /api/statistics/mark-distribution?column=Mark&amp;group=School&amp;value=...&amp;bins=20</h3>
+                        <pre>curl -X GET "http://localhost:{PORT}/api/statistics/mark-distribution?column=S1&amp;group=Specialty"</pre>
+                    </div>
+                    <div class="endpoint">
+                        <h3>GET /api/trajectories/cohorts</h3>
+                        <pre>curl -X GET http://localhost:{PORT}/api/trajectories/cohorts</pre>
+                    </div>
+                    <div class="endpoint">
+                        <h3>GET /api/trajectories/retention</h3>
+                        <pre>curl -X GET http://localhost:{PORT}/api/trajectories/retention</pre>
+                    </div>
+                    <div class="endpoint">
+                        <h3>GET /api/trajectories/trends</h3>
+                        <pre>curl -X GET http://localhost:{PORT}/api/trajectories/trends</pre>
+                    </div>
+                    <div class="endpoint">
+                        <h3>GET /api/trajectories/at-risk?drop=3&amp;offset=0&amp;limit=20</h3>
+                        <pre>curl -X GET "http://localhost:{PORT}/api/trajectories/at-risk?drop=5&amp;limit=10"</pre>
+                    </div>
                     
                     <h2>Prédictions disponibles:</h2>
                     <div class="endpoint">
                         <h3>POST /api/predictions/graduation</h3>
+                        <p><code>graduation_stats.predicted_to_graduate</code>: étudiants non diplômés dont la note
+                        atteint la note moyenne des diplômés du jeu de données (<code>graduation_threshold</code>,
+                        au 1e-4 près), et non plus un seuil fixe de 15.</p>
                         <pre>curl -X POST -H "Content-Type: application/json" -d '{{"Mark": 16, "Baccalaureat_Type": "Scientific", "Scholarship": true}}' http://localhost:{PORT}/api/predictions/graduation</pre>
                     </div>
                     <div class="endpoint">
@@ -1350,6 +1871,14 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
                         <h3>GET /api/predictions/average-fee</h3>
                         <pre>curl -X GET http://localhost:{PORT}/api/predictions/average-fee</pre>
                     </div>
+                    
+                    <h2>Données:</h2>
+                    <div class="endpoint">
+                        <h3>POST /api/upload</h3>
+                        <pre>curl -X POST -F "file=@nouveaux.csv" -F "mode=append" http://localhost:{PORT}/api/upload</pre>
+                        <p>mode=replace: si le fichier envoyé reprend le début du fichier chargé (export corrigé en fin
+                        de fichier), seules les lignes qui suivent la partie commune sont retirées puis ajoutées.</p>
+                    </div>
                 </body>
                 </html>
                 """
@@ -1368,6 +1897,53 @@ class EuromedAPIHandler(http.server.SimpleHTTPRequestHandler):
             import traceback
             traceback.print_exc()
 
+def prepare_fork():
+    """Calcule toutes les statistiques avant la création des processus du serveur (hérités par copie)"""
+    with data_lock.shared:
+        for name in graph.names():
+            try:
+                graph.get(name)
+            except Exception as e:
+                print(f"⚠️ Calcul de {name} impossible: {e}")
+
+
+def after_fork():
+    """Dans un processus du serveur: verrous recréés (seul le thread du fork y existe)"""
+    data_lock.after_fork()
+    graph.after_fork()
+
+
+def announce_server():
+    print(f"\n✅ Serveur API démarré sur le port {PORT}")
+    print(f"🌐 Accédez à l'API via : http://localhost:{PORT}/api")
+    print("⚠️ Assurez-vous que votre frontend est configuré pour utiliser ce port !")
+    print("👉 Appuyez sur Ctrl+C pour arrêter le serveur.")
+
+
+def start_async_server():
+    """Démarre le serveur HTTP asyncio (voir async_server.py): mêmes routes que start_server"""
+    if not is_port_available(PORT):
+        print(f"⚠️ ATTENTION: Le port {PORT} est déjà utilisé!")
+        print("Veuillez arrêter tout serveur qui pourrait utiliser ce port.")
+        return False
+    try:
+        server = AsyncHTTPServer(EuromedAPIHandler, threads=SERVER_THREADS,
+                                 inline=EuromedAPIHandler.send_prerendered,
+                                 max_body=MAX_UPLOAD_MB * 1024 * 1024)
+        announce_server()
+        print(f"🧵 Serveur asyncio, {SERVER_THREADS} threads de traitement des requêtes")
+        server.run('', PORT)
+        return True
+    except KeyboardInterrupt:
+        print("\n👋 Arrêt du serveur...")
+        return True
+    except Exception as e:
+        print(f"❌ Une erreur est survenue : {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
 def start_server():
     """Démarre le serveur HTTP"""
     if not is_port_available(PORT):
@@ -1376,12 +1952,20 @@ def start_server():
         return False
     try:
         server_address = ('', PORT)
-        httpd = socketserver.TCPServer(server_address, EuromedAPIHandler)
+        httpd = PooledHTTPServer(server_address, EuromedAPIHandler, threads=SERVER_THREADS)
+        announce_server()
 
-        print(f"\n✅ Serveur API démarré sur le port {PORT}")
-        print(f"🌐 Accédez à l'API via : http://localhost:{PORT}/api")
-        print("⚠️ Assurez-vous que votre frontend est configuré pour utiliser ce port !")
-        print("👉 Appuyez sur Ctrl+C pour arrêter le serveur.")
+        if SERVER_PROCESSES > 1:
+            print(f"🧵 {SERVER_PROCESSES} processus × {SERVER_THREADS} threads")
+            workers = PreforkServer(httpd, SERVER_PROCESSES, prepare=prepare_fork, fork_lock=data_lock,
+                                    after_fork=after_fork, generation=lambda: graph.version).start()
+            try:
+                workers.supervise()
+            except KeyboardInterrupt:
+                print("\n👋 Arrêt du serveur...")
+                workers.stop()
+            return True
+        print(f"🧵 {SERVER_THREADS} threads de traitement des requêtes")
 
         # Démarrer le serveur dans un thread
         server_thread = threading.Thread(target=httpd.serve_forever)
@@ -1413,8 +1997,10 @@ def start_server():
             httpd.server_close()
             print("✅ Le serveur a été correctement fermé.")
 
-def main():
-    """Fonction principale"""
+def main(server='threaded'):
+    """Fonction principale (server: 'threaded' ou 'asyncio')"""
+    # Messages des modules (instantané, ingestion, surveillance du CSV, serveur): configurés une seule fois ici
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     print("\n=== 🚀 Démarrage de l'application Euromed Analytics Garantie ===\n")
     
     # Configuration du répertoire de données
@@ -1428,17 +2014,28 @@ def main():
     if not parse_csv():
         print("❌ Erreur: Impossible de charger les données!")
         return False
+    start_tail_watcher()
     
     # Démarrage du serveur
     print("\n🌐 Démarrage du serveur API...")
-    if not start_server():
+    if not (start_async_server() if server == 'asyncio' else start_server()):
         print("❌ Erreur: Impossible de démarrer le serveur!")
         return False
     
     return True
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description="Démarrage de l'API Euromed Analytics")
+    parser.add_argument('--server', choices=('threaded', 'asyncio'), default='threaded',
+                        help="Serveur HTTP: pool de threads (défaut) ou boucle asyncio")
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS,
+                        help="Threads de traitement des requêtes (par processus)")
+    parser.add_argument('--processes', type=int, default=SERVER_PROCESSES,
+                        help="Processus servant le port (serveur threaded uniquement)")
+    args = parser.parse_args()
+    SERVER_THREADS = args.threads
+    SERVER_PROCESSES = args.processes
+    success = main(args.server)
     if not success:
         print("\n=== Instructions pour résoudre les problèmes ===")
         print("1. Vérifiez que le fichier CSV est correctement formaté")
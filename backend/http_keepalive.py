@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Connexions HTTP/1.1 persistantes pour les gestionnaires http.server.
+
+En HTTP/1.0 et sans Content-Length, chaque requête du tableau de bord ouvre et
+ferme une connexion TCP. KeepAliveHandler (à placer avant la classe de base
+du gestionnaire) passe le gestionnaire en HTTP/1.1:
+
+- le corps de chaque requête (Content-Length) est lu avant son traitement: la
+  requête suivante, éventuellement déjà envoyée (pipelining), commence
+  exactement après, même si le gestionnaire n'a pas tout lu. Un corps de plus
+  de `max_body` octets est refusé (413) sans être lu; avec
+  `Expect: 100-continue`, le refus ou la réponse intermédiaire 100 est envoyé
+  avant que le client n'envoie le corps;
+- la réponse écrite par le gestionnaire est conservée en mémoire puis envoyée
+  avec un Content-Length exact et l'en-tête Connection (voir
+  finalize_response), sans modifier les routes existantes;
+- la connexion reste ouverte jusqu'à KEEPALIVE_TIMEOUT secondes
+  d'inactivité. Une connexion inactive occupe un thread du serveur: elle est
+  fermée plus tôt dès que d'autres connexions attendent un thread
+  (PooledHTTPServer.saturated, vérifié toutes les IDLE_POLL_SECONDS).
+"""
+
+import io
+import select
+import time
+from http import HTTPStatus
+
+# Fermeture d'une connexion inactive (secondes)
+KEEPALIVE_TIMEOUT = 5
+# Période de vérification de la saturation du serveur pendant l'attente d'une requête
+IDLE_POLL_SECONDS = 0.2
+# Taille maximum du corps d'une requête (au-delà: 413 sans lire le corps)
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+# En-têtes de la réponse du gestionnaire remplacés par ceux du serveur
+_HOP_HEADERS = (b'content-length', b'connection', b'keep-alive', b'transfer-encoding')
+
+
+def finalize_response(raw, keep_alive, head_only=False):
+    """
+    Réponse écrite par un gestionnaire -> réponse HTTP/1.1 avec Content-Length et Connection.
+    head_only: réponse à HEAD (pas de corps, Content-Length du gestionnaire conservé).
+
+    Returns:
+        (octets à envoyer, connexion conservée), ou (None, False) si `raw` n'est pas une réponse
+    """
+    head, separator, body = raw.partition(b'\r\n\r\n')
+    lines = head.split(b'\r\n')
+    status = lines[0].split(b' ', 1)[1:] if separator else []
+    if not status or not status[0][:3].isdigit():
+        return None, False
+    code = int(status[0][:3])
+    out = [b'HTTP/1.1 ' + status[0]]
+    for line in lines[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'connection' and value.strip().lower() == b'close':
+            keep_alive = False
+        if name not in _HOP_HEADERS or (head_only and name == b'content-length'):
+            out.append(line)
+    if head_only or code < 200 or code in (204, 304):
+        body = b''
+    else:
+        out.append(b'Content-Length: %d' % len(body))
+    out.append(b'Connection: keep-alive' if keep_alive else b'Connection: close')
+    return b'\r\n'.join(out) + b'\r\n\r\n' + body, keep_alive
+
+
+class KeepAliveHandler:
+    """Mixin HTTP/1.1 (keep-alive, pipelining) pour un BaseHTTPRequestHandler"""
+
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    max_body = MAX_BODY_BYTES
+
+    def _saturated(self):
+        saturated = getattr(self.server, 'saturated', None)
+        return saturated is not None and saturated()
+
+    def _wait_for_request(self):
+        """Attend la requête suivante d'une connexion persistante; False si elle doit être fermée"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            self.connection.setblocking(False)
+            try:
+                if self.rfile.peek(1):
+                    return True  # requête déjà reçue (pipelining) ou arrivée
+            except OSError:
+                return False
+            finally:
+                self.connection.settimeout(self.timeout)
+            if select.select([self.connection], [], [], IDLE_POLL_SECONDS)[0]:
+                return True
+            if time.monotonic() >= deadline or self._saturated():
+                return False
+
+    def handle_one_request(self):
+        if getattr(self, '_answered', False) and not self._wait_for_request():
+            self.close_connection = True
+            return
+        self._answered = True
+        connection_rfile, connection_wfile = self.rfile, self.wfile
+        self._connection_wfile = connection_wfile
+        self.wfile = io.BytesIO()
+        try:
+            super().handle_one_request()
+        finally:
+            self.rfile, self.wfile, raw = connection_rfile, connection_wfile, self.wfile.getvalue()
+        if not raw:
+            return  # connexion fermée par le client ou inactive
+        keep_alive = not self.close_connection and not self._saturated()
+        response, keep_alive = finalize_response(raw, keep_alive, head_only=getattr(self, 'command', None) == 'HEAD')
+        self.close_connection = not keep_alive
+        self.wfile.write(response if response is not None else raw)
+
+    def _content_length(self):
+        """Taille du corps annoncée, ou None après une réponse d'erreur (411, 400, 413)"""
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.send_error(HTTPStatus.LENGTH_REQUIRED, "Content-Length requis")
+            return None
+        try:
+            content_length = int(self.headers.get('Content-Length') or 0)
+            if content_length < 0:
+                raise ValueError(content_length)
+        except ValueError:
+            self.send_error(HTTPStatus.BAD_REQUEST, "Content-Length invalide")
+            return None
+        if content_length > self.max_body:
+            self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            explain=f"Corps de la requête trop volumineux (maximum {self.max_body} octets)")
+            return None
+        return content_length
+
+    def handle_expect_100(self):
+        # Réponse intermédiaire envoyée tout de suite sur la connexion (la réponse finale est
+        # conservée en mémoire); une requête refusée reçoit directement sa réponse d'erreur
+        if self._content_length() is None:
+            return False
+        self._connection_wfile.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        return True
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        content_length = self._content_length()
+        if content_length is None:
+            return False
+        self.rfile = io.BytesIO(self.rfile.read(content_length) if content_length else b'')
+        return True
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Pipeline d'ingestion en un seul passage.
+
+Le fichier CSV est lu une seule fois, séquentiellement. Chaque ligne est
+décodée une seule fois (RowDecoder) puis transmise à des consommateurs
+("sinks") interchangeables: inférence du schéma, stockage colonnaire et
+accumulateurs statistiques. Le nombre total de lignes est obtenu au passage.
+"""
+
+import csv
+import logging
+from collections import namedtuple
+
+from compressed_input import open_input
+from line_filter import LineFilter
+from schema_analyzer import DEFAULT_SAMPLE_ROWS, SchemaProfiler
+from sketches import ColumnSketches
+from stats_accumulator import StatsAccumulator
+from student_store import RowDecoder, StudentStore
+
+logger = logging.getLogger(__name__)
+
+IngestResult = namedtuple('IngestResult', ['headers', 'row_count', 'processed_rows', 'skipped_rows',
+                                           'end_offset'])
+
+
+class IngestSink:
+    """
+    Interface d'un consommateur du pipeline d'ingestion.
+
+    `needs_decoded = False`: le sink n'utilise pas la ligne décodée (si aucun sink
+    n'en a besoin, les lignes ne sont pas décodées et `decoded` vaut None).
+    `needs_offsets = True`: locate() reçoit, avant chaque add(), la position en octets
+    du début de l'enregistrement.
+    """
+
+    needs_decoded = True
+    needs_offsets = False
+
+    def begin(self, headers):
+        """Appelé une fois avec les en-têtes, avant la première ligne"""
+
+    def locate(self, offset):
+        """Position (en octets) du début de l'enregistrement transmis au prochain add()"""
+
+    def add(self, row, decoded):
+        """Reçoit la ligne brute et sa version décodée (None si la ligne est invalide)"""
+
+    def finish(self, result):
+        """Appelé en fin de lecture avec l'IngestResult"""
+
+
+class StoreSink(IngestSink):
+    """Range les lignes décodées dans un StudentStore (nouveau, ou existant pour y ajouter des lignes)"""
+
+    def __init__(self, store=None):
+        self.store = store
+
+    def begin(self, headers):
+        if self.store is None:
+            self.store = StudentStore(headers)
+
+    def add(self, row, decoded):
+        if decoded is not None:
+            self.store.append_decoded(decoded)
+
+
+class StatsSink(IngestSink):
+    """
+    Alimente les accumulateurs statistiques avec les lignes rangées par le StoreSink:
+    elles sont agrégées en bloc, par colonnes, en fin de lecture.
+    """
+
+    needs_decoded = False
+
+    def __init__(self, store_sink):
+        self.store_sink = store_sink
+        self.accumulator = None
+        self._start = 0
+
+    def begin(self, headers):
+        self.accumulator = StatsAccumulator(self.store_sink.store)
+        self._start = len(self.store_sink.store)
+
+    def finish(self, result):
+        self.accumulator.add_store(self.store_sink.store, self._start)
+
+
+class SketchSink(IngestSink):
+    """
+    Résume les colonnes `columns` (valeurs distinctes et fréquentes, voir sketches.py) sur
+    toutes les lignes lues, y compris celles qu'un échantillonnage ne garde pas.
+    Des sketches existants peuvent être complétés (lignes ajoutées).
+    """
+
+    needs_decoded = False
+
+    def __init__(self, columns, sketches=None):
+        self.sketches = sketches if sketches is not None else ColumnSketches(columns)
+        self.columns = tuple(columns)
+        self._positions = ()
+        self._column_count = 0
+
+    def begin(self, headers):
+        self._positions = tuple((headers.index(name), self.sketches[name])
+                                for name in self.columns if name in headers)
+        self._column_count = len(headers)
+
+    def add(self, row, decoded):
+        if len(row) != self._column_count:
+            return  # ligne ignorée par les autres consommateurs
+        for position, sketch in self._positions:
+            sketch.add(row[position].strip())
+
+
+class SchemaSink(IngestSink):
+    """Infère le schéma sur les `sample_rows` premières lignes (toutes si None)"""
+
+    needs_decoded = False
+
+    def __init__(self, sample_rows=DEFAULT_SAMPLE_ROWS):
+        self.sample_rows = sample_rows
+        self.profiler = None
+        self.schema = None
+
+    def begin(self, headers):
+        self.profiler = SchemaProfiler(headers, max_analysis_rows=self.sample_rows or 1000)
+
+    def add(self, row, decoded):
+        if self.sample_rows is None or self.profiler.rows_seen < self.sample_rows:
+            self.profiler.add(row)
+
+    def finish(self, result):
+        self.schema = self.profiler.result(result.row_count, self.sample_rows)
+
+
+class _RawLines:
+    """
+    Lignes brutes (bytes) d'un fichier binaire, avec le nombre d'octets consommés.
+    Si `complete_only`, une dernière ligne sans fin de ligne (en cours d'écriture) est laissée
+    de côté. La lecture s'arrête à `stop_offset` s'il est donné. `in_quotes` indique si les
+    octets consommés s'arrêtent dans un champ entre guillemets.
+    """
+
+    def __init__(self, f, offset, complete_only=False, stop_offset=None):
+        self.f = f
+        self.offset = offset
+        self.complete_only = complete_only
+        self.stop_offset = stop_offset
+        self.in_quotes = False
+
+    def __iter__(self):
+        for line in self.f:
+            if self.stop_offset is not None and self.offset >= self.stop_offset:
+                return
+            if self.complete_only and not line.endswith(b'\n'):
+                return
+            self.offset += len(line)
+            if line.count(b'"') % 2:
+                self.in_quotes = not self.in_quotes
+            yield line
+
+
+def ingest_csv(file_path, sinks, max_rows=None, start_offset=0, headers=None, stop_offset=None):
+    """
+    Lit le fichier CSV une seule fois et alimente les sinks.
+
+    Args:
+        file_path: Chemin vers le fichier CSV
+        sinks: Liste d'IngestSink (appelés dans l'ordre pour chaque ligne)
+        max_rows: Nombre maximum de lignes transmises aux sinks (les suivantes sont seulement comptées)
+        start_offset: Position (en octets) où reprendre la lecture, pour ne lire que les lignes
+            ajoutées depuis un précédent passage (voir tail_ingest). Les en-têtes doivent alors être fournis
+            et seuls les enregistrements complets sont lus.
+        headers: En-têtes déjà connus (obligatoires si start_offset > 0)
+        stop_offset: Position (en octets, sur une fin d'enregistrement) où arrêter la lecture
+
+    Returns:
+        Un IngestResult (en-têtes, nombre total de lignes, lignes traitées, lignes ignorées,
+        position en octets de la fin du dernier enregistrement lu)
+    """
+    resuming = start_offset > 0
+    with open_input(file_path) as f:
+        f.seek(start_offset)
+        raw = _RawLines(f, start_offset, complete_only=resuming, stop_offset=stop_offset)
+        lines = LineFilter(line.decode('utf-8') for line in raw)
+        reader = csv.reader(lines)
+        if not resuming:
+            headers = next(reader)
+        decoder = RowDecoder(headers)
+        column_count = len(headers)
+        decode = any(sink.needs_decoded for sink in sinks)
+        offset_sinks = [sink for sink in sinks if sink.needs_offsets]
+
+        for sink in sinks:
+            sink.begin(headers)
+
+        row_count = 0
+        processed_rows = 0
+        skipped_rows = 0
+        end_offset = raw.offset
+        for row in reader:
+            if resuming and raw.in_quotes:
+                break  # Enregistrement multi-lignes pas encore entièrement écrit
+            record_start, end_offset = end_offset, raw.offset
+            row_count += 1
+            if max_rows is not None and processed_rows >= max_rows:
+                continue  # Au-delà de la limite: compter seulement
+
+            if len(row) == column_count:
+                decoded = decoder.decode(row) if decode else None
+                processed_rows += 1
+            else:
+                decoded = None
+                skipped_rows += 1
+                logger.debug("Ligne %s: %s colonnes au lieu de %s (ignorée)", lines.line_number, len(row), column_count)
+
+            for sink in offset_sinks:
+                sink.locate(record_start)
+            for sink in sinks:
+                sink.add(row, decoded)
+        else:
+            # Lecture complète: les commentaires et lignes vides finales sont aussi consommés
+            end_offset = raw.offset
+
+    result = IngestResult(headers, row_count, processed_rows, skipped_rows, end_offset)
+    for sink in sinks:
+        sink.finish(result)
+
+    logger.info("Ingestion terminée: %s lignes lues, %s traitées, %s ignorées",
+                row_count, processed_rows, skipped_rows)
+    return result
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Filtre de lignes en flux pour les fichiers CSV.
+
+Les exports contiennent parfois des lignes de commentaire ('//') ou des lignes
+vides. Plutôt que de recopier le fichier dans un fichier temporaire ou de le
+charger en entier avec readlines(), chaque chargeur enveloppe son fichier dans
+un LineFilter qui écarte ces lignes au fil de la lecture:
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        lines = LineFilter(f)
+        for row in csv.reader(lines):
+            ...  # lines.line_number = numéro physique de la ligne courante
+
+Une ligne n'est écartée que hors d'un champ entre guillemets: une valeur
+multi-lignes commençant par '//' n'est donc pas tronquée. Le filtre accepte
+des lignes str ou bytes et expose aussi read(size) pour les lecteurs qui
+attendent un objet fichier (pandas.read_csv).
+"""
+
+COMMENT_PREFIX = '//'
+
+
+class LineFilter:
+    """Itérateur sur les lignes utiles d'un fichier (sans commentaires ni lignes vides)"""
+
+    def __init__(self, lines, comment_prefix=COMMENT_PREFIX, skip_blank=True):
+        self.comment_prefix = comment_prefix
+        self.skip_blank = skip_blank
+        self.line_number = 0     # numéro physique (à partir de 1) de la dernière ligne lue
+        self.skipped_lines = 0   # lignes de commentaire ou vides écartées
+        self._empty = ''
+        self._pending = ''
+        self._iterator = self._filter(lines)
+
+    def _filter(self, lines):
+        prefix = quote = None
+        in_quotes = False
+        for line in lines:
+            self.line_number += 1
+            if prefix is None:
+                if isinstance(line, str):
+                    prefix, quote = self.comment_prefix, '"'
+                else:
+                    prefix, quote = self.comment_prefix.encode('utf-8'), b'"'
+                self._empty = self._pending = line[:0]
+            if not in_quotes:
+                stripped = line.strip()
+                if stripped.startswith(prefix) or (self.skip_blank and not stripped):
+                    self.skipped_lines += 1
+                    continue
+            if line.count(quote) % 2:
+                in_quotes = not in_quotes
+            yield line
+
+    def __iter__(self):
+        return self._iterator
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def read(self, size=-1):
+        """Lit au plus `size` caractères (tout le reste si size < 0) du flux filtré"""
+        lines = []
+        length = len(self._pending)
+        while size is None or size < 0 or length < size:
+            line = next(self._iterator, None)
+            if line is None:
+                break
+            lines.append(line)
+            length += len(line)
+        data = self._empty.join([self._pending, *lines])
+        if size is None or size < 0:
+            self._pending = self._empty
+            return data
+        self._pending = data[size:]
+        return data[:size]
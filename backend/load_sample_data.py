@@ -3,6 +3,9 @@ import json
 import os
 import sys
 
+from compressed_input import open_input
+from line_filter import LineFilter
+
 def load_sample_data(file_path=None):
     """
     Charge les données d'exemple et les prépare pour l'application
@@ -21,29 +24,13 @@ def load_sample_data(file_path=None):
     
     # Charger les données
     try:
-        # Ouvrir d'abord le fichier pour vérifier s'il contient des commentaires
-        with open(data_path, 'r', encoding='utf-8') as f:
-            first_line = f.readline().strip()
-            # Si la première ligne commence par '//', c'est un commentaire
-            if first_line.startswith('//'):
-                print("AVERTISSEMENT: Le fichier CSV commence par une ligne de commentaire. Tentative de nettoyage...")
-                # Lire tout le fichier
-                f.seek(0)
-                content = f.readlines()
-                # Filtrer les lignes qui ne commencent pas par '//'
-                valid_content = [line for line in content if not line.strip().startswith('//')]
-                
-                # Écrire un fichier temporaire nettoyé
-                temp_file = data_path + ".temp"
-                with open(temp_file, 'w', encoding='utf-8') as temp:
-                    temp.writelines(valid_content)
-                
-                print(f"Fichier temporaire nettoyé créé: {temp_file}")
-                data_path = temp_file
-
-        # Maintenant charger le fichier (original ou nettoyé)
+        # Les lignes de commentaire ('//') et les lignes vides sont écartées à la lecture
         print(f"Tentative de lecture du fichier CSV: {data_path}")
-        df = pd.read_csv(data_path)
+        with open_input(data_path, 'r', encoding='utf-8', newline='') as f:
+            lines = LineFilter(f)
+            df = pd.read_csv(lines)
+        if lines.skipped_lines:
+            print(f"AVERTISSEMENT: {lines.skipped_lines} lignes de commentaire ou vides ignorées")
         
         # Convertir les colonnes de semestres de JSON string en dictionnaires Python
         semester_cols = [col for col in df.columns if col.startswith('S') and col[1:].isdigit()]
@@ -57,11 +44,6 @@ def load_sample_data(file_path=None):
         
         print(f"Données chargées avec succès: {len(df)} étudiants")
         
-        # Nettoyer le fichier temporaire si créé
-        if data_path.endswith('.temp'):
-            os.remove(data_path)
-            print("Fichier temporaire nettoyé supprimé")
-            
         return df
     
     except Exception as e:
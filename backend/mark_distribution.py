@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Distributions des notes par groupe (percentiles et histogrammes).
+
+Pour Mark et chaque semestre (S1 à S12), une distribution est résumée par un
+TDigest (voir sketches.py) pour l'ensemble des étudiants et pour chaque valeur
+de School, Specialty et Baccalaureat_Type: mémoire fixe par groupe, quelle que
+soit la taille du fichier.
+
+Les lignes sont ajoutées en bloc depuis les colonnes d'un StudentStore
+(`add_store`), avec les poids d'inclusion d'un échantillon le cas échéant: les
+valeurs identiques d'un même groupe sont d'abord agrégées (valeur, somme des
+poids), puis ajoutées au TDigest du groupe. Les groupes sont identifiés par leur
+valeur (et non par leur code): deux résumés se fusionnent (`merge`) quels que
+soient les dictionnaires de leurs stockages.
+
+Une requête (percentiles, histogramme) est une recherche dichotomique dans
+les centroïdes d'un seul groupe: son coût ne dépend pas du nombre de lignes.
+"""
+
+from collections import defaultdict
+
+from groupby import column, numpy_available, zeros
+from sketches import TDigest
+from student_store import SEMESTER_COLUMNS, SEMESTER_COUNT
+
+if numpy_available:
+    import numpy as np
+
+DISTRIBUTION_COLUMNS = ('Mark',) + SEMESTER_COLUMNS
+DISTRIBUTION_GROUPS = ('School', 'Specialty', 'Baccalaureat_Type')
+
+DEFAULT_PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+# Histogramme par défaut: notes sur 20, intervalles d'un point
+HISTOGRAM_RANGE = (0, 20)
+DEFAULT_BINS = 20
+MAX_BINS = 200
+
+
+def _column_values(store, name, start, end):
+    """Valeurs de la colonne `name` des lignes [start, end) et masque des valeurs présentes"""
+    if name == 'Mark':
+        values = column(store.marks[start:end])
+        if numpy_available:
+            return values.astype(np.float64), None
+        return values, None
+    position = SEMESTER_COLUMNS.index(name)
+    if numpy_available:
+        matrix = np.frombuffer(store.semesters, dtype=np.float32, count=end * SEMESTER_COUNT)
+        values = matrix.reshape(end, SEMESTER_COUNT)[start:, position].astype(np.float64)
+        return values, ~np.isnan(values)
+    values = [store.semesters[i * SEMESTER_COUNT + position] for i in range(start, end)]
+    return values, [value == value for value in values]  # NaN = semestre absent
+
+
+def _grouped_weights(codes, values, weights, present):
+    """
+    {code: (valeurs distinctes triées, somme des poids de chacune)} des lignes présentes.
+    """
+    if numpy_available:
+        codes = column(codes)
+        weights = np.ones(len(values)) if weights is None else column(weights).astype(np.float64)
+        if present is not None:
+            codes, values, weights = codes[present], values[present], weights[present]
+        if not len(values):
+            return {}
+        order = np.lexsort((values, codes))
+        codes, values, weights = codes[order], values[order], weights[order]
+        starts = np.flatnonzero(np.concatenate(([True], (codes[1:] != codes[:-1]) | (values[1:] != values[:-1]))))
+        sums = np.add.reduceat(weights, starts)
+        codes, values = codes[starts], values[starts]
+        bounds = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1]))).tolist()
+        bounds.append(len(codes))
+        return {int(codes[low]): (values[low:high].tolist(), sums[low:high].tolist())
+                for low, high in zip(bounds, bounds[1:])}
+
+    totals = defaultdict(lambda: defaultdict(float))
+    if weights is None:
+        weights = [1.0] * len(values)
+    for code, value, weight, flag in zip(codes, values, weights, present or [True] * len(values)):
+        if flag:
+            totals[code][value] += weight
+    grouped = {}
+    for code, by_value in totals.items():
+        distinct = sorted(by_value)
+        grouped[code] = (distinct, [by_value[value] for value in distinct])
+    return grouped
+
+
+class MarkDistributions:
+    """
+    TDigest par (colonne, groupe, valeur du groupe); groupe et valeur valent None
+    pour la distribution de l'ensemble des étudiants.
+    """
+
+    def __init__(self, columns=DISTRIBUTION_COLUMNS, groups=DISTRIBUTION_GROUPS):
+        self.columns = tuple(columns)
+        self.groups = tuple(groups)
+        self.digests = {}
+        self.rows = 0
+
+    def _digest(self, key):
+        digest = self.digests.get(key)
+        if digest is None:
+            digest = self.digests[key] = TDigest()
+        return digest
+
+    def add_store(self, store, start=0, weights=None, end=None):
+        """
+        Ajoute les lignes store[start:end]. `weights` (optionnel): poids d'inclusion
+        de chaque ligne du stockage.
+
+        Returns:
+            Ces distributions
+        """
+        end = len(store) if end is None else min(end, len(store))
+        if start >= end:
+            return self
+        weights = weights[start:end] if weights is not None else None
+        groupings = [(None, zeros(end - start), [None])]
+        groupings += [(name, store.codes(name)[start:end], store.categories(name)) for name in self.groups]
+        for name in self.columns:
+            values, present = _column_values(store, name, start, end)
+            for group, codes, labels in groupings:
+                for code, (distinct, totals) in _grouped_weights(codes, values, weights, present).items():
+                    self._digest((name, group, labels[code])).add_many(distinct, totals)
+        self.rows += end - start
+        return self
+
+    def merge(self, other):
+        """Ajoute les distributions calculées sur d'autres lignes"""
+        for key, digest in other.digests.items():
+            self._digest(key).merge(digest)
+        self.rows += other.rows
+        return self
+
+    def values(self, group):
+        """Valeurs du groupe `group` ayant une distribution"""
+        return sorted({value for _, key_group, value in self.digests if key_group == group}, key=str)
+
+    def describe(self, name, group=None, value=None, percentiles=DEFAULT_PERCENTILES, bins=DEFAULT_BINS,
+                 value_range=HISTOGRAM_RANGE):
+        """
+        Percentiles et histogramme de la colonne `name` pour un groupe (ensemble des
+        étudiants si group est None).
+
+        Returns:
+            Un dictionnaire, ou None si le groupe n'a aucune valeur
+        """
+        digest = self.digests.get((name, group, value))
+        if digest is None or not digest.total:
+            return None
+        low, high = value_range
+        edges = [round(low + (high - low) * i / bins, 4) for i in range(bins + 1)]
+        return {
+            "count": round(digest.total),
+            "min": round(digest.min, 2),
+            "max": round(digest.max, 2),
+            "percentiles": {f"p{p:g}": round(digest.quantile(p / 100), 2) for p in percentiles},
+            "histogram": {
+                "edges": edges,
+                "counts": [round(count) for count in digest.histogram(edges)]
+            }
+        }
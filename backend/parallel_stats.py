@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Calcul parallèle des statistiques sur des partitions de lignes.
+
+Les colonnes du StudentStore (et les poids d'un échantillon) sont recopiées une
+fois dans un segment de mémoire partagée (multiprocessing.shared_memory), avec
+la même table de tampons que l'instantané binaire (voir snapshot.py). Chaque
+processus du pool s'y rattache à son démarrage et reconstruit un stockage en
+lecture seule sur ces tampons (StudentStore.from_buffers), sans copie ni
+sérialisation des lignes.
+
+Les lignes sont découpées en partitions contiguës; chaque processus remplit un
+StatsAccumulator sur les siennes et ne renvoie que cet état agrégé (quelques
+Ko). Le processus principal fusionne les accumulateurs dans l'ordre des
+partitions: sans pondération, le résultat est identique à celui d'un passage
+unique (voir aggregation.py).
+
+En deçà de PARALLEL_MIN_ROWS lignes, ou si la mémoire partagée ou le pool sont
+indisponibles, le calcul se fait dans le processus courant.
+"""
+
+import logging
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from stats_accumulator import StatsAccumulator
+from student_store import StudentStore
+
+logger = logging.getLogger(__name__)
+
+# En deçà de ce nombre de lignes, le démarrage du pool coûte plus que le calcul
+PARALLEL_MIN_ROWS = 200000
+# Partitions par processus (équilibre la charge si un processus est ralenti)
+PARTITIONS_PER_WORKER = 2
+
+_WEIGHTS_BUFFER = 'row_weights'
+_ALIGNMENT = 8
+
+# Stockage et poids du processus du pool (rattachés par _attach)
+_worker_memory = None
+_worker_store = None
+_worker_weights = None
+
+
+def partition_bounds(length, partitions):
+    """[(début, fin)] de `partitions` tranches contiguës et non vides de `length` lignes"""
+    partitions = max(1, min(partitions, length))
+    return [(length * i // partitions, length * (i + 1) // partitions) for i in range(partitions)]
+
+
+class SharedStore:
+    """
+    Copie des tampons d'un StudentStore dans un segment de mémoire partagée.
+    `layout` suffit à un autre processus pour reconstruire le stockage (voir _attach).
+    """
+
+    def __init__(self, store, weights=None):
+        buffers = store.export_buffers()
+        if weights is not None:
+            buffers.append((_WEIGHTS_BUFFER, 'd', weights if isinstance(weights, array) else array('d', weights)))
+        table = []
+        offset = 0
+        for name, _, buffer in buffers:
+            view = memoryview(buffer)  # format exact aussi pour un stockage projeté (memoryview)
+            nbytes, typecode = view.nbytes, view.format
+            offset += -offset % _ALIGNMENT
+            table.append((name, typecode, offset, nbytes))
+            offset += nbytes
+
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, offset))
+        for (_, _, start, nbytes), (_, _, buffer) in zip(table, buffers):
+            self.memory.buf[start:start + nbytes] = memoryview(buffer).cast('B')
+        categories = {name: column.values for name, column in store.categorical.items()}
+        self.layout = (self.memory.name, store.headers, len(store), categories, table)
+
+    def close(self):
+        """Libère le segment (les processus rattachés doivent être terminés)"""
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _attach(name, headers, length, categories, table):
+    """Initialisation d'un processus du pool: stockage en lecture seule sur la mémoire partagée"""
+    global _worker_memory, _worker_store, _worker_weights
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    buffers = {buffer_name: _worker_memory.buf[start:start + nbytes].cast(typecode)
+               for buffer_name, typecode, start, nbytes in table}
+    _worker_weights = buffers.pop(_WEIGHTS_BUFFER, None)
+    _worker_store = StudentStore.from_buffers(headers, length, categories, buffers)
+
+
+def _accumulate(start, end):
+    """Statistiques partielles des lignes [start, end) (exécuté dans un processus du pool)"""
+    accumulator = StatsAccumulator(_worker_store)
+    accumulator.add_store(_worker_store, start, _worker_weights, end)
+    return accumulator
+
+
+def accumulate_statistics(store, weights=None, workers=1):
+    """
+    StatsAccumulator de toutes les lignes du stockage.
+
+    Args:
+        store: StudentStore
+        weights: Poids d'inclusion de chaque ligne (échantillon), ou None
+        workers: Nombre de processus (None: un par cœur, 1: calcul dans ce processus)
+
+    Returns:
+        L'accumulateur, rattaché à `store`
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    accumulator = StatsAccumulator(store)
+    if workers > 1 and len(store) >= PARALLEL_MIN_ROWS:
+        bounds = partition_bounds(len(store), workers * PARTITIONS_PER_WORKER)
+        try:
+            with SharedStore(store, weights) as shared:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                         initargs=shared.layout) as executor:
+                    for partial in executor.map(_accumulate, *zip(*bounds)):
+                        accumulator.merge(partial)
+            logger.info("Statistiques calculées sur %s partitions (%s processus)", len(bounds), workers)
+            return accumulator
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning("Calcul parallèle indisponible (%s): calcul dans le processus courant", e)
+            accumulator = StatsAccumulator(store)
+    accumulator.add_store(store, weights=weights)
+    return accumulator
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Réponses pré-rendues des endpoints GET.
+
+Les réponses des endpoints GET déterministes ne dépendent que du jeu de données
+chargé. Pour chaque version du jeu de données (chargement complet, instantané
+ou ajout de lignes), le corps JSON de chacun est donc sérialisé une seule fois,
+avec une variante gzip précompressée pour les corps assez grands, et une
+empreinte servant d'ETag.
+
+Les réponses rendues sont des nœuds du graphe de statistiques (voir
+stat_graph.py): rendues à la première demande ou par le préchauffage, puis
+mémorisées jusqu'au prochain changement des données dont elles dépendent.
+Servir une réponse déjà rendue revient à une recherche dans un dictionnaire et
+à une écriture sur la socket.
+"""
+
+import gzip
+import hashlib
+import json
+from collections import namedtuple
+
+# Taille minimale d'un corps pour en précompresser une variante gzip (None: jamais)
+PRECOMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+RenderedResponse = namedtuple('RenderedResponse', ['body', 'gzip_body', 'etag'])
+
+
+def render_body(payload, version=None):
+    """
+    Sérialise `payload` en JSON (mêmes octets que json.dumps(payload).encode())
+    et prépare sa variante gzip et son ETag.
+    """
+    body = json.dumps(payload).encode()
+    gzip_body = None
+    if PRECOMPRESS_MIN_BYTES is not None and len(body) >= PRECOMPRESS_MIN_BYTES:
+        # mtime fixe: la même réponse donne toujours les mêmes octets compressés
+        gzip_body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+    etag = f'"{version}-{digest}"' if version is not None else f'"{digest}"'
+    return RenderedResponse(body, gzip_body, etag)
+
+
+def accepts_gzip(accept_encoding):
+    """Vrai si l'en-tête Accept-Encoding autorise gzip (et ne lui donne pas q=0)"""
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        if coding.strip().lower() in ('gzip', 'x-gzip'):
+            return params.replace(' ', '').lower() not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
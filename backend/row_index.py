@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Index des lignes du CSV, persisté à côté du fichier (`<csv>.idx`).
+
+Construit pendant l'ingestion (RowIndexSink), il associe:
+- à chaque numéro de ligne (lignes valides, c'est-à-dire rangées dans le
+  stockage, dans l'ordre du fichier, à partir de 0) la position en octets du
+  début de l'enregistrement;
+- à chaque `ID` d'étudiant son numéro de ligne (la dernière occurrence l'emporte).
+
+La fiche d'un étudiant ou une page de lignes N..N+k se lit alors avec un seek
+et une petite lecture dans le CSV, y compris quand seul un échantillon des
+lignes est gardé en mémoire.
+
+Format (version INDEX_VERSION):
+- en-tête fixe: signature, version, taille du bloc de métadonnées
+- métadonnées (pickle): clé de la partie indexée du CSV, en-têtes, table des tampons
+- tampons alignés sur 8 octets: positions des lignes, puis les tables des ID
+  triées, principale et delta (ID concaténés en UTF-8, bornes de chaque ID,
+  numéros de ligne). Une sauvegarde après un ajout de lignes ne réécrit triée
+  que la table delta.
+
+Au chargement les tampons sont projetés en mémoire (mmap): une recherche par ID
+est une recherche dichotomique qui ne touche que quelques pages du fichier.
+Pour un CSV compressé les positions portent sur le flux décompressé (la lecture
+d'une page demande alors de décompresser le flux jusqu'à elle).
+"""
+
+import csv
+import heapq
+import io
+import logging
+import mmap
+import os
+import pickle
+import struct
+from array import array
+from collections import namedtuple
+
+from compressed_input import is_compressed, open_input
+from ingest import IngestSink
+from line_filter import LineFilter
+from snapshot import content_hash
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b'EUMRIDX\x00'
+INDEX_VERSION = 2
+INDEX_SUFFIX = '.idx'
+ID_COLUMN = 'ID'
+
+# La table delta est fusionnée dans la table principale au-delà de 1/COMPACT_RATIO de sa taille
+COMPACT_RATIO = 8
+COMPACT_MIN_IDS = 4096
+
+_HEADER = struct.Struct('<8sIQ')  # signature, version, taille des métadonnées
+_ALIGNMENT = 8
+
+
+def index_path(csv_path):
+    return csv_path + INDEX_SUFFIX
+
+
+def _padding(offset):
+    return -offset % _ALIGNMENT
+
+
+def _source_key(csv_path, end_offset, file_hash=None):
+    """
+    Clé de la partie indexée du CSV (empreinte du fichier entier s'il est compressé).
+    `file_hash`: content_hash(csv_path, end_offset) s'il est déjà connu.
+    """
+    if is_compressed(csv_path):
+        size = os.path.getsize(csv_path)
+        return {"size": end_offset, "compressed_size": size, "hash": content_hash(csv_path, size)}
+    return {"size": end_offset, "hash": file_hash or content_hash(csv_path, end_offset)}
+
+
+def _table_entries(table):
+    """(ID en octets, numéro de ligne) d'une table triée (ids, bornes, lignes), dans l'ordre"""
+    ids, bounds, rows = table
+    return ((bytes(ids[bounds[i]:bounds[i + 1]]), rows[i]) for i in range(len(rows)))
+
+
+def _build_table(entries):
+    """
+    Table (ids, bornes, lignes) à partir d'entrées (ID, ligne) triées; pour un ID présent
+    plusieurs fois, la dernière entrée (ligne la plus récente) l'emporte.
+    """
+    ids = bytearray()
+    bounds = array('Q', [0])
+    rows = array('Q')
+    previous = None
+    for key, row in entries:
+        if key == previous:
+            rows[-1] = row
+            continue
+        ids += key
+        bounds.append(len(ids))
+        rows.append(row)
+        previous = key
+    return bytes(ids), bounds, rows
+
+
+def _search(table, key):
+    """Numéro de ligne de `key` dans une table triée, ou None"""
+    ids, bounds, rows = table
+    low, high = 0, len(rows)
+    while low < high:
+        middle = (low + high) // 2
+        if bytes(ids[bounds[middle]:bounds[middle + 1]]) < key:
+            low = middle + 1
+        else:
+            high = middle
+    if low < len(rows) and ids[bounds[low]:bounds[low + 1]] == key:
+        return rows[low]
+    return None
+
+
+_EMPTY_TABLE = (b'', array('Q', [0]), array('Q'))
+
+IndexImage = namedtuple('IndexImage', ['metadata', 'buffers', 'rows', 'ids'])
+
+
+class RowIndex:
+    """
+    Positions des lignes et table ID -> ligne d'un fichier CSV.
+
+    La table des ID est en deux parties triées: la table principale et une table
+    delta (ID des lignes ajoutées depuis le dernier compactage). Les ID ajoutés depuis
+    la dernière sauvegarde restent en attente; save() ne trie qu'eux et les fusionne
+    linéairement dans la table delta, qui n'est fusionnée dans la table principale
+    que lorsqu'elle dépasse 1/COMPACT_RATIO de celle-ci.
+    """
+
+    def __init__(self, headers, id_column=ID_COLUMN):
+        self.headers = list(headers)
+        self.id_column = id_column
+        self.offsets = array('Q')   # début de chaque enregistrement
+        self.end_offset = 0         # fin du dernier enregistrement indexé
+        # Tables triées (ID concaténés, bornes [bounds[i], bounds[i + 1]), numéros de ligne),
+        # remplacées d'un bloc: une recherche concurrente voit l'ancienne ou la nouvelle table
+        self._table = _EMPTY_TABLE
+        self._delta = _EMPTY_TABLE
+        # ID en attente de tri (même disposition, dans l'ordre du fichier)
+        self._pending_ids = bytearray()
+        self._pending_bounds = array('Q', [0])
+        self._pending_rows = array('Q')
+        self._pending_map = None
+        self._mapping = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def pending_ids(self):
+        return len(self._pending_rows)
+
+    def append(self, offset, student_id=None):
+        """Ajoute la ligne suivante (début à `offset`) et son ID éventuel"""
+        row = len(self.offsets)
+        if not isinstance(self.offsets, array):
+            self.offsets = array('Q', self.offsets)  # tampon projeté en lecture seule
+        self.offsets.append(offset)
+        if student_id:
+            self._pending_ids += student_id.encode('utf-8')
+            self._pending_bounds.append(len(self._pending_ids))
+            self._pending_rows.append(row)
+            self._pending_map = None
+
+    def _pending_lookup(self):
+        if self._pending_map is None:
+            bounds = self._pending_bounds
+            self._pending_map = {
+                bytes(self._pending_ids[bounds[i]:bounds[i + 1]]): self._pending_rows[i]
+                for i in range(len(self._pending_rows))
+            }
+        return self._pending_map
+
+    def find(self, student_id):
+        """Numéro de ligne de l'étudiant `student_id`, ou None"""
+        key = str(student_id).strip().encode('utf-8')
+        row = self._pending_lookup().get(key) if self._pending_rows else None
+        if row is None:
+            row = _search(self._delta, key)
+        if row is None:
+            row = _search(self._table, key)
+        return row
+
+    def byte_range(self, start, stop):
+        """Positions (début, fin) en octets des lignes [start, stop)"""
+        stop = min(stop, len(self.offsets))
+        if start >= stop:
+            return None
+        end = self.offsets[stop] if stop < len(self.offsets) else self.end_offset
+        return self.offsets[start], end
+
+    def read_rows(self, csv_path, start, count):
+        """Lignes brutes [start, start + count) lues directement dans le CSV"""
+        span = self.byte_range(start, start + count)
+        if span is None:
+            return []
+        with open_input(csv_path) as f:
+            f.seek(span[0])
+            data = f.read(span[1] - span[0])
+        lines = LineFilter(line.decode('utf-8') for line in io.BytesIO(data))
+        # Les lignes invalides (nombre de colonnes) situées entre deux lignes indexées sont sautées
+        column_count = len(self.headers)
+        return [row for row in csv.reader(lines) if len(row) == column_count][:count]
+
+    def record(self, row):
+        """Enregistrement {colonne: valeur} d'une ligne brute"""
+        return dict(zip(self.headers, row))
+
+    def _merge_pending(self):
+        """Trie les ID en attente et les fusionne dans la table delta (compactée si trop grande)"""
+        if self._pending_rows:
+            pending = sorted(_table_entries((self._pending_ids, self._pending_bounds, self._pending_rows)))
+            delta = _build_table(heapq.merge(_table_entries(self._delta), pending))
+            if len(delta[2]) * COMPACT_RATIO > max(len(self._table[2]), COMPACT_MIN_IDS):
+                self._table = _build_table(heapq.merge(_table_entries(self._table), _table_entries(delta)))
+                delta = _EMPTY_TABLE
+            self._delta = delta
+            self._pending_ids = bytearray()
+            self._pending_bounds = array('Q', [0])
+            self._pending_rows = array('Q')
+            self._pending_map = None
+
+    def prefix(self, rows):
+        """
+        Nouvel index limité aux `rows` premières lignes (la suite du fichier a été remplacée),
+        sans modifier celui-ci: les lignes suivantes y sont ensuite ajoutées par un RowIndexSink.
+        Un ID en double dont la dernière occurrence est retirée n'est plus trouvé.
+        """
+        index = RowIndex(self.headers, self.id_column)
+        index.offsets = array('Q')
+        index.offsets.frombytes(memoryview(self.offsets)[:rows].cast('B'))
+        index.end_offset = self.offsets[rows] if rows < len(self.offsets) else self.end_offset
+        pending = sorted(_table_entries((self._pending_ids, self._pending_bounds, self._pending_rows)))
+        entries = heapq.merge(_table_entries(self._table), _table_entries(self._delta), pending)
+        index._table = _build_table(entry for entry in entries if entry[1] < rows)
+        return index
+
+    def save(self, csv_path, file_hash=None):
+        """
+        Fusionne les ID en attente et écrit l'index à côté de `csv_path`
+        (`file_hash`: empreinte de la partie indexée, si déjà calculée).
+        """
+        return write_index(csv_path, self.capture(csv_path, file_hash))
+
+    def capture(self, csv_path, file_hash=None):
+        """
+        Fusionne les ID en attente et copie les positions des lignes: l'index peut ensuite
+        recevoir des lignes pendant l'écriture par write_index() (les tables des ID fusionnées
+        ne sont plus modifiées, seulement remplacées).
+        """
+        self._merge_pending()
+        (ids, bounds, rows), (delta_ids, delta_bounds, delta_rows) = self._table, self._delta
+        buffers = [('offsets', bytes(self.offsets)), ('id_bounds', bounds), ('id_rows', rows), ('ids', ids),
+                   ('delta_bounds', delta_bounds), ('delta_rows', delta_rows), ('delta_ids', delta_ids)]
+        table = []
+        offset = 0
+        for name, buffer in buffers:
+            view = memoryview(buffer)
+            offset += _padding(offset)
+            table.append((name, 'Q' if name == 'offsets' else view.format, offset, view.nbytes))
+            offset += view.nbytes
+
+        metadata = pickle.dumps({
+            "key": _source_key(csv_path, self.end_offset, file_hash),
+            "headers": self.headers,
+            "id_column": self.id_column,
+            "buffers": table
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+        return IndexImage(metadata, [(entry, buffer) for entry, (_, buffer) in zip(table, buffers)],
+                          len(self.offsets), len(rows) + len(delta_rows))
+
+    @classmethod
+    def load(cls, csv_path):
+        """
+        Charge l'index de `csv_path` si la partie indexée du CSV n'a pas changé
+        (des lignes ont pu être ajoutées depuis: voir end_offset).
+
+        Returns:
+            Un RowIndex, ou None si l'index est absent, d'une autre version ou périmé
+        """
+        path = index_path(csv_path)
+        if not os.path.exists(path) or not os.path.exists(csv_path):
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    return None
+                magic, version, metadata_size = _HEADER.unpack(header)
+                if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                    logger.info("Index des lignes ignoré (version %s au lieu de %s)", version, INDEX_VERSION)
+                    return None
+                metadata = pickle.loads(f.read(metadata_size))
+
+                key = metadata["key"]
+                if "compressed_size" not in key and os.path.getsize(csv_path) < key["size"]:
+                    return None
+                if _source_key(csv_path, key["size"]) != key:
+                    return None
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning("Index des lignes illisible (%s): %s", path, e)
+            return None
+
+        data_start = _HEADER.size + metadata_size
+        data_start += _padding(data_start)
+        view = memoryview(mapping)
+        buffers = {}
+        for name, typecode, offset, nbytes in metadata["buffers"]:
+            start = data_start + offset
+            if start + nbytes > len(mapping):
+                logger.warning("Index des lignes tronqué: %s", path)
+                return None
+            buffers[name] = view[start:start + nbytes].cast(typecode)
+
+        index = cls(metadata["headers"], metadata["id_column"])
+        index.offsets = buffers["offsets"]
+        index.end_offset = key["size"]
+        index._table = (buffers["ids"], buffers["id_bounds"], buffers["id_rows"])
+        index._delta = (buffers["delta_ids"], buffers["delta_bounds"], buffers["delta_rows"])
+        index._mapping = mapping
+        return index
+
+
+def write_index(csv_path, image):
+    """Écrit un index capturé à côté de `csv_path` (fichier temporaire renommé atomiquement)"""
+    data_start = _HEADER.size + len(image.metadata)
+    data_start += _padding(data_start)
+
+    path = index_path(csv_path)
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(image.metadata)))
+            f.write(image.metadata)
+            for (_, _, buffer_offset, _), buffer in image.buffers:
+                f.write(b'\0' * (data_start + buffer_offset - f.tell()))
+                f.write(buffer)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    logger.info("Index des lignes écrit: %s (%s lignes, %s ID)", path, image.rows, image.ids)
+    return path
+
+
+class RowIndexSink(IngestSink):
+    """Construit un RowIndex pendant l'ingestion (nouveau, ou existant pour y ajouter des lignes)"""
+
+    needs_decoded = False
+    needs_offsets = True
+
+    def __init__(self, index=None):
+        self.index = index
+        self._offset = 0
+        self._column_count = 0
+
+    def begin(self, headers):
+        if self.index is None:
+            self.index = RowIndex(headers)
+        id_column = self.index.id_column
+        self._id_position = headers.index(id_column) if id_column in headers else None
+        self._column_count = len(headers)
+
+    def locate(self, offset):
+        self._offset = offset
+
+    def add(self, row, decoded):
+        if len(row) != self._column_count:
+            return  # ligne ignorée par le stockage: non indexée
+        position = self._id_position
+        student_id = row[position].strip() if position is not None and position < len(row) else None
+        self.index.append(self._offset, student_id)
+
+    def finish(self, result):
+        self.index.end_offset = result.end_offset
@@ -1,20 +1,26 @@
 import os
 import sys
 import http.server
-import socketserver
 import json
 import cgi
 from urllib.parse import urlparse, parse_qs
 import tempfile
 import shutil
 
+from concurrent_server import PooledHTTPServer, ReadWriteLock
+from http_keepalive import KeepAliveHandler
+
 # Global variables for data sharing with the handler
 csv_data = None
 stats = None
+# Requêtes servies en parallèle: lecture des données sous data_lock.shared, modification sous data_lock
+data_lock = ReadWriteLock()
+
+class EuromedHandler(KeepAliveHandler, http.server.SimpleHTTPRequestHandler):
+    """Gestionnaire HTTP/1.1 (connexions persistantes, voir http_keepalive.py)"""
 
-class EuromedHandler(http.server.SimpleHTTPRequestHandler):
-    def _set_headers(self, content_type='application/json'):
-        self.send_response(200)
+    def _set_headers(self, content_type='application/json', status_code=200):
+        self.send_response(status_code)
         self.send_header('Content-Type', content_type)
         self.send_header('Access-Control-Allow-Origin', '*')  # CORS
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
@@ -51,63 +57,81 @@ class EuromedHandler(http.server.SimpleHTTPRequestHandler):
                                 shutil.copyfileobj(fileitem.file, tmp)
                             
                             # Process the uploaded file
-                            from csv_parser import parse_csv, get_statistics
-                            new_data = parse_csv(tmp_path)
+                            from csv_parser import append_rows, get_statistics, parse_csv, read_rows
+                            mode = form.getvalue('mode', 'replace')
+                            # Données modifiées sous le verrou exclusif: aucune requête ne les lit pendant l'ajout
+                            with data_lock:
+                                error = "Failed to process the uploaded file."
                             
-                            if new_data:
-                                # Update global data
-                                csv_data = new_data
-                                stats = get_statistics(new_data)
+                                if mode == 'append':
+                                    # Ajout au jeu de données courant: statistiques mises à jour
+                                    # en O(lignes ajoutées), sans recalcul sur toutes les lignes
+                                    new_data = None
+                                    if not csv_data:
+                                        error = "Cannot append: no data loaded."
+                                    else:
+                                        headers, rows = read_rows(tmp_path)
+                                        if headers == csv_data["columns"]:
+                                            append_rows(csv_data, rows)
+                                            new_data = csv_data
+                                elif mode == 'replace':
+                                    new_data = parse_csv(tmp_path)
+                                else:
+                                    new_data = None
+                                    error = "mode must be 'replace' or 'append'."
+                            
+                                if new_data:
+                                    # Update global data
+                                    csv_data = new_data
+                                    stats = get_statistics(new_data)
                                 
-                                # Send success response
-                                self._set_headers()
-                                response = {
-                                    "success": True,
-                                    "message": f"File uploaded successfully. {new_data['count']} records processed.",
-                                    "summary": {
-                                        "row_count": new_data["count"],
-                                        "column_count": len(new_data["columns"]),
-                                        "columns": new_data["columns"]
+                                    # Send success response
+                                    self._set_headers()
+                                    response = {
+                                        "success": True,
+                                        "message": f"File uploaded successfully. {new_data['count']} records processed.",
+                                        "summary": {
+                                            "row_count": new_data["count"],
+                                            "column_count": len(new_data["columns"]),
+                                            "columns": new_data["columns"]
+                                        }
                                     }
-                                }
-                                self.wfile.write(json.dumps(response).encode())
-                            else:
-                                # Send error response
-                                self.send_response(400)
-                                self._set_headers()
-                                response = {"success": False, "error": "Failed to process the uploaded file."}
-                                self.wfile.write(json.dumps(response).encode())
+                                    self.wfile.write(json.dumps(response).encode())
+                                else:
+                                    # Send error response
+                                    self._set_headers(status_code=400)
+                                    response = {"success": False, "error": error}
+                                    self.wfile.write(json.dumps(response).encode())
                             
                             # Clean up temporary file
                             if os.path.exists(tmp_path):
                                 os.unlink(tmp_path)
                         else:
-                            self.send_response(400)
-                            self._set_headers()
+                            self._set_headers(status_code=400)
                             response = {"success": False, "error": "No file content received."}
                             self.wfile.write(json.dumps(response).encode())
                     else:
-                        self.send_response(400)
-                        self._set_headers()
+                        self._set_headers(status_code=400)
                         response = {"success": False, "error": "No file field in form."}
                         self.wfile.write(json.dumps(response).encode())
                 else:
-                    self.send_response(415)
-                    self._set_headers()
+                    self._set_headers(status_code=415)
                     response = {"success": False, "error": "Content-Type must be multipart/form-data."}
                     self.wfile.write(json.dumps(response).encode())
             except Exception as e:
-                self.send_response(500)
-                self._set_headers()
+                self._set_headers(status_code=500)
                 response = {"success": False, "error": str(e)}
                 self.wfile.write(json.dumps(response).encode())
         else:
-            self.send_response(404)
-            self._set_headers()
+            self._set_headers(status_code=404)
             response = {"success": False, "error": "Endpoint not found."}
             self.wfile.write(json.dumps(response).encode())
         
     def do_GET(self):
+        with data_lock.shared:
+            self._handle_get()
+    
+    def _handle_get(self):
         parsed_url = urlparse(self.path)
         path = parsed_url.path
         
@@ -162,6 +186,12 @@ class EuromedHandler(http.server.SimpleHTTPRequestHandler):
                 
                 <h2>Points d'accès disponibles:</h2>
                 
+                <div class="endpoint">
+                    <h3>POST /api/upload</h3>
+                    <p>Charge un fichier CSV (champ <code>file</code>). Avec <code>mode=append</code>, les lignes sont ajoutées aux données courantes (mêmes colonnes).</p>
+                    <pre>curl -X POST -F "file=@nouveaux.csv" -F "mode=append" http://localhost:8000/api/upload</pre>
+                </div>
+                
                 <div class="endpoint">
                     <h3>GET /api/data/summary</h3>
                     <p>Récupère un résumé des données chargées.</p>
@@ -238,7 +268,8 @@ def main():
         PORT = 8000
         handler = EuromedHandler
         
-        httpd = socketserver.TCPServer(("", PORT), handler)
+        # Pool de threads: une connexion persistante inactive n'empêche pas de servir les autres
+        httpd = PooledHTTPServer(("", PORT), handler)
         print(f"Serveur démarré sur le port {PORT}")
         print(f"Accédez à l'API via: http://localhost:{PORT}/api/data/summary")
         print("Appuyez sur Ctrl+C pour arrêter le serveur.")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Échantillonnage stratifié en un seul passage pour les gros fichiers.
+
+Les exports sont triés (par ID, par année d'entrée...): garder les N premières
+lignes donne des statistiques biaisées. ReservoirSink tire à la place un
+échantillon aléatoire de chaque strate (École, Année d'entrée, ...) pendant
+l'ingestion, sans connaître à l'avance la taille du fichier ni des strates.
+
+Principe (échantillonnage de Bernoulli adaptatif): chaque ligne reçoit une clé
+aléatoire u dans [0, 1[ et est retenue si u < p_h, le taux courant de sa strate.
+Quand l'échantillon dépasse le budget, le taux des strates trop représentées
+est abaissé et les lignes dont la clé dépasse le nouveau taux sont écartées.
+Les taux ne faisant que baisser, l'échantillon final d'une strate contient
+exactement ses lignes de clé < p_h: c'est un échantillon uniforme de la strate.
+
+Allocation proportionnelle à la taille des strates, avec un minimum par strate
+pour que les petites strates restent mesurables. Le poids d'inclusion d'une
+ligne de la strate h vaut n_h / k_h (lignes de la strate / lignes retenues):
+les sommes pondérées estiment sans biais les totaux du fichier complet.
+"""
+
+import logging
+import math
+import random
+from array import array
+
+from ingest import IngestSink
+from student_store import StudentStore
+
+logger = logging.getLogger(__name__)
+
+# Nombre minimum de lignes conservées par strate (si la strate en contient autant)
+MIN_STRATUM_SAMPLE = 100
+
+# Marge tolérée au-dessus du budget avant de réduire l'échantillon
+_OVERFLOW = 1.25
+
+
+class ReservoirSink(IngestSink):
+    """
+    Échantillon aléatoire stratifié d'environ `sample_size` lignes.
+
+    Args:
+        sample_size: Budget total de lignes conservées
+        strata_key: Colonne définissant les strates (ex. 'School', 'Start_Year'), None = pas de strates
+        seed: Graine du générateur aléatoire (échantillon reproductible)
+
+    Après finish(): `store` (lignes retenues dans l'ordre du fichier), `row_weights`
+    (poids d'inclusion par ligne) et `strata` ({strate: {"rows", "sampled", "weight"}}).
+    """
+
+    def __init__(self, sample_size, strata_key='School', seed=None):
+        self.sample_size = sample_size
+        self.strata_key = strata_key
+        self.random = random.Random(seed)
+        self.store = None
+        self.row_weights = None
+        self.strata = {}
+
+    def begin(self, headers):
+        self._buffer = StudentStore(headers)
+        self._key_position = headers.index(self.strata_key) if self.strata_key in headers else None
+        if self.strata_key and self._key_position is None:
+            logger.warning("Colonne de stratification absente: %s (échantillon simple)", self.strata_key)
+        self._rates = {}      # strate -> taux d'inclusion courant p_h
+        self._rows = {}       # strate -> lignes vues n_h
+        self._entries = {}    # strate -> [(clé aléatoire, position dans le tampon, rang dans le fichier)]
+        self._kept = 0
+        self._dead = 0
+        self._limit = self.sample_size * _OVERFLOW
+        self._seen = 0
+
+    def add(self, row, decoded):
+        if decoded is None:
+            return
+        stratum = row[self._key_position].strip() if self._key_position is not None else ""
+        self._rows[stratum] = self._rows.get(stratum, 0) + 1
+        key = self.random.random()
+        rank = self._seen
+        self._seen += 1
+        if key >= self._rates.setdefault(stratum, 1.0):
+            return
+
+        self._entries.setdefault(stratum, []).append((key, len(self._buffer), rank))
+        self._buffer.append_decoded(decoded)
+        self._kept += 1
+        if self._kept > self._limit:
+            self._shrink()
+            # Les minimums par strate peuvent dépasser le budget: ne pas réduire à chaque ligne
+            self._limit = max(self.sample_size, self._kept) * _OVERFLOW
+
+    def _targets(self):
+        """Nombre de lignes à conserver par strate (allocation proportionnelle avec minimum)"""
+        total = sum(self._rows.values())
+        return {
+            stratum: max(math.ceil(self.sample_size * rows / total), min(rows, MIN_STRATUM_SAMPLE))
+            for stratum, rows in self._rows.items()
+        }
+
+    def _shrink(self):
+        """Abaisse le taux des strates au-dessus de leur allocation et écarte les lignes en trop"""
+        for stratum, target in self._targets().items():
+            entries = self._entries.get(stratum)
+            if not entries or len(entries) <= target:
+                continue
+            entries.sort()
+            self._rates[stratum] = entries[target][0]
+            self._dead += len(entries) - target
+            self._kept -= len(entries) - target
+            del entries[target:]
+
+        # Compacter le tampon quand il contient plus de lignes écartées que de lignes vivantes
+        if self._dead > self._kept:
+            live = sorted((position, stratum, index)
+                          for stratum, entries in self._entries.items()
+                          for index, (_, position, _) in enumerate(entries))
+            self._buffer = self._buffer.take([position for position, _, _ in live])
+            for new_position, (_, stratum, index) in enumerate(live):
+                key, _, rank = self._entries[stratum][index]
+                self._entries[stratum][index] = (key, new_position, rank)
+            self._dead = 0
+
+    def finish(self, result):
+        # Ramener chaque strate à son allocation finale
+        self._shrink()
+
+        # Lignes retenues dans l'ordre du fichier, avec le poids de leur strate
+        weights = {stratum: self._rows[stratum] / len(entries)
+                   for stratum, entries in self._entries.items() if entries}
+        live = sorted((rank, position, stratum)
+                      for stratum, entries in self._entries.items()
+                      for _, position, rank in entries)
+        self.store = self._buffer.take([position for _, position, _ in live])
+        self.row_weights = array('d', [weights[stratum] for _, _, stratum in live])
+        self.strata = {
+            stratum: {
+                "rows": rows,
+                "sampled": len(self._entries.get(stratum, ())),
+                "weight": weights.get(stratum, 0.0)
+            }
+            for stratum, rows in sorted(self._rows.items())
+        }
+        self._buffer = None
+        self._entries = None
+
+        logger.info("Échantillon stratifié (%s): %s lignes sur %s, %s strates",
+                    self.strata_key, len(self.store), self._seen, len(self.strata))
@@ -8,132 +8,249 @@ sont compatibles avec la structure spécifique du fichier de données.
 import os
 import csv
 import json
-from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
 
-def analyze_csv_schema(file_path, sample_rows=None):
+from compressed_input import estimated_size, is_compressed, open_input
+from line_filter import LineFilter
+
+# Nombre de lignes analysées par défaut (l'inférence porte toujours sur un échantillon borné)
+DEFAULT_SAMPLE_ROWS = 10000
+
+# Jusqu'à cette taille, le nombre de lignes est compté exactement (comptage des fins de ligne);
+# au-delà, il est estimé à partir de la longueur moyenne des lignes (sauf exact_count=True)
+EXACT_COUNT_LIMIT = 256 * 1024 * 1024
+_COUNT_BLOCK = 16 * 1024 * 1024
+_ESTIMATE_BLOCK = 1024 * 1024
+_ESTIMATE_SAMPLES = 4
+
+# Types dont la dernière occurrence détermine le type de la colonne
+_SPECIAL_TYPES = ('boolean', 'json', 'date')
+
+# Schémas déjà calculés, par version de fichier (chemin, taille, date de modification)
+_SCHEMA_CACHE_SIZE = 8
+_schema_cache = {}
+
+
+def _cell_type(cell):
+    """Type d'une cellule: 'number', 'boolean', 'json', 'date' ou None (texte/vide)"""
+    try:
+        float(cell)
+        return 'number'
+    except ValueError:
+        pass
+    if cell.lower() in ('true', 'false'):
+        return 'boolean'
+    if cell.startswith('{') and cell.endswith('}'):
+        try:
+            json.loads(cell)
+            return 'json'
+        except ValueError:
+            return None
+    if '-' in cell and len(cell) >= 8:
+        parts = cell.split('-')
+        if len(parts) == 3 and all(p.isdigit() for p in parts):
+            return 'date'
+    return None
+
+
+def _column_type(cells):
+    """
+    Type d'une colonne à partir de ses cellules (dans l'ordre du fichier).
+    Une cellule booléenne, JSON ou date impose son type; la dernière l'emporte.
+    Sinon la colonne est numérique si au moins une cellule est un nombre.
+    """
+    distinct = set(cells)
+    try:
+        # Test groupé: toutes les valeurs distinctes sont des nombres
+        list(map(float, distinct))
+        return 'number'
+    except ValueError:
+        pass
+
+    types = {}
+    for cell in reversed(cells):
+        kind = types.get(cell, False)
+        if kind is False:
+            kind = types[cell] = _cell_type(cell)
+        if kind in _SPECIAL_TYPES:
+            return kind
+    return 'number' if 'number' in types.values() else 'string'
+
+
+class SchemaProfiler:
+    """
+    Profil des colonnes: types détectés, échantillons et valeurs uniques.
+    Alimenté ligne par ligne (par analyze_csv_schema ou par le pipeline d'ingestion), les
+    lignes sont conservées puis analysées colonne par colonne dans result(): chaque valeur
+    distincte n'est testée qu'une fois. L'appelant borne le nombre de lignes transmises.
+    """
+    
+    def __init__(self, headers, max_analysis_rows=1000):
+        self.headers = list(headers)
+        self.max_analysis_rows = max_analysis_rows
+        self.rows = []
+        self.unique_rows = 0  # lignes profilées parmi les max_analysis_rows premières
+        self.rows_seen = 0
+    
+    def add(self, row):
+        """Ajoute une ligne (les lignes de longueur incorrecte comptent mais ne sont pas profilées)"""
+        i = self.rows_seen
+        self.rows_seen += 1
+        if len(row) != len(self.headers):
+            return
+        self.rows.append(row)
+        if i < self.max_analysis_rows:
+            self.unique_rows += 1
+    
+    def result(self, total_rows, sample_rows=None, estimated=False):
+        """Construit le dictionnaire de schéma"""
+        headers = self.headers
+        row_count = self.rows_seen
+        columns = list(zip(*self.rows)) if self.rows else [() for _ in headers]
+        
+        column_types = {}
+        column_stats = {}
+        for header, cells in zip(headers, columns):
+            if cells:
+                column_types[header] = _column_type(cells)
+            # Nombre de valeurs distinctes (plafonné à 1000) parmi les premières lignes
+            unique_values = min(1000, len(set(cells[:self.unique_rows])))
+            column_stats[header] = {
+                'unique_values': unique_values,
+                'cardinality': round(unique_values / max(1, sample_rows or row_count), 3),
+                'samples': list(islice((cell for cell in cells if cell), 5))
+            }
+        
+        # Détecter les colonnes de semestre
+        semester_columns = [col for col in headers if col.startswith('S') and col[1:].isdigit()]
+        
+        return {
+            'headers': headers,
+            'column_types': column_types,
+            'column_stats': column_stats,
+            'semester_columns': semester_columns,
+            'row_count': total_rows,
+            'row_count_estimated': estimated,
+            'analyzed_rows': row_count,
+            'is_sampled': sample_rows is not None and row_count >= sample_rows
+        }
+
+
+def _read_at(f, offset, size):
+    f.seek(offset)
+    return f.read(size)
+
+
+def count_rows(file_path, exact=False):
+    """
+    Nombre de lignes de données (hors en-tête) sans analyser le CSV.
+    
+    Les fins de ligne sont comptées directement sur les octets (décompressés au fil de l'eau
+    pour un fichier compressé). Pour les fichiers au-delà de EXACT_COUNT_LIMIT (sauf exact=True),
+    le nombre est estimé à partir de la longueur moyenne des lignes de quelques blocs répartis
+    dans le fichier (consécutifs en début de flux pour un fichier compressé, de taille estimée).
+    
+    Returns:
+        (nombre de lignes, True si le nombre est une estimation)
+    """
+    size = estimated_size(file_path)
+    compressed = is_compressed(file_path)
+    with open_input(file_path) as f:
+        if not exact and size > EXACT_COUNT_LIMIT:
+            header_end = len(f.readline())
+            step = (size - header_end) // _ESTIMATE_SAMPLES
+            line_count = 0
+            line_bytes = 0
+            if compressed:
+                # Un seek relirait le flux compressé: blocs consécutifs en début de fichier
+                blocks = [f.read(_ESTIMATE_BLOCK * _ESTIMATE_SAMPLES)]
+            else:
+                blocks = (_read_at(f, header_end + i * step, _ESTIMATE_BLOCK) for i in range(_ESTIMATE_SAMPLES))
+            for i, block in enumerate(blocks):
+                # Lignes complètes du bloc: de la première à la dernière fin de ligne
+                first, last = block.find(b'\n'), block.rfind(b'\n')
+                if i == 0:
+                    first = -1  # Le premier bloc commence au début d'une ligne
+                if last > first:
+                    line_count += block.count(b'\n', first + 1, last + 1)
+                    line_bytes += last - first
+            if line_count:
+                return round((size - header_end) * line_count / line_bytes), True
+            f.seek(0)
+        
+        lines = 0
+        block = b''
+        for block in iter(lambda: f.read(_COUNT_BLOCK), b''):
+            lines += block.count(b'\n')
+        if block and not block.endswith(b'\n'):
+            lines += 1  # Dernière ligne sans fin de ligne
+        return max(0, lines - 1), False
+
+
+def file_version(file_path):
+    """Identifiant de version d'un fichier: (chemin absolu, taille, date de modification)"""
+    info = os.stat(file_path)
+    return (os.path.realpath(file_path), info.st_size, info.st_mtime_ns)
+
+
+def get_cached_schema(version, *options):
+    """Schéma mis en cache pour cette version de fichier (et ces options), ou None"""
+    return _schema_cache.get((version, options))
+
+
+def cache_schema(version, schema, *options):
+    """Met en cache le schéma d'une version de fichier"""
+    _schema_cache.pop((version, options), None)
+    _schema_cache[(version, options)] = schema
+    while len(_schema_cache) > _SCHEMA_CACHE_SIZE:
+        _schema_cache.pop(next(iter(_schema_cache)))
+
+
+def analyze_csv_schema(file_path, sample_rows=None, exact_count=False):
     """
     Analyse la structure d'un fichier CSV et retourne des informations sur son schéma.
     
     Args:
         file_path: Chemin vers le fichier CSV à analyser
-        sample_rows: Nombre de lignes à analyser (None pour toutes)
+        sample_rows: Nombre de lignes à analyser (DEFAULT_SAMPLE_ROWS si None)
+        exact_count: Compter exactement les lignes même pour un très gros fichier
     
     Returns:
-        Un dictionnaire contenant les informations de schéma
+        Un dictionnaire contenant les informations de schéma (mis en cache par version du fichier)
     """
     if not os.path.exists(file_path):
         print(f"Erreur: Le fichier {file_path} n'existe pas")
         return None
         
     try:
-        # Vérifier la taille du fichier
-        file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
-        is_large_file = file_size_mb > 50  # Plus de 50 MB est considéré comme grand
+        version = file_version(file_path)
+        options = (sample_rows, exact_count)
+        schema = get_cached_schema(version, *options)
+        if schema is not None:
+            return schema
         
-        if is_large_file and sample_rows is None:
-            print(f"Le fichier est volumineux ({file_size_mb:.1f} MB). Limitation à 50,000 lignes pour l'analyse.")
-            sample_rows = 50000
+        if sample_rows is None:
+            sample_rows = DEFAULT_SAMPLE_ROWS
             
-        # Identifier les colonnes et leur type
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
+        # Identifier les colonnes et leur type sur un échantillon de lignes
+        with open_input(file_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(LineFilter(f))
             headers = next(reader)
             
-            # Structures pour l'analyse
-            column_types = {}
-            column_samples = {}
-            column_values = defaultdict(set)
-            column_stats = {}
-            row_count = 0
-            
-            # Analyser un échantillon de données
-            max_analysis_rows = sample_rows or 1000
-            
-            for i, row in enumerate(reader):
-                if sample_rows and i >= sample_rows:
-                    break
-                    
-                row_count += 1
-                if len(row) != len(headers):
-                    continue
-                    
-                # Pour chaque colonne, détecter le type et collecter des échantillons
-                for j, (header, cell) in enumerate(zip(headers, row)):
-                    if i < max_analysis_rows:  # Limite pour les valeurs uniques
-                        if len(column_values[header]) < 1000:  # Limiter le nombre de valeurs uniques stockées
-                            column_values[header].add(cell)
-                    
-                    # Conserver quelques exemples
-                    if header not in column_samples:
-                        column_samples[header] = []
-                    if len(column_samples[header]) < 5 and cell:
-                        column_samples[header].append(cell)
-                    
-                    # Déterminer le type
-                    if header not in column_types:
-                        column_types[header] = 'string'  # Type par défaut
-                    
-                    # Vérifier si nombre
-                    try:
-                        float(cell)
-                        if column_types[header] == 'string':
-                            column_types[header] = 'number'
-                    except ValueError:
-                        # Vérifier si booléen
-                        if cell.lower() in ['true', 'false']:
-                            column_types[header] = 'boolean'
-                        # Vérifier si JSON
-                        elif cell.startswith('{') and cell.endswith('}'):
-                            try:
-                                json.loads(cell)
-                                column_types[header] = 'json'
-                            except:
-                                pass
-                        # Vérifier si date
-                        elif '-' in cell and len(cell) >= 8:
-                            parts = cell.split('-')
-                            if len(parts) == 3 and all(p.isdigit() for p in parts):
-                                column_types[header] = 'date'
-                
-                # Afficher des indicateurs de progression pour les fichiers volumineux
-                if is_large_file and i % 10000 == 0 and i > 0:
-                    print(f"  Analyse du schéma: {i} lignes traitées...")
-            
-            # Compter les lignes totales si échantillonnage
-            total_rows = row_count
-            if sample_rows:
-                # Estimer le nombre total de lignes
-                with open(file_path, 'r', encoding='utf-8') as count_file:
-                    # Avancer jusqu'à l'en-tête
-                    next(count_file)
-                    # Compter le reste des lignes
-                    for i, _ in enumerate(count_file):
-                        pass
-                    total_rows = i + 1
-            
-            # Collecter des statistiques pour chaque colonne
-            for header in headers:
-                unique_values = len(column_values[header])
-                column_stats[header] = {
-                    'unique_values': unique_values,
-                    'cardinality': round(unique_values / max(1, sample_rows or row_count), 3),
-                    'samples': column_samples.get(header, [])
-                }
-            
-            # Détecter les colonnes de semestre
-            semester_columns = [col for col in headers if col.startswith('S') and col[1:].isdigit()]
-            
-            schema_result = {
-                'headers': headers,
-                'column_types': column_types,
-                'column_stats': column_stats,
-                'semester_columns': semester_columns,
-                'row_count': total_rows,
-                'analyzed_rows': row_count,
-                'is_sampled': sample_rows is not None and row_count >= sample_rows
-            }
-            
-            return schema_result
+            profiler = SchemaProfiler(headers, max_analysis_rows=sample_rows)
+            for row in islice(reader, sample_rows):
+                profiler.add(row)
+            truncated = next(reader, None) is not None
+        
+        # Fichier lu en entier: le nombre de lignes est connu; sinon le compter sur les octets
+        total_rows, estimated = profiler.rows_seen, False
+        if truncated:
+            total_rows, estimated = count_rows(file_path, exact=exact_count)
+        
+        schema = profiler.result(total_rows, sample_rows if truncated else None, estimated)
+        cache_schema(version, schema, *options)
+        return schema
             
     except Exception as e:
         print(f"Erreur lors de l'analyse du schéma: {e}")
@@ -153,9 +270,12 @@ def get_available_features(schema):
     """
     if not schema:
         return []
-    
-    headers = schema['headers']
-    types = schema['column_types']
+    return list(_features(tuple(schema['headers']), tuple(schema.get('semester_columns', []))))
+
+
+@lru_cache(maxsize=32)
+def _features(headers, semester_columns):
+    """Fonctionnalités disponibles pour ces en-têtes (mémorisé: gratuit au rechargement)"""
     features = []
     
     # Statistiques de base toujours disponibles
@@ -186,7 +306,7 @@ def get_available_features(schema):
         features.append('scholarship_stats')
     
     # Corrélations de notes
-    mark_related_columns = ['Mark'] + schema.get('semester_columns', [])
+    mark_related_columns = ['Mark'] + list(semester_columns)
     if any(col in headers for col in mark_related_columns):
         features.append('mark_correlations')
     
@@ -204,7 +324,7 @@ def get_available_features(schema):
         features.append('next_year_students')
         features.append('average_fee')
     
-    return features
+    return tuple(features)
 
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Décodeur rapide des cellules de semestre (S1 à S12).
+
+Une cellule contient un objet JSON du type {"mark": 15.7}. Plutôt que de passer
+par json.loads (un dictionnaire alloué par cellule), le décodeur repère la clé
+`mark` et convertit directement le nombre qui suit. Il accepte la forme propre
+({"mark":15.7}, {"mark": 15.7}), la forme échappée présente dans certains exports
+({\\mark\\":15.7}") et travaille indifféremment sur des str ou des bytes.
+Un semestre absent ou illisible (y compris un nombre non fini ou au-delà de
+MAX_ABS_MARK) vaut NaN.
+"""
+
+import math
+import re
+
+NAN = float('nan')
+# Note illisible au-delà (valeur absolue): les sommes en virgule fixe restent dans un int64
+MAX_ABS_MARK = 1e6
+
+_MARK_PATTERN = r'mark[^:]*:[\s"\\]*(-?\d*\.?\d+(?:[eE][-+]?\d+)?)'
+_MARK_STR = re.compile(_MARK_PATTERN)
+_MARK_BYTES = re.compile(_MARK_PATTERN.encode('ascii'))
+
+
+def decode_semester_mark(cell):
+    """Retourne la note contenue dans une cellule de semestre (str ou bytes), NaN si absente"""
+    if not cell:
+        return NAN
+    match = (_MARK_STR if isinstance(cell, str) else _MARK_BYTES).search(cell)
+    if not match:
+        return NAN
+    value = float(match.group(1))
+    return value if math.isfinite(value) and abs(value) <= MAX_ABS_MARK else NAN
@@ -3,6 +3,9 @@ import os
 import json
 import sys
 
+from compressed_input import open_input
+from line_filter import LineFilter
+
 def load_simple_data():
     """
     Charge les données de façon simplifiée, sans essayer de parser le JSON
@@ -20,15 +23,10 @@ def load_simple_data():
                 print(f"Le fichier {original_path} n'existe pas non plus.")
                 return None
                 
-            # Copier en supprimant la première ligne si c'est un commentaire
-            with open(original_path, 'r', encoding='utf-8') as infile:
-                lines = infile.readlines()
-                
-            if lines and lines[0].strip().startswith('//'):
-                lines = lines[1:]  # Supprimer la première ligne
-                
-            with open(simple_path, 'w', encoding='utf-8') as outfile:
-                outfile.writelines(lines)
+            # Copier en supprimant les lignes de commentaire au fil de la lecture
+            with open_input(original_path, 'r', encoding='utf-8', newline='') as infile, \
+                    open(simple_path, 'w', encoding='utf-8', newline='') as outfile:
+                outfile.writelines(LineFilter(infile))
                 
             print(f"Fichier nettoyé créé à {simple_path}")
         
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Résumés approximatifs (sketches) des colonnes à forte cardinalité.
+
+Pour City ou Nationality, un comptage exact garde une entrée par valeur
+distincte et l'API renvoie des dictionnaires de la même taille. En mode
+sketch, chaque colonne est résumée en mémoire fixe par:
+- HyperLogLog (HLL_PRECISION bits d'index, 2**p registres d'un octet) pour le
+  nombre de valeurs distinctes: erreur relative type 1.04 / sqrt(2**p)
+  (1.6 % pour p = 12), quel que soit le nombre de lignes;
+- un résumé Misra-Gries de `capacity` compteurs pour les valeurs les plus
+  fréquentes (équivalent déterministe de SpaceSaving): le compte estimé d'une
+  valeur sous-estime son compte exact d'au plus `max_error`, lui-même borné
+  par N / (capacity + 1) pour N lignes. Toute valeur plus fréquente que
+  N / (capacity + 1) est forcément suivie.
+
+Les deux résumés se fusionnent (`merge`) en gardant ces bornes: des morceaux
+traités séparément (DataChunker, processus) donnent, une fois fusionnés, les
+garanties d'un passage unique. Les valeurs sont hachées avec blake2b (et non
+hash(), qui varie d'un processus à l'autre).
+
+Pour les distributions de valeurs numériques (notes), TDigest résume une
+distribution pondérée en au plus ~TDIGEST_COMPRESSION / 2 centroïdes (moyenne,
+poids): les quantiles extrêmes sont plus précis que la médiane (erreur en rang
+de l'ordre de q(1 - q) / compression), le minimum et le maximum sont exacts.
+Les valeurs ajoutées sont mises en attente et compressées par lots (au-delà de
+TDIGEST_BUFFER valeurs, ou à la première lecture): des ajouts successifs de
+quelques lignes ne recompressent pas chaque fois toute la distribution.
+"""
+
+import hashlib
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Bits d'index des registres HyperLogLog (2**p octets par colonne)
+HLL_PRECISION = 12
+# Compteurs du résumé des valeurs fréquentes
+FREQUENT_CAPACITY = 1024
+# Paramètre de compression des TDigest (au plus ~compression / 2 centroïdes par distribution)
+TDIGEST_COMPRESSION = 200
+# Valeurs (distinctes, pondérées) en attente au-delà desquelles un TDigest est recompressé
+TDIGEST_BUFFER = 4096
+# Valeurs déjà enregistrées dans le HLL mémorisées (évite de rehacher les valeurs fréquentes)
+HASH_CACHE_SIZE = 4096
+
+_HASH_BITS = 64
+
+
+def value_hash(value):
+    """Empreinte 64 bits stable d'une valeur"""
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Estimateur du nombre de valeurs distinctes en 2**precision octets"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        if not 4 <= precision <= 16:
+            raise ValueError("La précision HyperLogLog doit être comprise entre 4 et 16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add_hash(self, hashed):
+        width = _HASH_BITS - self.precision
+        index = hashed >> width
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, value):
+        self.add_hash(value_hash(value))
+
+    def merge(self, other):
+        """Union avec un autre HyperLogLog de même précision"""
+        if other.precision != self.precision:
+            raise ValueError("Fusion impossible: précisions HyperLogLog différentes")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    @property
+    def relative_error(self):
+        """Erreur relative type de l'estimation"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def count(self):
+        """Nombre estimé de valeurs distinctes"""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size) if size >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[size]
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)  # petites cardinalités: comptage linéaire
+        return round(estimate)
+
+
+class FrequentItems:
+    """
+    Résumé Misra-Gries des valeurs fréquentes: au plus `capacity` compteurs.
+    counts[v] <= compte exact de v <= counts[v] + max_error.
+    """
+
+    def __init__(self, capacity=FREQUENT_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.total = 0        # somme des poids ajoutés
+        self.max_error = 0    # sous-estimation maximale d'un compte
+
+    def add(self, value, count=1):
+        counts = self.counts
+        counts[value] = counts.get(value, 0) + count
+        self.total += count
+        if len(counts) > self.capacity:
+            self._prune()
+
+    def _prune(self):
+        """Retire à tous les compteurs le (capacity + 1)-ième plus grand compte"""
+        counts = self.counts
+        if len(counts) == self.capacity + 1:
+            cut = min(counts.values())
+        else:
+            cut = sorted(counts.values(), reverse=True)[self.capacity]
+        self.counts = {value: count - cut for value, count in counts.items() if count > cut}
+        self.max_error += cut
+
+    def merge(self, other):
+        """Fusion avec un autre résumé (même garantie que sur l'union des lignes)"""
+        counts = self.counts
+        for value, count in other.counts.items():
+            counts[value] = counts.get(value, 0) + count
+        self.total += other.total
+        self.max_error += other.max_error
+        if len(counts) > self.capacity:
+            self._prune()
+        return self
+
+    def top(self, n=None):
+        """[(valeur, compte estimé)] par compte décroissant (les `n` premiers)"""
+        items = sorted(self.counts.items(), key=lambda x: x[1], reverse=True)
+        return items if n is None else items[:n]
+
+
+class ColumnSketch:
+    """HyperLogLog et valeurs fréquentes d'une colonne"""
+
+    def __init__(self, precision=HLL_PRECISION, capacity=FREQUENT_CAPACITY):
+        self.distinct = HyperLogLog(precision)
+        self.frequent = FrequentItems(capacity)
+        self._registered = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_registered'] = {}
+        return state
+
+    def add(self, value, count=1):
+        if value not in self._registered:
+            if len(self._registered) >= HASH_CACHE_SIZE:
+                self._registered.clear()
+            self.distinct.add(value)
+            self._registered[value] = True
+        self.frequent.add(value, count)
+
+    def merge(self, other):
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+        return self
+
+    @property
+    def rows(self):
+        return self.frequent.total
+
+    def summary(self, top=None):
+        """Valeurs distinctes estimées, valeurs fréquentes et bornes d'erreur"""
+        return {
+            "rows": self.rows,
+            "distinct": self.distinct.count(),
+            "top": dict(self.frequent.top(top)),
+            "error_bounds": {
+                "distinct_relative_error": round(self.distinct.relative_error, 4),
+                "count_max_error": self.frequent.max_error,
+                "count_error_limit": self.rows // (self.frequent.capacity + 1)
+            }
+        }
+
+
+class ColumnSketches(dict):
+    """{colonne: ColumnSketch} pour un ensemble de colonnes, fusionnable"""
+
+    def __init__(self, columns, precision=HLL_PRECISION, capacity=FREQUENT_CAPACITY):
+        super().__init__((name, ColumnSketch(precision, capacity)) for name in columns)
+
+    def merge(self, other):
+        for name, sketch in other.items():
+            if name in self:
+                self[name].merge(sketch)
+            else:
+                self[name] = sketch
+        return self
+
+
+class TDigest:
+    """
+    Distribution pondérée résumée en centroïdes triés (t-digest à fusion, fonction
+    d'échelle k1): taille bornée par la compression, fusionnable.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = array('d')
+        self.weights = array('d')
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._cumulative = None
+        self._buffer = []     # (valeur, poids) pas encore compressés
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        self._flush()
+        state = dict(self.__dict__)
+        state['_cumulative'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('_buffer', [])
+        self._lock = threading.Lock()
+
+    def _k_limit(self, q):
+        """Rang (fraction) maximal couvert par un centroïde commençant au rang q"""
+        scale = self.compression / (2 * math.pi)
+        k = scale * math.asin(2 * q - 1) + 1
+        if k >= scale * math.pi / 2:
+            return 1.0
+        return (math.sin(k / scale) + 1) / 2
+
+    def add_many(self, values, weights=None):
+        """
+        Ajoute des valeurs (pondérées le cas échéant). Les valeurs répétées peuvent être
+        agrégées au préalable: (valeur, somme des poids).
+        """
+        if weights is None:
+            weights = [1.0] * len(values)
+        items = [(float(value), float(weight)) for value, weight in zip(values, weights) if weight > 0]
+        if not items:
+            return self
+        # Total, minimum et maximum sont exacts tout de suite; les centroïdes attendent le lot
+        self.total += sum(weight for _, weight in items)
+        low = min(value for value, _ in items)
+        high = max(value for value, _ in items)
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self._buffer.extend(items)
+        if len(self._buffer) >= TDIGEST_BUFFER:
+            self._flush()
+        return self
+
+    def add(self, value, weight=1.0):
+        return self.add_many([value], [weight])
+
+    def merge(self, other):
+        """Fusion avec un autre TDigest (centroïdes réunis puis recompressés)"""
+        other._flush()
+        if other.total:
+            self._compress(list(zip(other.means, other.weights)) + self._take_buffer(), other.min, other.max)
+        return self
+
+    def _take_buffer(self):
+        items, self._buffer = self._buffer, []
+        return items
+
+    def _flush(self):
+        """Compresse les valeurs en attente (les lectures concurrentes attendent la première)"""
+        if self._buffer:
+            with self._lock:
+                if self._buffer:
+                    self._compress(self._take_buffer())
+
+    def _compress(self, items, low=None, high=None):
+        items.extend(zip(self.means, self.weights))
+        items.sort()
+        low = items[0][0] if low is None else low
+        high = items[-1][0] if high is None else high
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+        total = sum(weight for _, weight in items)
+        means = array('d')
+        weights = array('d')
+        mean, weight = items[0]
+        before = 0.0
+        limit = self._k_limit(0.0) * total
+        for value, value_weight in items[1:]:
+            if before + weight + value_weight <= limit:
+                weight += value_weight
+                mean += (value - mean) * value_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                before += weight
+                limit = self._k_limit(before / total) * total
+                mean, weight = value, value_weight
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights, self.total = means, weights, total
+        self._cumulative = None
+
+    def _centers(self):
+        """Rangs (poids cumulé) des centres des centroïdes, calculés une fois par état"""
+        if self._cumulative is None:
+            centers = []
+            before = 0.0
+            for weight in self.weights:
+                centers.append(before + weight / 2)
+                before += weight
+            self._cumulative = centers
+        return self._cumulative
+
+    def quantile(self, q):
+        """Valeur estimée au rang q (0 <= q <= 1), None si vide"""
+        if not self.total:
+            return None
+        self._flush()
+        rank = min(max(q, 0.0), 1.0) * self.total
+        centers = self._centers()
+        means = self.means
+        i = bisect_left(centers, rank)
+        if i == 0:
+            if centers[0] <= 0:
+                return means[0]
+            return self.min + (means[0] - self.min) * rank / centers[0]
+        if i == len(centers):
+            span = self.total - centers[-1]
+            return means[-1] + (self.max - means[-1]) * ((rank - centers[-1]) / span if span else 0)
+        left, right = centers[i - 1], centers[i]
+        return means[i - 1] + (means[i] - means[i - 1]) * (rank - left) / (right - left)
+
+    def rank(self, x):
+        """Poids estimé des valeurs inférieures ou égales à x"""
+        if not self.total or x < self.min:
+            return 0.0
+        if x >= self.max:
+            return self.total
+        self._flush()
+        centers = self._centers()
+        means = self.means
+        i = bisect_right(means, x)
+        if i == 0:
+            return centers[0] * (x - self.min) / (means[0] - self.min) if means[0] > self.min else 0.0
+        if i == len(means):
+            span = self.max - means[-1]
+            return centers[-1] + (self.total - centers[-1]) * ((x - means[-1]) / span if span else 1)
+        if means[i] == means[i - 1]:
+            return centers[i - 1]
+        return centers[i - 1] + (centers[i] - centers[i - 1]) * (x - means[i - 1]) / (means[i] - means[i - 1])
+
+    def histogram(self, edges):
+        """Poids estimés des intervalles [edges[i], edges[i + 1]["""
+        ranks = [self.rank(edge) for edge in edges]
+        return [max(0.0, high - low) for low, high in zip(ranks, ranks[1:])]
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Instantané binaire du jeu de données analysé.
+
+Après un chargement réussi, les colonnes du StudentStore, les statistiques
+calculées et le schéma sont écrits dans un fichier `<csv>.snap` à côté du CSV.
+Au démarrage suivant, si la clé du fichier source (taille, date de modification
+et empreinte du contenu) correspond, l'instantané est projeté en mémoire (mmap)
+et les colonnes sont utilisées directement, sans relire ni analyser le CSV.
+
+Format (version SNAPSHOT_VERSION):
+- en-tête fixe: signature, version, taille du bloc de métadonnées
+- métadonnées (pickle): clé du CSV, en-têtes, dictionnaires des colonnes
+  catégorielles, table des tampons, statistiques, schéma, état de l'accumulateur
+- tampons bruts des colonnes, alignés sur 8 octets
+
+L'enregistrement se fait en deux temps: capture_snapshot() copie les données en
+mémoire (sous le verrou des données), write_snapshot_file() écrit ensuite le
+fichier sans bloquer les ajouts de lignes.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+from collections import namedtuple
+
+from student_store import StudentStore
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b'EUMSNAP\x00'
+SNAPSHOT_VERSION = 6
+SNAPSHOT_SUFFIX = '.snap'
+
+_HEADER = struct.Struct('<8sIQ')  # signature, version, taille des métadonnées
+_ALIGNMENT = 8
+
+# Au-delà de cette taille, l'empreinte porte sur des blocs échantillonnés du fichier
+FULL_HASH_LIMIT = 64 * 1024 * 1024
+_HASH_BLOCK = 1024 * 1024
+_HASH_SAMPLES = 16
+
+
+def snapshot_path(csv_path):
+    return csv_path + SNAPSHOT_SUFFIX
+
+
+def content_hash(csv_path, size):
+    """
+    Empreinte blake2b des `size` premiers octets du fichier (complète jusqu'à
+    FULL_HASH_LIMIT, échantillonnée au-delà)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(csv_path, 'rb') as f:
+        if size <= FULL_HASH_LIMIT:
+            remaining = size
+            while remaining > 0:
+                block = f.read(min(_HASH_BLOCK, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        else:
+            # Début, fin et blocs répartis régulièrement entre les deux
+            step = (size - _HASH_BLOCK) // (_HASH_SAMPLES - 1)
+            for i in range(_HASH_SAMPLES):
+                f.seek(i * step)
+                digest.update(f.read(_HASH_BLOCK))
+            digest.update(str(size).encode('ascii'))
+    return digest.hexdigest()
+
+
+class PrefixHash:
+    """
+    content_hash() d'un début de fichier qui ne fait que grandir (lignes ajoutées):
+    seuls les octets ajoutés depuis le calcul précédent sont lus, jusqu'à FULL_HASH_LIMIT
+    (au-delà, l'empreinte échantillonnée est recalculée).
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.size = 0
+        self._digest = hashlib.blake2b(digest_size=16)
+        self._lock = threading.Lock()
+
+    def hexdigest(self, size):
+        """Empreinte des `size` premiers octets (identique à content_hash(csv_path, size))"""
+        with self._lock:
+            if size > FULL_HASH_LIMIT or size < self.size:
+                return content_hash(self.csv_path, size)
+            with open(self.csv_path, 'rb') as f:
+                f.seek(self.size)
+                while self.size < size:
+                    block = f.read(min(_HASH_BLOCK, size - self.size))
+                    if not block:
+                        break
+                    self._digest.update(block)
+                    self.size += len(block)
+            return self._digest.hexdigest()
+
+
+def source_key(csv_path):
+    """Clé identifiant une version du fichier CSV: taille, mtime et empreinte du contenu"""
+    info = os.stat(csv_path)
+    return {
+        "size": info.st_size,
+        "mtime_ns": info.st_mtime_ns,
+        "hash": content_hash(csv_path, info.st_size)
+    }
+
+
+def _padding(offset):
+    return -offset % _ALIGNMENT
+
+
+SnapshotImage = namedtuple('SnapshotImage', ['metadata', 'buffers'])
+
+
+def save_snapshot(csv_path, store, stats, schema_info=None, extras=None, accumulator=None, key=None):
+    """
+    Écrit l'instantané de `store` et des résultats associés à côté de `csv_path`.
+
+    Returns:
+        Le chemin de l'instantané écrit
+    """
+    image = capture_snapshot(key or source_key(csv_path), store, stats, schema_info, extras, accumulator)
+    return write_snapshot_file(csv_path, image)
+
+
+def capture_snapshot(key, store, stats, schema_info=None, extras=None, accumulator=None):
+    """
+    Copie en mémoire de l'instantané (métadonnées sérialisées, copie des tampons des colonnes):
+    le stockage peut ensuite recevoir des lignes pendant l'écriture du fichier.
+
+    Returns:
+        Un SnapshotImage pour write_snapshot_file()
+    """
+    table = []
+    buffers = []
+    offset = 0
+    for name, typecode, buffer in store.export_buffers():
+        buffer = bytes(buffer)
+        buffers.append(buffer)
+        offset += _padding(offset)
+        table.append((name, typecode, offset, len(buffer)))
+        offset += len(buffer)
+
+    # La vue des moyennes semestrielles est recalculée à partir du stockage au chargement
+    stored_stats = {k: v for k, v in stats.items() if k != "semester_success_map"}
+    metadata = pickle.dumps({
+        "key": key,
+        "headers": store.headers,
+        "length": len(store),
+        "categories": {name: column.values for name, column in store.categorical.items()},
+        "buffers": table,
+        "stats": stored_stats,
+        "schema_info": schema_info,
+        "extras": extras or {},
+        "accumulator": accumulator
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+    return SnapshotImage(metadata, list(zip(table, buffers)))
+
+
+def write_snapshot_file(csv_path, image):
+    """
+    Écrit un instantané capturé à côté de `csv_path` (fichier temporaire renommé atomiquement).
+
+    Returns:
+        Le chemin de l'instantané écrit
+    """
+    path = snapshot_path(csv_path)
+    data_start = _HEADER.size + len(image.metadata)
+    data_start += _padding(data_start)
+
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(image.metadata)))
+            f.write(image.metadata)
+            f.write(b'\0' * (data_start - f.tell()))
+            for (_, _, buffer_offset, _), buffer in image.buffers:
+                f.write(b'\0' * (data_start + buffer_offset - f.tell()))
+                f.write(buffer)
+            size = f.tell()
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    logger.info("Instantané écrit: %s (%s octets)", path, size)
+    return path
+
+
+def load_snapshot(csv_path, allow_append=False):
+    """
+    Charge l'instantané associé à `csv_path` s'il est à jour.
+
+    Args:
+        csv_path: Fichier CSV source
+        allow_append: Accepter aussi un CSV auquel des lignes ont seulement été ajoutées
+            (début du fichier identique à la version de l'instantané); "appended" vaut alors True
+
+    Returns:
+        Un dictionnaire {"store", "stats", "schema_info", "extras", "accumulator", "key", "appended"},
+        ou None si l'instantané est absent, d'une autre version ou ne correspond plus au CSV
+    """
+    path = snapshot_path(csv_path)
+    if not os.path.exists(path) or not os.path.exists(csv_path):
+        return None
+
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                return None
+            magic, version, metadata_size = _HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                logger.info("Instantané ignoré (version %s au lieu de %s)", version, SNAPSHOT_VERSION)
+                return None
+            metadata = pickle.loads(f.read(metadata_size))
+
+            # Comparaison rapide taille/mtime avant de calculer l'empreinte
+            info = os.stat(csv_path)
+            key = metadata["key"]
+            appended = allow_append and info.st_size > key["size"]
+            if not appended and (key["size"] != info.st_size or key["mtime_ns"] != info.st_mtime_ns):
+                return None
+            if key["hash"] != content_hash(csv_path, key["size"]):
+                return None
+
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError) as e:
+        logger.warning("Instantané illisible (%s): %s", path, e)
+        return None
+
+    data_start = _HEADER.size + metadata_size
+    data_start += _padding(data_start)
+    view = memoryview(mapping)
+    buffers = {}
+    for name, typecode, offset, nbytes in metadata["buffers"]:
+        start = data_start + offset
+        if start + nbytes > len(mapping):
+            logger.warning("Instantané tronqué: %s", path)
+            return None
+        buffers[name] = view[start:start + nbytes].cast(typecode)
+
+    store = StudentStore.from_buffers(metadata["headers"], metadata["length"],
+                                      metadata["categories"], buffers, mapping)
+    accumulator = metadata["accumulator"]
+    if accumulator is not None:
+        accumulator.bind(store)
+
+    return {
+        "store": store,
+        "stats": metadata["stats"],
+        "schema_info": metadata["schema_info"],
+        "extras": metadata["extras"],
+        "accumulator": accumulator,
+        "key": key,
+        "appended": appended
+    }
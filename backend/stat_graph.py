@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Graphe de statistiques évaluées à la demande.
+
+Chaque statistique (ou réponse d'un endpoint) est un nœud nommé: une fonction
+et la liste des nœuds dont elle dépend. Un nœud n'est calculé qu'à la première
+demande (`get`), après ses entrées, puis mémorisé jusqu'à ce que l'une d'elles
+change. Les sources (par exemple le jeu de données chargé) sont des nœuds sans
+fonction, fournis par `provide` ou `reset`.
+
+- `reset(sources)` commence une nouvelle version du jeu de données: toutes les
+  valeurs mémorisées sont oubliées;
+- `changed(*names)` signale des nœuds mis à jour sur place (lignes ajoutées):
+  leurs dépendants sont oubliés, eux sont conservés;
+- `warm()` calcule dans un thread les nœuds pas encore demandés.
+
+Chaque changement incrémente `version`: un calcul commencé sur une version
+antérieure rend son résultat à l'appelant mais ne le mémorise pas. Un verrou
+par nœud évite qu'un même nœud soit calculé deux fois en parallèle (requête et
+préchauffage). La lecture d'une valeur déjà calculée (`peek`) ne prend pas de
+verrou.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class StatGraph:
+    """Nœuds {nom: (fonction, entrées)} évalués paresseusement et mémorisés par version"""
+
+    def __init__(self):
+        self._nodes = {}
+        self._values = {}
+        self._node_locks = {}
+        self._lock = threading.RLock()
+        self.version = 0
+
+    def register(self, name, func, inputs=()):
+        """Déclare le nœud `name`, calculé par func(*valeurs des entrées)"""
+        for source in inputs:
+            if source != name and source not in self._nodes:
+                self._nodes.setdefault(source, None)  # source fournie par provide/reset
+        self._nodes[name] = (func, tuple(inputs))
+
+    def names(self):
+        """Nœuds calculés (hors sources), dans l'ordre de déclaration"""
+        return [name for name, node in self._nodes.items() if node is not None]
+
+    def dependents(self, names):
+        """Nœuds dépendant (directement ou non) d'au moins un des nœuds `names`"""
+        found = set()
+        pending = list(names)
+        while pending:
+            current = pending.pop()
+            for name, node in self._nodes.items():
+                if node is not None and current in node[1] and name not in found:
+                    found.add(name)
+                    pending.append(name)
+        return found
+
+    def provide(self, name, value):
+        """Fixe la valeur d'une source (ou d'un nœud déjà calculé ailleurs, ex. instantané)"""
+        with self._lock:
+            self._nodes.setdefault(name, None)
+            self._values[name] = value
+
+    def reset(self, sources=None):
+        """Nouvelle version: oublie toutes les valeurs et fournit les sources"""
+        with self._lock:
+            self.version += 1
+            self._values = {}
+            for name, value in (sources or {}).items():
+                self.provide(name, value)
+
+    def changed(self, *names):
+        """Nœuds `names` modifiés sur place: oublie les valeurs de leurs dépendants"""
+        with self._lock:
+            self.version += 1
+            stale = self.dependents(names) - set(names)
+            self._values = {name: value for name, value in self._values.items() if name not in stale}
+
+    def computed(self, name):
+        return name in self._values
+
+    def peek(self, name, default=None):
+        """Valeur mémorisée de `name` (sans la calculer), ou `default`"""
+        return self._values.get(name, default)
+
+    def after_fork(self):
+        """Recrée les verrous dans un processus créé par fork (ils ont pu y être copiés pris)"""
+        self._lock = threading.RLock()
+        self._node_locks = {}
+
+    def _node_lock(self, name):
+        with self._lock:
+            lock = self._node_locks.get(name)
+            if lock is None:
+                lock = self._node_locks[name] = threading.RLock()
+            return lock
+
+    def get(self, name):
+        """Valeur de `name`, calculée (ainsi que ses entrées) si nécessaire"""
+        value = self._values.get(name, _MISSING)
+        if value is not _MISSING:
+            return value
+        node = self._nodes.get(name)
+        if node is None:
+            raise KeyError(f"Statistique indisponible: {name}")
+        with self._node_lock(name):
+            value = self._values.get(name, _MISSING)  # calculée pendant l'attente du verrou
+            if value is not _MISSING:
+                return value
+            version = self.version
+            func, inputs = node
+            value = func(*[self.get(source) for source in inputs])
+            with self._lock:
+                if self.version == version:
+                    self._values[name] = value
+            return value
+
+    def warm(self, names=None, on_done=None, lock=None):
+        """
+        Calcule en arrière-plan les nœuds `names` (tous par défaut) pas encore calculés.
+        on_done(noms calculés par le préchauffage) est appelé à la fin. `lock` (optionnel)
+        est pris pendant le calcul de chaque nœud (ex. verrou des modifications des données).
+
+        Returns:
+            Le thread de préchauffage
+        """
+        def run():
+            start = time.time()
+            warmed = []
+            for name in names or self.names():
+                if self.computed(name):
+                    continue
+                try:
+                    if lock is not None:
+                        with lock:
+                            self.get(name)
+                    else:
+                        self.get(name)
+                    warmed.append(name)
+                except Exception as e:
+                    logger.warning("Préchauffage de %s impossible: %s", name, e)
+            logger.info("%s statistiques préchauffées en %.2fs", len(warmed), time.time() - start)
+            if on_done is not None:
+                on_done(warmed)
+
+        thread = threading.Thread(target=run, name='stat-graph-warmer', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Accumulateurs des statistiques du tableau de bord.
+
+Les statistiques sont accumulées soit ligne par ligne pendant l'ingestion
+(`add`), soit en bloc à partir des colonnes d'un StudentStore (`add_store`).
+Les deux chemins alimentent le même plan d'agrégation (voir aggregation.py,
+specs DASHBOARD_AGGREGATES) et `finalize` produit le dictionnaire `stats`
+consommé par les routes de l'API.
+
+Pour un échantillon pondéré (voir sampling.py), `add_store` accepte un poids
+par ligne: les effectifs et sommes deviennent des estimations (flottantes) des
+totaux du fichier complet, arrondies à l'entier dans le résultat.
+
+Les accumulateurs se fusionnent (`merge`): morceaux d'un DataChunker, résultats
+de processus ou lots ajoutés produisent, une fois fusionnés, exactement les
+statistiques d'un passage unique sur toutes les lignes (sans pondération).
+"""
+
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+
+from aggregation import COUNT, MEAN, SUM, VARIANCE, Aggregate, AggregationPlan
+from groupby import scaled_integers
+from student_store import CATEGORICAL_COLUMNS, MARK_SCALE, SEMESTER_COUNT, StudentStore
+
+try:
+    import numpy as np
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+# PPCM de 1..12: permet de sommer exactement des moyennes de 1 à 12 semestres
+SEMESTER_LCM = 27720
+
+
+class SemesterSuccessMap(Mapping):
+    """
+    Vue {ID: {"avg_mark", "graduated", "semester_count"}} calculée à la demande depuis
+    la matrice des semestres, au lieu d'un dictionnaire par étudiant gardé en mémoire.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._index = {}
+        self._indexed_rows = 0
+
+    def _rows(self):
+        """Index {ID: ligne} des étudiants ayant au moins un semestre, complété à la demande"""
+        if self._indexed_rows < len(self.store):
+            ids = self.store.strings_column('ID')
+            semesters = self.store.semesters
+            for i in range(self._indexed_rows, len(self.store)):
+                row = semesters[i * SEMESTER_COUNT:(i + 1) * SEMESTER_COUNT]
+                if any(mark == mark for mark in row):  # NaN = semestre absent
+                    self._index[ids[i] if ids is not None else ""] = i
+            self._indexed_rows = len(self.store)
+        return self._index
+
+    def __getitem__(self, student_id):
+        i = self._rows()[student_id]
+        row = self.store.semesters[i * SEMESTER_COUNT:(i + 1) * SEMESTER_COUNT]
+        semester_marks = [round(mark * MARK_SCALE) for mark in row if mark == mark]
+        return {
+            "avg_mark": sum(semester_marks) / (len(semester_marks) * MARK_SCALE),
+            "graduated": self.store.graduated[i] is True,
+            "semester_count": len(semester_marks)
+        }
+
+    def __iter__(self):
+        return iter(self._rows())
+
+    def __len__(self):
+        return len(self._rows())
+
+
+# Statistiques du tableau de bord, décrites pour le moteur d'agrégation (voir aggregation.py)
+DASHBOARD_AGGREGATES = [
+    Aggregate('total_students', COUNT),
+    Aggregate('scholarship_count', SUM, 'Scholarship'),
+    Aggregate('graduated_count', SUM, 'Graduated'),
+    *(Aggregate(f'count_by_{name}', COUNT, by=(name,))
+      for name in ('Gender', 'Nationality', 'City', 'School', 'Specialty', 'Baccalaureat_Type')),
+    Aggregate('scholarship_by_gender', MEAN, 'Scholarship', by=('Gender',)),
+    Aggregate('scholarship_by_bac', MEAN, 'Scholarship', by=('Baccalaureat_Type',)),
+    Aggregate('success_rate_by_bac', MEAN, 'Graduated', by=('Baccalaureat_Type',)),
+    Aggregate('avg_marks_by_gender', MEAN, 'Mark', by=('Gender',)),
+    Aggregate('avg_marks_by_bac', MEAN, 'Mark', by=('Baccalaureat_Type',)),
+    Aggregate('avg_marks_by_specialty', MEAN, 'Mark', by=('Specialty',)),
+    Aggregate('avg_marks_by_school', MEAN, 'Mark', by=('School',)),
+    Aggregate('avg_marks_by_scholarship', MEAN, 'Mark', by=('Scholarship',)),
+    Aggregate('avg_marks_by_graduation', MEAN, 'Mark', by=('Graduated',)),
+    Aggregate('average_mark', MEAN, 'Mark'),
+    Aggregate('mark_variance', VARIANCE, 'Mark'),
+    Aggregate('graduated_by_specialty', SUM, 'Graduated', by=('Specialty',)),
+    Aggregate('school_specialty_distribution', COUNT, by=('School', 'Specialty')),
+    Aggregate('semester_graduation_threshold', MEAN, 'Semester_Avg', where='Graduated'),
+]
+
+# Clés catégorielles utilisées par les specs (les indicateurs Scholarship/Graduated valent 0 ou 1)
+_KEY_COLUMNS = tuple(name for name in CATEGORICAL_COLUMNS
+                     if any(name in spec.by for spec in DASHBOARD_AGGREGATES))
+
+# Échelle des mesures entières: notes en virgule fixe, moyennes semestrielles multipliées par SEMESTER_LCM
+MEASURE_SCALES = {'Mark': MARK_SCALE, 'Semester_Avg': SEMESTER_LCM * MARK_SCALE}
+
+
+def _semester_average(semesters):
+    """Moyenne semestrielle (entière, échelle SEMESTER_LCM * MARK_SCALE) si au moins 6 semestres, sinon None"""
+    semester_marks = [round(mark * MARK_SCALE) for mark in semesters if mark == mark]  # NaN = absent
+    count = len(semester_marks)
+    if count < 6:
+        return None
+    return sum(semester_marks) * (SEMESTER_LCM // count)
+
+
+def semester_averages(semesters, start, end):
+    """
+    Moyennes semestrielles des lignes [start, end) de la matrice des semestres.
+
+    Returns:
+        (moyennes entières, masque des lignes ayant au moins 6 semestres)
+    """
+    if not numpy_available:
+        averages = [_semester_average(semesters[i * SEMESTER_COUNT:(i + 1) * SEMESTER_COUNT])
+                    for i in range(start, end)]
+        return [average or 0 for average in averages], [average is not None for average in averages]
+
+    matrix = np.frombuffer(semesters, dtype=np.float32, count=end * SEMESTER_COUNT)
+    matrix = matrix.reshape(end, SEMESTER_COUNT)[start:].astype(np.float64)
+    present = ~np.isnan(matrix)
+    counts = present.sum(axis=1)
+    sums = np.where(present, np.rint(np.where(present, matrix, 0) * MARK_SCALE), 0).astype(np.int64).sum(axis=1)
+    return sums * (SEMESTER_LCM // np.maximum(counts, 1)), counts >= 6
+
+
+def _count(value):
+    return round(value) if value is not None else 0
+
+
+def _rate(value):
+    """Pourcentage arrondi à 0.1 d'une moyenne d'indicateur (0 pour un groupe vide)"""
+    return round((value * 100), 1) if value is not None else 0
+
+
+def _mean(value):
+    """Moyenne arrondie à 0.1 (0 pour un groupe vide)"""
+    return round(value, 1) if value is not None else 0
+
+
+class StatsAccumulator:
+    """
+    État agrégé des statistiques (plan DASHBOARD_AGGREGATES), partageant les
+    dictionnaires d'encodage du StudentStore: les groupes sont des codes.
+    """
+
+    def __init__(self, store, specs=DASHBOARD_AGGREGATES):
+        self.store = store
+        self.plan = AggregationPlan(specs, MEASURE_SCALES)
+        self.sampled_rows = 0            # lignes réellement ajoutées
+
+    def __getstate__(self):
+        """
+        État sérialisable (sans le stockage, rattaché par bind). Les dictionnaires des
+        clés sont conservés: un accumulateur reçu d'un autre processus reste fusionnable.
+        """
+        state = dict(self.__dict__)
+        state['store'] = None
+        state['_categories'] = self.categories()
+        return state
+
+    def bind(self, store):
+        self.store = store
+        return self
+
+    def categories(self):
+        """{clé: valeurs dans l'ordre des codes} des clés catégorielles des specs"""
+        if self.store is None:
+            return self.__dict__.get('_categories', {})
+        return {name: list(self.store.categories(name)) for name in _KEY_COLUMNS}
+
+    def _dictionary_store(self):
+        """Stockage (sans lignes) portant les dictionnaires d'un accumulateur détaché"""
+        if self.store is None:
+            store = StudentStore(())
+            for name, values in self.categories().items():
+                for value in values:
+                    store.categorical[name].encode(value)
+            self.store = store
+        return self.store
+
+    def merge(self, other):
+        """
+        Ajoute l'état d'un accumulateur calculé sur d'autres lignes (codes traduits
+        par valeur: les dictionnaires des deux stockages peuvent différer).
+
+        Returns:
+            Cet accumulateur
+        """
+        columns = self._dictionary_store().categorical
+        translate = {name: [columns[name].encode(value) for value in values]
+                     for name, values in other.categories().items()}
+        self.plan.merge(other.plan, translate)
+        self.sampled_rows += other.sampled_rows
+        return self
+
+    def add(self, decoded):
+        """Ajoute une ligne décodée (DecodedRow)"""
+        columns = self.store.categorical
+        keys = {name: columns[name].encode(value) for name, value in zip(CATEGORICAL_COLUMNS, decoded.categories)}
+        keys['Scholarship'] = scholarship = 1 if decoded.scholarship is True else 0
+        keys['Graduated'] = graduated = 1 if decoded.graduated is True else 0
+        values = {
+            'Mark': round(decoded.mark * MARK_SCALE),
+            'Scholarship': scholarship,
+            'Graduated': graduated,
+            'Semester_Avg': lambda: _semester_average(decoded.semesters)
+        }
+        self.plan.add_row(keys, values)
+        self.sampled_rows += 1
+
+    def _row_columns(self, rows, known_only=False):
+        """
+        Clés et mesures (colonnes) de lignes CSV brutes, codées avec les dictionnaires du stockage.
+        known_only: refuser une valeur absente des dictionnaires (ligne à retirer)
+        """
+        decoded_rows = [self.store.decoder.decode(row) for row in rows]
+        keys = {}
+        for position, name in enumerate(CATEGORICAL_COLUMNS):
+            if name not in _KEY_COLUMNS:
+                continue
+            column = self.store.categorical[name]
+            values = [decoded.categories[position] for decoded in decoded_rows]
+            if known_only:
+                unknown = [value for value in values if value not in column.index]
+                if unknown:
+                    raise ValueError(f"Ligne absente des statistiques ({name} = {unknown[0]!r})")
+                keys[name] = array('I', [column.index[value] for value in values])
+            else:
+                keys[name] = array('I', [column.encode(value) for value in values])
+        keys['Scholarship'] = scholarship = bytes(decoded.scholarship is True for decoded in decoded_rows)
+        keys['Graduated'] = graduated = bytes(decoded.graduated is True for decoded in decoded_rows)
+
+        def row_semester_averages():
+            averages = [_semester_average(decoded.semesters) for decoded in decoded_rows]
+            return [average or 0 for average in averages], bytes(average is not None for average in averages)
+
+        values = {
+            'Mark': array('q', [round(decoded.mark * MARK_SCALE) for decoded in decoded_rows]),
+            'Scholarship': scholarship,
+            'Graduated': graduated,
+            'Semester_Avg': row_semester_averages
+        }
+        sizes = {name: len(self.store.categories(name)) for name in _KEY_COLUMNS}
+        return len(decoded_rows), keys, values, sizes
+
+    def apply_insert(self, rows):
+        """
+        Ajoute des lignes CSV brutes (listes alignées sur les en-têtes du stockage),
+        en O(lignes ajoutées). Les lignes ne sont pas ajoutées au stockage.
+        """
+        length, keys, values, sizes = self._row_columns(rows)
+        if length:
+            self.plan.add_columns(length, keys, values, sizes=sizes)
+            self.sampled_rows += length
+
+    def apply_delete(self, rows):
+        """Retire des lignes CSV brutes ajoutées auparavant, en O(lignes retirées)"""
+        if not self.plan.invertible:
+            raise ValueError("Retrait impossible: le plan d'agrégation demande un min ou un max")
+        length, keys, values, sizes = self._row_columns(rows, known_only=True)
+        if length:
+            self.plan.add_columns(length, keys, values, array('b', [-1]) * length, sizes)
+            self.sampled_rows -= length
+
+    def apply_update(self, old_rows, new_rows):
+        """Modification de lignes: retrait des anciennes versions puis ajout des nouvelles"""
+        self.apply_delete(old_rows)
+        self.apply_insert(new_rows)
+
+    def add_store(self, store, start=0, weights=None, end=None):
+        """
+        Ajoute en bloc les lignes store[start:end] à partir des colonnes.
+        `weights` (optionnel): poids d'inclusion de chaque ligne du stockage.
+        """
+        end = len(store) if end is None else min(end, len(store))
+        if start >= end:
+            return
+        scholarship_flags = store.scholarship.flags(True)[start:end]
+        graduated_flags = store.graduated.flags(True)[start:end]
+        keys = {name: store.codes(name)[start:end] for name in _KEY_COLUMNS}
+        keys['Scholarship'] = scholarship_flags
+        keys['Graduated'] = graduated_flags
+        sizes = {name: len(store.categories(name)) for name in _KEY_COLUMNS}
+
+        values = {
+            'Mark': scaled_integers(store.marks[start:end], MARK_SCALE),
+            'Scholarship': scholarship_flags,
+            'Graduated': graduated_flags,
+            'Semester_Avg': lambda: semester_averages(store.semesters, start, end)
+        }
+        self.plan.add_columns(end - start, keys, values, weights[start:end] if weights is not None else None, sizes)
+        self.sampled_rows += end - start
+
+    def finalize(self, total_rows=None, is_sampled=False):
+        """Construit le dictionnaire de statistiques servi par l'API"""
+        store = self._dictionary_store()
+        result = self.plan.result
+        row_count = result('total_students')
+        if total_rows is None:
+            total_rows = row_count
+        scholarship_count = result('scholarship_count')
+        graduated_count = result('graduated_count')
+
+        def by_code(name, per_code, format_value):
+            # Valeurs du dictionnaire présentes dans les lignes (une valeur a pu disparaître
+            # avec des lignes retirées), dans l'ordre des codes
+            present = result(f'count_by_{name}')
+            return {value: format_value(per_code.get(code)) for code, value in enumerate(store.categorical[name].values)
+                    if code in present}
+
+        def counts(name):
+            # Effectifs pondérés: estimation arrondie à l'entier (identité sans pondération)
+            return Counter(by_code(name, result(f'count_by_{name}'), _count))
+
+        def by_flag(name):
+            means = result(name)
+            return _mean(means.get(1)), _mean(means.get(0))
+
+        specialties = store.categorical['Specialty'].values
+        school_specialty_distribution = {school: {} for school in by_code('School', {}, _count)}
+        for (school_code, specialty_code), count in result('school_specialty_distribution').items():
+            school_specialty_distribution[store.categorical['School'].values[school_code]][
+                specialties[specialty_code]] = round(count)
+
+        specialty_totals = result('count_by_Specialty')
+        specialty_graduated = result('graduated_by_specialty')
+        specialty_success = {}
+        for code, name in enumerate(specialties):
+            if code not in specialty_totals:
+                continue
+            total = specialty_totals[code]
+            graduated = specialty_graduated.get(code, 0)
+            specialty_success[name] = {
+                "total": round(total),
+                "graduated": round(graduated),
+                "success_rate": (graduated / total) * 100 if total else 0
+            }
+
+        scholarship_yes, scholarship_no = by_flag('avg_marks_by_scholarship')
+        graduated_yes, graduated_no = by_flag('avg_marks_by_graduation')
+
+        return {
+            "total_students": round(row_count),
+            "gender_distribution": counts('Gender'),
+            "nationalities": counts('Nationality'),
+            "cities": counts('City'),
+            "schools": counts('School'),
+            "specialties": counts('Specialty'),
+            "bac_types": counts('Baccalaureat_Type'),
+            "scholarship_percentage": round((scholarship_count / row_count) * 100, 1) if row_count else 0,
+            "graduation_rate": round((graduated_count / row_count) * 100, 1) if row_count else 0,
+            "scholarship_by_gender": by_code('Gender', result('scholarship_by_gender'), _rate),
+            "scholarship_by_bac": by_code('Baccalaureat_Type', result('scholarship_by_bac'), _rate),
+            "success_rate_by_bac": by_code('Baccalaureat_Type', result('success_rate_by_bac'), _rate),
+            "avg_marks_by_gender": by_code('Gender', result('avg_marks_by_gender'), _mean),
+            "avg_marks_by_bac": by_code('Baccalaureat_Type', result('avg_marks_by_bac'), _mean),
+            "avg_marks_by_scholarship": {True: scholarship_yes, False: scholarship_no},
+            "avg_marks_by_specialty": by_code('Specialty', result('avg_marks_by_specialty'), _mean),
+            "avg_marks_by_school": by_code('School', result('avg_marks_by_school'), _mean),
+            "avg_marks_by_graduation": {"graduated": graduated_yes, "not_graduated": graduated_no},
+            "school_specialty_distribution": school_specialty_distribution,
+            "graduation_threshold": result('avg_marks_by_graduation').get(1) or 0,
+            "average_mark": round(result('average_mark') or 0, 2),
+            "mark_variance": round(result('mark_variance') or 0, 2),
+            "specialty_success": specialty_success,
+            "counts": {
+                "scholarship": {
+                    True: round(scholarship_count),
+                    False: round(row_count - scholarship_count)
+                }
+            },
+            "semester_success_map": SemesterSuccessMap(store),
+            "semester_graduation_threshold": result('semester_graduation_threshold') or 0,
+            "data_info": {
+                "is_sampled": is_sampled,
+                "total_rows": total_rows,
+                "processed_rows": self.sampled_rows,
+                "sampling_factor": round(self.sampled_rows / total_rows, 4) if is_sampled and total_rows else 1.0,
+                "bytes_per_row": store.bytes_per_row()
+            }
+        }
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Stockage colonnaire des étudiants.
+
+Au lieu de conserver chaque étudiant sous forme de dictionnaire Python (un objet
+par cellule), les données sont rangées par colonne dans des tableaux compacts
+du module standard `array`:
+- colonnes catégorielles encodées par dictionnaire (codes entiers + liste des valeurs)
+- Mark en float32, Start_Year en int16
+- Scholarship / Graduated sous forme de bits compactés
+- S1 à S12 dans une matrice de float32 (NaN pour un semestre absent)
+Les autres colonnes (ID, Name, Birth_Date, ...) sont stockées en UTF-8 contigu.
+"""
+
+import math
+import sys
+from array import array
+from collections import namedtuple
+
+from groupby import group_count
+from semester_decoder import MAX_ABS_MARK, decode_semester_mark
+
+CATEGORICAL_COLUMNS = ('Gender', 'Nationality', 'City', 'School', 'Specialty',
+                       'Baccalaureat_Type', 'Current_Status')
+BOOLEAN_COLUMNS = ('Scholarship', 'Graduated')
+SEMESTER_COUNT = 12
+SEMESTER_COLUMNS = tuple(f"S{i}" for i in range(1, SEMESTER_COUNT + 1))
+
+NAN = float('nan')
+MISSING_YEAR = 0
+
+# Les notes sont sommées en virgule fixe (1e-4): sommes entières exactes,
+# indépendantes de l'ordre des lignes et sans dérive liée au float32
+MARK_SCALE = 10000
+
+_BIT_TABLE = bytes.maketrans(b'01', b'\x00\x01')
+
+# Ligne décodée une seule fois puis transmise au stockage
+DecodedRow = namedtuple('DecodedRow', ['categories', 'mark', 'start_year', 'scholarship',
+                                       'graduated', 'semesters', 'extras'])
+
+
+def as_float(value):
+    """Ramène une valeur float32 à sa plus courte écriture décimale (16.799999 -> 16.8)"""
+    return float(format(value, '.7g'))
+
+
+def parse_bool(value):
+    """Retourne True/False pour 'true'/'false' (insensible à la casse), None sinon"""
+    lowered = value.lower()
+    if lowered == 'true':
+        return True
+    if lowered == 'false':
+        return False
+    return None
+
+
+class RowDecoder:
+    """Convertit une ligne CSV brute (liste de chaînes) en DecodedRow"""
+
+    def __init__(self, headers):
+        self.headers = list(headers)
+        positions = {header: i for i, header in enumerate(self.headers)}
+        self.category_positions = tuple(positions.get(name) for name in CATEGORICAL_COLUMNS)
+        self.mark_position = positions.get('Mark')
+        self.year_position = positions.get('Start_Year')
+        self.scholarship_position = positions.get('Scholarship')
+        self.graduated_position = positions.get('Graduated')
+        self.semester_positions = tuple(positions.get(name) for name in SEMESTER_COLUMNS)
+        typed = set(CATEGORICAL_COLUMNS) | set(BOOLEAN_COLUMNS) | set(SEMESTER_COLUMNS) | {'Mark', 'Start_Year'}
+        self.extra_columns = tuple(h for h in self.headers if h not in typed)
+        self.extra_positions = tuple(positions[h] for h in self.extra_columns)
+
+    def decode(self, row):
+        categories = tuple(row[p].strip() if p is not None else "Unknown"
+                           for p in self.category_positions)
+
+        mark = 0.0
+        if self.mark_position is not None:
+            try:
+                mark = float(row[self.mark_position])
+            except ValueError:
+                mark = 0.0
+            if not math.isfinite(mark) or abs(mark) > MAX_ABS_MARK:
+                mark = 0.0  # "nan", "inf", "1e400": illisible comme une note non numérique
+
+        start_year = MISSING_YEAR
+        if self.year_position is not None:
+            year = row[self.year_position].strip()
+            if year.isdigit():
+                start_year = int(year)
+
+        scholarship = None
+        if self.scholarship_position is not None:
+            scholarship = parse_bool(row[self.scholarship_position].strip())
+
+        graduated = None
+        if self.graduated_position is not None:
+            graduated = parse_bool(row[self.graduated_position].strip())
+
+        semesters = [decode_semester_mark(row[p]) if p is not None else NAN
+                     for p in self.semester_positions]
+
+        extras = tuple(row[p].strip() for p in self.extra_positions)
+
+        return DecodedRow(categories, mark, start_year, scholarship, graduated, semesters, extras)
+
+
+class CategoricalColumn:
+    """Colonne encodée par dictionnaire: un code entier par ligne"""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+        self.codes = array('H')
+
+    def encode(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            if code > 0xFFFF and self.codes.typecode == 'H':
+                self.codes = array('I', self.codes)
+            self.index[value] = code
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def nbytes(self):
+        dictionary = sum(sys.getsizeof(v) for v in self.values)
+        return self.codes.itemsize * len(self.codes) + dictionary
+
+
+class BitColumn:
+    """Colonne booléenne à trois états (True / False / autre) en bits compactés"""
+
+    def __init__(self):
+        self.true_bits = bytearray()
+        self.false_bits = bytearray()
+        self.length = 0
+
+    def append(self, value):
+        if self.length % 8 == 0:
+            self.true_bits.append(0)
+            self.false_bits.append(0)
+        byte, bit = divmod(self.length, 8)
+        if value is True:
+            self.true_bits[byte] |= 1 << bit
+        elif value is False:
+            self.false_bits[byte] |= 1 << bit
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        byte, bit = divmod(i, 8)
+        if self.true_bits[byte] >> bit & 1:
+            return True
+        if self.false_bits[byte] >> bit & 1:
+            return False
+        return None
+
+    def true_mask(self):
+        """Masque des lignes à True sous forme d'entier (bit i = ligne i)"""
+        return int.from_bytes(self.true_bits, 'little')
+
+    def false_mask(self):
+        return int.from_bytes(self.false_bits, 'little')
+
+    def flags(self, value=True):
+        """Un octet 0/1 par ligne indiquant si la ligne vaut `value` (True ou False)"""
+        mask = self.true_mask() if value else self.false_mask()
+        bits = format(mask, 'b').zfill(self.length)[::-1]
+        return bits[:self.length].encode('ascii').translate(_BIT_TABLE)
+
+    def truncate(self, length):
+        """Ne garde que les `length` premières valeurs"""
+        if length >= self.length:
+            return
+        size, bit = divmod(length, 8)
+        if bit:
+            size += 1
+        del self.true_bits[size:]
+        del self.false_bits[size:]
+        if bit:
+            keep = (1 << bit) - 1
+            self.true_bits[-1] &= keep
+            self.false_bits[-1] &= keep
+        self.length = length
+
+    def count_true(self):
+        return self.true_mask().bit_count()
+
+    def count_false(self):
+        return self.false_mask().bit_count()
+
+    def nbytes(self):
+        return len(self.true_bits) + len(self.false_bits)
+
+
+class StringColumn:
+    """Colonne de chaînes libres stockées en UTF-8 contigu avec un tableau d'offsets"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array('Q', [0])
+
+    def append(self, value):
+        self.data += value.encode('utf-8')
+        self.offsets.append(len(self.data))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def truncate(self, length):
+        """Ne garde que les `length` premières chaînes"""
+        if length < len(self):
+            del self.data[self.offsets[length]:]
+            del self.offsets[length + 1:]
+
+    def nbytes(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+
+class StudentStore:
+    """Jeu de données étudiant en colonnes"""
+
+    def __init__(self, headers):
+        self.headers = list(headers)
+        self.decoder = RowDecoder(self.headers)
+        self.categorical = {name: CategoricalColumn() for name in CATEGORICAL_COLUMNS}
+        self.marks = array('f')
+        self.start_years = array('h')
+        self.scholarship = BitColumn()
+        self.graduated = BitColumn()
+        self.semesters = array('f')
+        self.strings = {name: StringColumn() for name in self.decoder.extra_columns}
+        self.length = 0
+        self.read_only = False
+        self._mapping = None
+
+    def __len__(self):
+        return self.length
+
+    def _buffer_slots(self):
+        """(nom, objet, attribut) de chaque tampon brut du stockage"""
+        slots = [('Mark', self, 'marks'), ('Start_Year', self, 'start_years'),
+                 ('Semesters', self, 'semesters')]
+        for name in BOOLEAN_COLUMNS:
+            column = getattr(self, name.lower())
+            slots.append((f'{name}.true', column, 'true_bits'))
+            slots.append((f'{name}.false', column, 'false_bits'))
+        for name, column in self.categorical.items():
+            slots.append((f'{name}.codes', column, 'codes'))
+        for name, column in self.strings.items():
+            slots.append((f'{name}.data', column, 'data'))
+            slots.append((f'{name}.offsets', column, 'offsets'))
+        return slots
+
+    def export_buffers(self):
+        """Liste (nom, typecode, tampon) des colonnes, pour l'instantané binaire"""
+        exported = []
+        for name, owner, attribute in self._buffer_slots():
+            buffer = getattr(owner, attribute)
+            typecode = buffer.typecode if isinstance(buffer, array) else 'B'
+            exported.append((name, typecode, buffer))
+        return exported
+
+    @classmethod
+    def from_buffers(cls, headers, length, categories, buffers, mapping=None):
+        """
+        Reconstruit un stockage à partir de tampons (par exemple des memoryview sur un
+        fichier projeté en mémoire). Le stockage est alors en lecture seule jusqu'au
+        premier ajout, qui recopie les colonnes en mémoire.
+        """
+        store = cls(headers)
+        for name, values in categories.items():
+            column = store.categorical[name]
+            column.values = list(values)
+            column.index = {value: code for code, value in enumerate(column.values)}
+        for name, owner, attribute in store._buffer_slots():
+            setattr(owner, attribute, buffers[name])
+        store.scholarship.length = length
+        store.graduated.length = length
+        store.length = length
+        store.read_only = True
+        store._mapping = mapping
+        return store
+
+    def ensure_writable(self):
+        """Recopie les colonnes projetées en mémoire dans des tableaux modifiables"""
+        if not self.read_only:
+            return
+        for _, owner, attribute in self._buffer_slots():
+            buffer = getattr(owner, attribute)
+            if isinstance(buffer, memoryview):
+                if buffer.format == 'B':
+                    copy = bytearray(buffer)
+                else:
+                    copy = array(buffer.format)
+                    copy.frombytes(buffer.cast('B'))
+                setattr(owner, attribute, copy)
+        self.read_only = False
+        self._mapping = None
+
+    def append(self, row):
+        """Ajoute une ligne CSV brute (liste de chaînes alignée sur les en-têtes)"""
+        self.append_decoded(self.decoder.decode(row))
+
+    def append_decoded(self, decoded):
+        if self.read_only:
+            self.ensure_writable()
+        for name, value in zip(CATEGORICAL_COLUMNS, decoded.categories):
+            self.categorical[name].append(value)
+        self.marks.append(decoded.mark)
+        self.start_years.append(decoded.start_year)
+        self.scholarship.append(decoded.scholarship)
+        self.graduated.append(decoded.graduated)
+        self.semesters.extend(decoded.semesters)
+        for name, value in zip(self.decoder.extra_columns, decoded.extras):
+            self.strings[name].append(value)
+        self.length += 1
+
+    def truncate(self, length):
+        """
+        Retire les lignes à partir de `length` (les dictionnaires des colonnes catégorielles
+        gardent leurs valeurs: les codes des lignes restantes sont inchangés).
+        """
+        if length >= self.length:
+            return
+        if self.read_only:
+            self.ensure_writable()
+        for column in self.categorical.values():
+            del column.codes[length:]
+        del self.marks[length:]
+        del self.start_years[length:]
+        del self.semesters[length * SEMESTER_COUNT:]
+        self.scholarship.truncate(length)
+        self.graduated.truncate(length)
+        for column in self.strings.values():
+            column.truncate(length)
+        self.length = length
+
+    def take(self, indices):
+        """Nouveau stockage contenant les lignes `indices` (dans cet ordre), mêmes dictionnaires"""
+        store = StudentStore(self.headers)
+        for name, column in self.categorical.items():
+            target = store.categorical[name]
+            target.values = list(column.values)
+            target.index = dict(column.index)
+            codes = column.codes
+            target.codes = array(codes.typecode if isinstance(codes, array) else codes.format,
+                                 [codes[i] for i in indices])
+        store.marks = array('f', [self.marks[i] for i in indices])
+        store.start_years = array('h', [self.start_years[i] for i in indices])
+        semesters = self.semesters
+        for i in indices:
+            store.semesters.extend(semesters[i * SEMESTER_COUNT:(i + 1) * SEMESTER_COUNT])
+            store.scholarship.append(self.scholarship[i])
+            store.graduated.append(self.graduated[i])
+        for name, column in self.strings.items():
+            target = store.strings[name]
+            for i in indices:
+                target.append(column[i])
+        store.length = len(indices)
+        return store
+
+    def has_column(self, name):
+        return name in self.headers
+
+    def codes(self, name):
+        return self.categorical[name].codes
+
+    def categories(self, name):
+        return self.categorical[name].values
+
+    def category_counts(self, name):
+        """Nombre de lignes par code de la colonne catégorielle"""
+        column = self.categorical[name]
+        return group_count(column.codes, len(column.values))
+
+    def semester_row(self, i):
+        start = i * SEMESTER_COUNT
+        return self.semesters[start:start + SEMESTER_COUNT]
+
+    def strings_column(self, name):
+        return self.strings.get(name)
+
+    def record(self, i):
+        """Reconstruit l'enregistrement i sous forme de dictionnaire (compatibilité)"""
+        record = {}
+        semesters = self.semester_row(i)
+        for header in self.headers:
+            if header in self.categorical:
+                record[header] = self.categorical[header][i]
+            elif header == 'Mark':
+                record[header] = as_float(self.marks[i])
+            elif header == 'Start_Year':
+                year = self.start_years[i]
+                record[header] = str(year) if year != MISSING_YEAR else ""
+            elif header == 'Scholarship':
+                record[header] = self.scholarship[i]
+            elif header == 'Graduated':
+                record[header] = self.graduated[i]
+            elif header in SEMESTER_COLUMNS:
+                mark = semesters[SEMESTER_COLUMNS.index(header)]
+                record[header] = {"mark": as_float(mark)} if not math.isnan(mark) else ""
+            else:
+                record[header] = self.strings[header][i]
+        return record
+
+    def iter_records(self):
+        for i in range(self.length):
+            yield self.record(i)
+
+    def memory_usage(self):
+        """Taille en octets de chaque colonne"""
+        usage = {name: column.nbytes() for name, column in self.categorical.items()}
+        usage['Mark'] = self.marks.itemsize * len(self.marks)
+        usage['Start_Year'] = self.start_years.itemsize * len(self.start_years)
+        usage['Scholarship'] = self.scholarship.nbytes()
+        usage['Graduated'] = self.graduated.nbytes()
+        usage['Semesters'] = self.semesters.itemsize * len(self.semesters)
+        for name, column in self.strings.items():
+            usage[name] = column.nbytes()
+        return usage
+
+    def nbytes(self):
+        return sum(self.memory_usage().values())
+
+    def bytes_per_row(self):
+        return round(self.nbytes() / self.length, 1) if self.length else 0.0
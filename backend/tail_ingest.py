@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Ingestion incrémentale des lignes ajoutées en fin de fichier CSV.
+
+L'export de la scolarité ajoute de nouvelles inscriptions à la fin du CSV au
+cours de la journée. Le serveur retient la position (en octets) jusqu'à laquelle
+le fichier a été lu et surveille périodiquement sa taille:
+- le fichier a grandi: seuls les octets ajoutés sont analysés (read_tail, sans
+  bloquer les requêtes: les lignes décodées sont mises de côté dans un TailBatch),
+  puis les nouvelles lignes sont intégrées au stockage et aux statistiques
+  (TailBatch.replay, sous le verrou des données);
+- le fichier a été tronqué, remplacé ou réécrit (la zone déjà lue a changé):
+  un rechargement complet est demandé.
+
+Pour détecter une réécriture sans relire le fichier, on garde une empreinte des
+premiers octets (en-tête) et des derniers octets déjà lus. Un fichier compressé
+n'a pas d'empreinte (les positions portent sur le flux décompressé): toute
+modification demande un rechargement complet.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from compressed_input import is_compressed
+from ingest import IngestSink, ingest_csv
+
+logger = logging.getLogger(__name__)
+
+# Taille des zones (début et fin de la partie lue) servant d'empreinte
+FINGERPRINT_BYTES = 4096
+# Octets ajoutés lus (et gardés en mémoire) au plus par TailBatch
+TAIL_BATCH_BYTES = 16 * 1024 * 1024
+
+UNCHANGED = 'unchanged'
+APPENDED = 'appended'
+REWRITTEN = 'rewritten'
+
+TailState = namedtuple('TailState', ['offset', 'size', 'mtime_ns', 'inode', 'fingerprint'])
+
+
+def _fingerprint(f, offset):
+    """Empreinte des FINGERPRINT_BYTES premiers et derniers octets de [0, offset)"""
+    digest = hashlib.blake2b(digest_size=16)
+    f.seek(0)
+    digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+    tail_start = max(0, offset - FINGERPRINT_BYTES)
+    f.seek(tail_start)
+    digest.update(f.read(offset - tail_start))
+    return digest.hexdigest()
+
+
+def capture_state(file_path, offset, info=None):
+    """État du fichier après lecture jusqu'à `offset` (`info`: os.stat pris avant la lecture)"""
+    if info is None:
+        info = os.stat(file_path)
+    fingerprint = None
+    if not is_compressed(file_path):
+        with open(file_path, 'rb') as f:
+            fingerprint = _fingerprint(f, offset)
+    return TailState(offset, info.st_size, info.st_mtime_ns, info.st_ino, fingerprint)
+
+
+def check_file(file_path, state):
+    """
+    Compare le fichier à l'état retenu.
+
+    Returns:
+        UNCHANGED, APPENDED (des octets ont été ajoutés après state.offset)
+        ou REWRITTEN (fichier tronqué, remplacé ou modifié avant state.offset)
+    """
+    try:
+        info = os.stat(file_path)
+    except FileNotFoundError:
+        return UNCHANGED  # Fichier en cours de remplacement: réessayer plus tard
+    unchanged = (info.st_ino == state.inode and info.st_size == state.size
+                 and info.st_mtime_ns == state.mtime_ns)
+    if state.fingerprint is None:
+        return UNCHANGED if unchanged else REWRITTEN  # Fichier compressé
+    if info.st_ino != state.inode or info.st_size < state.offset:
+        return REWRITTEN
+    if unchanged:
+        return UNCHANGED
+    with open(file_path, 'rb') as f:
+        if _fingerprint(f, state.offset) != state.fingerprint:
+            return REWRITTEN
+    return APPENDED if info.st_size > state.offset else UNCHANGED
+
+
+class TailBatch(IngestSink):
+    """
+    Lignes ajoutées lues par read_tail(): lignes brutes, décodées et positions, transmises
+    ensuite aux sinks réels par replay() (ex. sous le verrou des données).
+    """
+
+    needs_offsets = True
+
+    def __init__(self):
+        self.headers = None
+        self.result = None
+        self._offsets = []
+        self._rows = []
+        self._decoded = []
+
+    def begin(self, headers):
+        self.headers = headers
+
+    def locate(self, offset):
+        self._offsets.append(offset)
+
+    def add(self, row, decoded):
+        self._rows.append(row)
+        self._decoded.append(decoded)
+
+    def finish(self, result):
+        self.result = result
+
+    def valid_rows(self):
+        """Lignes brutes rangées dans le stockage (nombre de colonnes correct)"""
+        return [row for row, decoded in zip(self._rows, self._decoded) if decoded is not None]
+
+    def replay(self, sinks):
+        """Transmet les lignes aux `sinks` comme ingest_csv l'aurait fait"""
+        offset_sinks = [sink for sink in sinks if sink.needs_offsets]
+        for sink in sinks:
+            sink.begin(self.headers)
+        for offset, row, decoded in zip(self._offsets, self._rows, self._decoded):
+            for sink in offset_sinks:
+                sink.locate(offset)
+            for sink in sinks:
+                sink.add(row, decoded)
+        for sink in sinks:
+            sink.finish(self.result)
+
+
+def read_tail(file_path, state, headers, max_bytes=TAIL_BATCH_BYTES):
+    """
+    Lit les enregistrements complets écrits après state.offset (au plus ~`max_bytes` octets).
+
+    Returns:
+        (TailBatch, nouvel état TailState)
+    """
+    # Taille relevée avant la lecture: des octets ajoutés pendant la lecture seront vus au prochain passage
+    info = os.stat(file_path)
+    batch = TailBatch()
+    result = ingest_csv(file_path, [batch], start_offset=state.offset, headers=headers,
+                        stop_offset=state.offset + max_bytes)
+    return batch, capture_state(file_path, result.end_offset, info)
+
+
+class TailWatcher(threading.Thread):
+    """
+    Surveille le fichier toutes les `interval` secondes.
+
+    Args:
+        file_path: Fichier CSV surveillé
+        get_state: Fonction retournant le TailState courant (None si rien n'est chargé)
+        on_append: Appelée quand des octets ont été ajoutés
+        on_rewrite: Appelée quand le fichier a été tronqué ou réécrit
+        interval: Période de vérification (secondes)
+    """
+
+    def __init__(self, file_path, get_state, on_append, on_rewrite, interval=5.0):
+        super().__init__(name='tail-watcher', daemon=True)
+        self.file_path = file_path
+        self.get_state = get_state
+        self.on_append = on_append
+        self.on_rewrite = on_rewrite
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                state = self.get_state()
+                if state is None:
+                    continue
+                change = check_file(self.file_path, state)
+                if change == APPENDED:
+                    self.on_append()
+                elif change == REWRITTEN:
+                    logger.info("Fichier réécrit ou tronqué: rechargement complet de %s", self.file_path)
+                    self.on_rewrite()
+            except Exception as e:
+                logger.error("Erreur lors de la surveillance de %s: %s", self.file_path, e)
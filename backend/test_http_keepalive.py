@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests de http_keepalive: requêtes avec `Expect: 100-continue` et corps trop volumineux.
+
+    cd backend && python -m unittest test_http_keepalive
+"""
+
+import http.server
+import socket
+import threading
+import unittest
+
+from concurrent_server import PooledHTTPServer
+from http_keepalive import KeepAliveHandler
+
+
+class EchoHandler(KeepAliveHandler, http.server.BaseHTTPRequestHandler):
+    """Renvoie le corps de la requête"""
+    max_body = 1000
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def read_response(sock):
+    """(code, en-têtes, corps) de la réponse suivante reçue sur `sock`"""
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    head, _, body = data.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = {name.strip().lower(): value.strip() for name, _, value in (line.partition(':') for line in lines[1:])}
+    length = int(headers.get('content-length', 0))
+    while len(body) < length:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        body += chunk
+    return int(lines[0].split()[1]), headers, body
+
+
+class ExpectContinueTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.httpd = PooledHTTPServer(('127.0.0.1', 0), EchoHandler, threads=2)
+        cls.thread = threading.Thread(target=cls.httpd.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+
+    def connect(self):
+        sock = socket.create_connection(self.httpd.server_address, timeout=5)
+        self.addCleanup(sock.close)
+        return sock
+
+    def test_continue_then_response(self):
+        sock = self.connect()
+        sock.sendall(b'POST /echo HTTP/1.1\r\nHost: test\r\nContent-Length: 5\r\n'
+                     b'Expect: 100-continue\r\n\r\n')
+        self.assertEqual(read_response(sock)[0], 100)
+        sock.sendall(b'hello')
+        code, headers, body = read_response(sock)
+        self.assertEqual(code, 200)
+        self.assertEqual(body, b'hello')
+        self.assertEqual(headers['connection'], 'keep-alive')
+        # La connexion reste utilisable pour la requête suivante
+        sock.sendall(b'POST /echo HTTP/1.1\r\nHost: test\r\nContent-Length: 2\r\n\r\nok')
+        self.assertEqual(read_response(sock)[::2], (200, b'ok'))
+
+    def test_body_too_large_refused_before_continue(self):
+        sock = self.connect()
+        sock.sendall(b'POST /echo HTTP/1.1\r\nHost: test\r\nContent-Length: 5000\r\n'
+                     b'Expect: 100-continue\r\n\r\n')
+        code, headers, _ = read_response(sock)
+        self.assertEqual(code, 413)
+        self.assertEqual(headers['connection'], 'close')
+
+    def test_body_too_large_without_expect(self):
+        sock = self.connect()
+        sock.sendall(b'POST /echo HTTP/1.1\r\nHost: test\r\nContent-Length: 5000\r\n\r\n')
+        self.assertEqual(read_response(sock)[0], 413)
+
+
+if __name__ == '__main__':
+    unittest.main()
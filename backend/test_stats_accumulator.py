@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests de StatsAccumulator: statistiques après ajout, retrait et modification de lignes
+(apply_insert, apply_delete, apply_update) identiques à un recalcul complet.
+
+    cd backend && python -m unittest test_stats_accumulator
+"""
+
+import random
+import unittest
+
+from stats_accumulator import StatsAccumulator
+from student_store import StudentStore
+
+HEADERS = ['ID', 'Name', 'Gender', 'Nationality', 'City', 'Birth_Date', 'Baccalaureat_Type', 'Mark',
+           'School', 'Specialty', 'Start_Year', 'Scholarship', 'Current_Status', 'Graduated',
+           'S1', 'S2', 'S3', 'S4', 'S5', 'S6', 'S7', 'S8']
+
+
+def make_rows(count, seed, prefix='E'):
+    """Lignes CSV brutes aléatoires (notes au centième, 0 à 8 semestres)"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        graduated = rng.random() < 0.4
+        semesters = [f'{{"mark":{rng.uniform(8, 19):.2f}}}' for _ in range(rng.randint(0, 8))]
+        rows.append([f'{prefix}{i}', f'Etudiant {i}', rng.choice(['Male', 'Female']),
+                     rng.choice(['Moroccan', 'French', 'Senegalese']), rng.choice(['Fes', 'Rabat', 'Casablanca']),
+                     '2000-01-01', rng.choice(['Scientific', 'Literary', 'Economic']), f'{rng.uniform(10, 20):.2f}',
+                     rng.choice(['Business School', 'Engineering School']), rng.choice(['Finance', 'AI', 'Civil']),
+                     str(rng.randint(2015, 2023)), str(rng.random() < 0.3), 'Active', str(graduated)]
+                    + semesters + [''] * (8 - len(semesters)))
+    return rows
+
+
+def recompute(rows):
+    """Statistiques d'un passage complet sur `rows`"""
+    store = StudentStore(HEADERS)
+    for row in rows:
+        store.append(row)
+    accumulator = StatsAccumulator(store)
+    accumulator.add_store(store)
+    return accumulator.finalize()
+
+
+def comparable(stats):
+    """Statistiques sans ce qui dépend du stockage lui-même (vue des semestres, octets par ligne)"""
+    stats = dict(stats)
+    del stats["semester_success_map"]
+    stats["data_info"] = {k: v for k, v in stats["data_info"].items() if k != "bytes_per_row"}
+    return stats
+
+
+class IncrementalStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = make_rows(300, seed=1)
+        self.store = StudentStore(HEADERS)
+        for row in self.rows:
+            self.store.append(row)
+        self.accumulator = StatsAccumulator(self.store)
+        self.accumulator.add_store(self.store)
+
+    def assertMatchesRecompute(self, rows):
+        expected = recompute(rows)
+        stats = self.accumulator.finalize()
+        self.assertEqual(comparable(stats), comparable(expected))
+        self.assertEqual(stats["graduation_threshold"], expected["graduation_threshold"])
+        self.assertEqual(stats["semester_graduation_threshold"], expected["semester_graduation_threshold"])
+
+    def test_insert(self):
+        added = make_rows(50, seed=2, prefix='N')
+        self.accumulator.apply_insert(added)
+        self.assertMatchesRecompute(self.rows + added)
+
+    def test_delete(self):
+        self.accumulator.apply_delete(self.rows[200:])
+        self.assertMatchesRecompute(self.rows[:200])
+
+    def test_update(self):
+        changed = [list(row) for row in self.rows[250:]]
+        for row in changed:
+            row[7] = '19.50'            # Mark
+            row[13] = 'True'            # Graduated
+            row[14] = '{"mark":12.25}'  # S1
+        self.accumulator.apply_update(self.rows[250:], changed)
+        self.assertMatchesRecompute(self.rows[:250] + changed)
+
+    def test_insert_delete_update(self):
+        added = make_rows(40, seed=3, prefix='N')
+        replaced = make_rows(30, seed=4, prefix='R')
+        self.accumulator.apply_insert(added)
+        self.accumulator.apply_delete(self.rows[:60])
+        self.accumulator.apply_update(self.rows[100:130], replaced)
+        self.assertMatchesRecompute(self.rows[60:100] + replaced + self.rows[130:] + added)
+
+    def test_delete_unknown_value(self):
+        unknown = make_rows(1, seed=5)
+        unknown[0][8] = 'Medical School'
+        with self.assertRaises(ValueError):
+            self.accumulator.apply_delete(unknown)
+
+    def test_truncated_store(self):
+        # Remplacement de la fin du fichier: lignes retirées des agrégats et du stockage
+        added = make_rows(20, seed=6, prefix='N')
+        self.accumulator.apply_update(self.rows[280:], added)
+        self.store.truncate(280)
+        for row in added:
+            self.store.append(row)
+        self.assertMatchesRecompute(self.rows[:280] + added)
+        accumulator = StatsAccumulator(self.store)
+        accumulator.add_store(self.store)
+        self.assertEqual(comparable(accumulator.finalize()), comparable(self.accumulator.finalize()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Trajectoires semestrielles des étudiants.
+
+Calculs vectorisés sur la matrice N x 12 des semestres du StudentStore (NaN
+pour un semestre absent), sans objet Python par étudiant:
+- par cohorte (Start_Year) et par semestre: effectif, moyenne et percentiles;
+- par étudiant: pente (régression des notes sur le numéro de semestre),
+  volatilité (écart type des variations entre semestres consécutifs) et plus
+  forte baisse entre deux semestres consécutifs;
+- étudiants à risque: baisse de plus de `threshold` points entre deux
+  semestres consécutifs;
+- courbe de rétention par cohorte: part des étudiants ayant validé au moins
+  k semestres (k = 1..12).
+
+Seules les paires de semestres consécutifs présents comptent pour les
+variations (un semestre absent interrompt la comparaison); la volatilité
+demande au moins deux variations. Les indicateurs
+par étudiant sont calculés une fois puis complétés quand des lignes sont
+ajoutées au stockage. Sans NumPy, les mêmes résultats sont calculés en Python.
+
+Avec des poids d'inclusion (échantillon, voir sampling.py), les effectifs,
+moyennes, percentiles et parts par cohorte sont pondérés: ils estiment la
+population complète. La liste des étudiants à risque reste celle des lignes de
+l'échantillon.
+"""
+
+import math
+
+from groupby import column, numpy_available
+from student_store import MISSING_YEAR, SEMESTER_COLUMNS, SEMESTER_COUNT
+
+if numpy_available:
+    import numpy as np
+
+DEFAULT_PERCENTILES = (25, 50, 75)
+# Baisse (en points) entre deux semestres consécutifs au-delà de laquelle un étudiant est à risque
+AT_RISK_DROP = 3.0
+# Lignes traitées par bloc (tableaux intermédiaires de quelques Mo)
+BLOCK_ROWS = 1 << 16
+UNKNOWN_COHORT = 'unknown'
+
+_NAN = float('nan')
+
+
+def _percentile(ordered, p):
+    """Percentile p (interpolation linéaire, comme numpy.percentile) d'une liste triée"""
+    position = (len(ordered) - 1) * p / 100
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _weighted_percentiles(values, weights, percentiles):
+    """
+    Percentiles pondérés de valeurs non triées (non vides): première valeur dont le
+    poids cumulé atteint p % du poids total.
+    """
+    if numpy_available:
+        order = np.argsort(values, kind='stable')
+        values, cumulative = values[order], np.cumsum(weights[order])
+        targets = np.asarray(percentiles, dtype=np.float64) / 100 * cumulative[-1]
+        return values[np.minimum(np.searchsorted(cumulative, targets), len(values) - 1)].tolist()
+    pairs = sorted(zip(values, weights))
+    total = sum(weight for _, weight in pairs)
+    points = []
+    for p in percentiles:
+        target, cumulative = p / 100 * total, 0
+        for value, weight in pairs:
+            cumulative += weight
+            if cumulative >= target:
+                break
+        points.append(value)
+    return points
+
+
+def _round(value, digits=2):
+    return None if value is None or value != value else round(float(value), digits)
+
+
+def _row_trend(row):
+    """(semestres présents, pente, volatilité, plus forte baisse) d'une ligne de la matrice"""
+    points = [(i + 1, mark) for i, mark in enumerate(row) if mark == mark]
+    count = len(points)
+    slope = _NAN
+    if count >= 2:
+        sx = sum(x for x, _ in points)
+        sy = sum(y for _, y in points)
+        sxx = sum(x * x for x, _ in points)
+        sxy = sum(x * y for x, y in points)
+        denominator = count * sxx - sx * sx
+        slope = (count * sxy - sx * sy) / denominator if denominator else _NAN
+    changes = [b - a for a, b in zip(row, row[1:]) if a == a and b == b]
+    volatility = drop = _NAN
+    if len(changes) >= 2:
+        mean = sum(changes) / len(changes)
+        volatility = math.sqrt(sum((change - mean) ** 2 for change in changes) / len(changes))
+    if changes:
+        drop = -min(changes)
+    return count, slope, volatility, drop
+
+
+class TrajectoryEngine:
+    """
+    Indicateurs de trajectoire d'un StudentStore (recalculés pour les lignes ajoutées).
+    `weights` (optionnel): poids d'inclusion de chaque ligne, complétés avec le stockage.
+    """
+
+    def __init__(self, store, weights=None):
+        self.store = store
+        self.weights = weights
+        self.rows = 0
+        self.completed = None   # semestres présents par étudiant
+        self.slope = None
+        self.volatility = None
+        self.max_drop = None
+        self._groups = None     # (lignes, libellés des cohortes, lignes de chaque cohorte)
+        self._flagged = None    # (lignes, seuil, étudiants à risque par baisse décroissante)
+
+    def _matrix(self, start, end):
+        if numpy_available:
+            matrix = np.frombuffer(self.store.semesters, dtype=np.float32, count=end * SEMESTER_COUNT)
+            return matrix.reshape(end, SEMESTER_COUNT)[start:].astype(np.float64)
+        semesters = self.store.semesters
+        return [list(semesters[i * SEMESTER_COUNT:(i + 1) * SEMESTER_COUNT]) for i in range(start, end)]
+
+    def _member_weights(self, members):
+        """Poids des lignes `members` (1 sans pondération)"""
+        if numpy_available:
+            if self.weights is None:
+                return np.ones(len(members))
+            return column(self.weights)[:self.rows][members]
+        if self.weights is None:
+            return [1.0] * len(members)
+        return [self.weights[i] for i in members]
+
+    def _block_trends(self, start, end):
+        """(semestres présents, pente, volatilité, plus forte baisse) des lignes [start, end)"""
+        matrix = self._matrix(start, end)
+        if not numpy_available:
+            trends = [_row_trend(row) for row in matrix]
+            return tuple(list(values) for values in zip(*trends)) if trends else ([], [], [], [])
+        present = ~np.isnan(matrix)
+        completed = present.sum(axis=1)
+        x = np.where(present, np.arange(1, SEMESTER_COUNT + 1, dtype=np.float64), 0)
+        y = np.where(present, matrix, 0)
+        sx, sy = x.sum(axis=1), y.sum(axis=1)
+        denominator = completed * (x * x).sum(axis=1) - sx * sx
+        valid = (completed >= 2) & (denominator > 0)
+        slope = np.full(len(matrix), np.nan)
+        slope[valid] = (completed * (x * y).sum(axis=1) - sx * sy)[valid] / denominator[valid]
+
+        changes = matrix[:, 1:] - matrix[:, :-1]   # NaN si l'un des deux semestres manque
+        has_change = ~np.isnan(changes)
+        change_count = has_change.sum(axis=1)
+        mean = np.where(has_change, changes, 0).sum(axis=1) / np.maximum(change_count, 1)
+        deviations = np.where(has_change, changes - mean[:, None], 0)
+        volatility = np.sqrt((deviations * deviations).sum(axis=1) / np.maximum(change_count, 1))
+        volatility[change_count < 2] = np.nan
+        drop = -np.where(has_change, changes, np.inf).min(axis=1)
+        drop[change_count == 0] = np.nan
+        return completed.astype(np.int64), slope, volatility, drop
+
+    def refresh(self):
+        """Calcule les indicateurs des lignes ajoutées depuis le dernier appel (par blocs de BLOCK_ROWS)"""
+        start, end = self.rows, len(self.store)
+        if start >= end and self.completed is not None:
+            return self
+        blocks = [self._block_trends(low, min(low + BLOCK_ROWS, end)) for low in range(start, end, BLOCK_ROWS)]
+        if self.completed is not None:
+            blocks.insert(0, (self.completed, self.slope, self.volatility, self.max_drop))
+        if not blocks:
+            parts = (column([]), column([]), column([]), column([]))
+        elif numpy_available:
+            parts = tuple(np.concatenate(values) for values in zip(*blocks))
+        else:
+            parts = tuple([value for block in values for value in block] for values in zip(*blocks))
+        self.completed, self.slope, self.volatility, self.max_drop = parts
+        self.rows = end
+        return self
+
+    def _cohorts(self):
+        """
+        (libellés des cohortes, lignes de chaque cohorte), calculés une fois par
+        état du stockage.
+        """
+        if self._groups is not None and self._groups[0] == self.rows:
+            return self._groups[1:]
+        years = self.store.start_years[:self.rows]
+        if numpy_available:
+            distinct, codes = np.unique(column(years), return_inverse=True)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(distinct) + 1))
+            members = [order[low:high] for low, high in zip(bounds, bounds[1:])]
+            distinct = distinct.tolist()
+        else:
+            distinct = sorted(set(years))
+            position = {year: code for code, year in enumerate(distinct)}
+            members = [[] for _ in distinct]
+            for i, year in enumerate(years):
+                members[position[year]].append(i)
+        labels = [str(year) if year != MISSING_YEAR else UNKNOWN_COHORT for year in distinct]
+        self._groups = (self.rows, labels, members)
+        return labels, members
+
+    def cohort_semesters(self, percentiles=DEFAULT_PERCENTILES):
+        """{cohorte: {"students", "semesters": {S1: {"count", "mean", "pXX"...}}}}"""
+        self.refresh()
+        labels, groups = self._cohorts()
+        if numpy_available:
+            matrix = np.frombuffer(self.store.semesters, dtype=np.float32, count=self.rows * SEMESTER_COUNT)
+            matrix = matrix.reshape(self.rows, SEMESTER_COUNT)
+        else:
+            matrix = self._matrix(0, self.rows)
+        result = {}
+        for label, members in zip(labels, groups):
+            cohort = matrix[members] if numpy_available else None
+            weights = self._member_weights(members)
+            semesters = {}
+            for position, name in enumerate(SEMESTER_COLUMNS):
+                if numpy_available:
+                    values = cohort[:, position]
+                    present = ~np.isnan(values)
+                    values, value_weights = values[present].astype(np.float64), weights[present]
+                    total = value_weights.sum()
+                    mean = (values * value_weights).sum() / total if len(values) else None
+                else:
+                    pairs = sorted((matrix[i][position], weight) for i, weight in zip(members, weights)
+                                   if matrix[i][position] == matrix[i][position])
+                    values = [value for value, _ in pairs]
+                    value_weights = [weight for _, weight in pairs]
+                    total = sum(value_weights)
+                    mean = sum(value * weight for value, weight in pairs) / total if pairs else None
+                if not len(values):
+                    points = [None] * len(percentiles)
+                elif self.weights is not None:
+                    points = _weighted_percentiles(values, value_weights, percentiles)
+                elif numpy_available:
+                    points = np.percentile(values, percentiles).tolist()
+                else:
+                    points = [_percentile(values, p) for p in percentiles]
+                summary = {"count": round(total), "mean": _round(mean)}
+                for p, point in zip(percentiles, points):
+                    summary[f"p{p:g}"] = _round(point)
+                semesters[name] = summary
+            result[label] = {"students": round(sum(weights)), "semesters": semesters}
+        return result
+
+    def retention(self):
+        """{cohorte: {"students", "curve": [part (%) des étudiants ayant au moins k semestres, k = 1..12]}}"""
+        self.refresh()
+        labels, groups = self._cohorts()
+        result = {}
+        for label, members in zip(labels, groups):
+            weights = self._member_weights(members)
+            if numpy_available:
+                histogram = np.bincount(self.completed[members], weights=weights, minlength=SEMESTER_COUNT + 1)
+                reached = histogram[::-1].cumsum()[::-1].tolist()
+            else:
+                histogram = [0] * (SEMESTER_COUNT + 1)
+                for i, weight in zip(members, weights):
+                    histogram[self.completed[i]] += weight
+                reached = [sum(histogram[k:]) for k in range(SEMESTER_COUNT + 1)]
+            total = sum(weights)
+            students = total or 1
+            result[label] = {
+                "students": round(total),
+                "curve": [round(reached[k] / students * 100, 1) for k in range(1, SEMESTER_COUNT + 1)]
+            }
+        return result
+
+    def trends(self, threshold=AT_RISK_DROP):
+        """Par cohorte: pente et volatilité moyennes, parts d'étudiants en progression, en baisse et à risque"""
+        self.refresh()
+        labels, groups = self._cohorts()
+        result = {}
+        for label, members in zip(labels, groups):
+            weights = self._member_weights(members)
+            if numpy_available:
+                slope, volatility = self.slope[members], self.volatility[members]
+                has_slope, has_volatility = ~np.isnan(slope), ~np.isnan(volatility)
+                with_trend, with_changes = weights[has_slope].sum(), weights[has_volatility].sum()
+                avg_slope = ((slope[has_slope] * weights[has_slope]).sum() / with_trend
+                             if has_slope.any() else None)
+                avg_volatility = ((volatility[has_volatility] * weights[has_volatility]).sum() / with_changes
+                                  if has_volatility.any() else None)
+                improving, declining = weights[slope > 0].sum(), weights[slope < 0].sum()
+                at_risk = weights[self.max_drop[members] > threshold].sum()
+            else:
+                slope = [(self.slope[i], weight) for i, weight in zip(members, weights) if self.slope[i] == self.slope[i]]
+                volatility = [(self.volatility[i], weight) for i, weight in zip(members, weights)
+                              if self.volatility[i] == self.volatility[i]]
+                with_trend = sum(weight for _, weight in slope)
+                with_changes = sum(weight for _, weight in volatility)
+                avg_slope = sum(value * weight for value, weight in slope) / with_trend if slope else None
+                avg_volatility = (sum(value * weight for value, weight in volatility) / with_changes
+                                  if volatility else None)
+                improving = sum(weight for value, weight in slope if value > 0)
+                declining = sum(weight for value, weight in slope if value < 0)
+                at_risk = sum(weight for i, weight in zip(members, weights) if self.max_drop[i] > threshold)
+            total = sum(weights)
+            students = total or 1
+            result[label] = {
+                "students": round(total),
+                "with_trend": round(with_trend),
+                "avg_slope": _round(avg_slope, 3),
+                "avg_volatility": _round(avg_volatility, 3),
+                "improving": round(improving / students * 100, 1),
+                "declining": round(declining / students * 100, 1),
+                "at_risk": round(at_risk / students * 100, 1)
+            }
+        return result
+
+    def at_risk(self, threshold=AT_RISK_DROP, offset=0, limit=50):
+        """
+        Étudiants dont la plus forte baisse entre deux semestres consécutifs dépasse `threshold`,
+        par baisse décroissante (lignes du stockage, non pondérées).
+
+        Returns:
+            (nombre de lignes à risque, [numéros de ligne de la page demandée])
+        """
+        self.refresh()
+        if self._flagged is None or self._flagged[:2] != (self.rows, threshold):
+            if numpy_available:
+                flagged = np.flatnonzero(self.max_drop > threshold)
+                flagged = flagged[np.argsort(-self.max_drop[flagged], kind='stable')]
+            else:
+                flagged = [i for i, drop in enumerate(self.max_drop) if drop > threshold]
+                flagged.sort(key=lambda i: -self.max_drop[i])
+            self._flagged = (self.rows, threshold, flagged)  # pages suivantes sans nouveau tri
+        flagged = self._flagged[2]
+        page = flagged[offset:offset + limit]
+        return len(flagged), page.tolist() if numpy_available else page
+
+    def student(self, row):
+        """Indicateurs de trajectoire de l'étudiant de la ligne `row`"""
+        self.refresh()
+        year = self.store.start_years[row]
+        return {
+            "cohort": str(year) if year != MISSING_YEAR else UNKNOWN_COHORT,
+            "semesters_completed": int(self.completed[row]),
+            "slope": _round(self.slope[row], 3),
+            "volatility": _round(self.volatility[row], 3),
+            "max_drop": _round(self.max_drop[row]),
+            "semesters": [_round(mark) for mark in self.store.semester_row(row)]
+        }